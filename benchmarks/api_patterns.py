@@ -0,0 +1,193 @@
+#! /usr/bin/env python
+"""
+Calling patterns of the request and command API.
+
+The benchmarks are run against the fake dispatcher of pystudio.fake, unless
+the address of a dispatcher is given:
+    - throughput of a persistent request of QUBIC_AllPixelsScientificData,
+    - latency of the fetch of a housekeeping parameter,
+    - round-trip time of a command in waitingForAckMode,
+    - duration of a sweep of sendSetAsicParam commands sent one by one and
+      through a command pipeline,
+    - progress of a Python thread while other threads send commands and wait
+      for their acknowledgement (its stalls reveal a wrapper holding the
+      GIL during a blocking call).
+
+FakeDispatcherAccess is a pure Python mock of the interface of
+DispatcherAccess, not a stand-in dispatcher speaking its protocol: the
+compiled client (Qt kernel thread, request slot, ring buffer copy, wait
+path, TCP transfers) is not run. Against it, the numbers only measure the
+calling patterns and the Python code above the client, such as the
+multiplexer and the command pipeline. The client itself is only measured
+against a dispatcher, with --address. The deadlocks of the compiled client
+are checked by benchmarks/stress.py.
+
+With --metrics, the request metrics of the client are recorded during the
+benchmarks and printed in the Prometheus text format.
+
+Usage: python benchmarks/api_patterns.py [--address ADDRESS [--port PORT]]
+                                         [--duration SECONDS] [--count N]
+                                         [--in-flight N] [--metrics]
+
+"""
+from __future__ import division, print_function
+import argparse
+import threading
+import time
+import numpy as np
+
+SCIENCE = 'QUBIC_AllPixelsScientificData'
+HK = 'QUBIC_Nsample'
+
+
+def report(label, times):
+    times = 1000 * np.asarray(times)
+    print('{0:<24} median {1:8.3f} ms, p99 {2:8.3f} ms, max {3:8.3f} ms'
+          .format(label, np.median(times), np.percentile(times, 99),
+                  np.max(times)))
+
+
+def bench_request_throughput(client, duration):
+    """ Consume a persistent request of the scientific data in batches. """
+    request = client.request(SCIENCE)
+    try:
+        ntransfers = 0
+        time0 = time.time()
+        while time.time() - time0 < duration:
+            nbatch = min(max(request.available, 1), request.buffer_size)
+            request.next_batch(nbatch)
+            ntransfers += nbatch
+        elapsed = time.time() - time0
+    finally:
+        request.abort()
+    print('{0:<24} {1:8.1f} transfers/s, {2} overflows'.format(
+        'request throughput', ntransfers / elapsed, request.overflows))
+
+
+def bench_fetch_latency(client, count):
+    """ Fetch a housekeeping parameter immediately. """
+    times = []
+    for i in range(count):
+        time0 = time.time()
+        client.fetch(HK)
+        times.append(time.time() - time0)
+    report('fetch latency', times)
+
+
+def bench_command_roundtrip(client, count):
+    """ Send a command and wait for its acknowledgement. """
+    mode = client.waitingForAckMode
+    client.waitingForAckMode = True
+    times = []
+    try:
+        for i in range(count):
+            time0 = time.time()
+            client.sendGetStatus(0xFF)
+            times.append(time.time() - time0)
+    finally:
+        client.waitingForAckMode = mode
+    report('command round-trip', times)
+
+
+def bench_command_pipeline(client, count, max_in_flight):
+    """ Send a sweep of commands one by one, then through a pipeline. """
+    commands = [(asic, address, 0) for asic in range(16)
+                for address in range(count // 16)]
+    mode = client.waitingForAckMode
+    client.waitingForAckMode = True
+    time0 = time.time()
+    try:
+        for command in commands:
+            client.sendSetAsicParam(*command)
+    finally:
+        client.waitingForAckMode = mode
+    elapsed_serial = time.time() - time0
+    time0 = time.time()
+    with client.pipeline(max_in_flight) as pipeline:
+        for command in commands:
+            pipeline.sendSetAsicParam(*command)
+        results = pipeline.results()
+    elapsed_pipeline = time.time() - time0
+    print('{0:<24} {1} commands: serial {2:8.3f} s, pipeline {3:8.3f} s, '
+          'speedup {4:5.1f}, {5} failed'.format(
+              'command sweep', len(commands), elapsed_serial,
+              elapsed_pipeline, elapsed_serial / elapsed_pipeline,
+              sum(not _.ok for _ in results)))
+    report('pipelined command', [_.latency for _ in results])
+
+
+def bench_concurrent_progress(client, count, nthreads):
+    """
+    Send commands from several threads while a ticker thread sleeps for 1 ms
+    in a loop, and report the delay of the ticks.
+
+    """
+    stop = threading.Event()
+    delays = []
+
+    def tick():
+        while not stop.is_set():
+            time0 = time.time()
+            time.sleep(0.001)
+            delays.append(time.time() - time0 - 0.001)
+
+    ticker = threading.Thread(target=tick)
+    ticker.start()
+    time0 = time.time()
+    try:
+        with client.pipeline(nthreads) as pipeline:
+            for i in range(count):
+                pipeline.sendGetStatus(0xFF)
+            for i in range(count // 10):
+                client.waitMs(1)
+            results = pipeline.results()
+    finally:
+        stop.set()
+        ticker.join()
+    elapsed = time.time() - time0
+    print('{0:<24} {1} commands from {2} threads in {3:8.3f} s, {4} ticks, '
+          '{5} failed'.format('concurrent progress', count, nthreads,
+                              elapsed, len(delays),
+                              sum(not _.ok for _ in results)))
+    report('tick delay', delays)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--address', help='the dispatcher address, by '
+                        'default the fake dispatcher is used')
+    parser.add_argument('--port', type=int, default=-1)
+    parser.add_argument('--duration', type=float, default=5,
+                        help='the duration of the throughput benchmark in s')
+    parser.add_argument('--count', type=int, default=200,
+                        help='the number of fetches and commands')
+    parser.add_argument('--in-flight', type=int, default=8,
+                        help='the number of pipelined commands in flight')
+    parser.add_argument('--science-rate', type=float, default=156.25,
+                        help='the scientific data rate of the fake dispatcher')
+    parser.add_argument('--metrics', action='store_true',
+                        help='record and print the request metrics')
+    args = parser.parse_args()
+    if args.address is None:
+        from pystudio.fake import FakeDispatcherAccess
+        client = FakeDispatcherAccess(science_rate=args.science_rate)
+        print('Fake dispatcher, scientific data at {0} Hz'.format(
+            args.science_rate))
+    else:
+        from pystudio import DispatcherAccess
+        client = DispatcherAccess(args.address, args.port)
+        print('Dispatcher {0}:{1}'.format(client.dispatcherAddress,
+                                          client.dispatcherPort))
+    if args.metrics:
+        client.enable_metrics()
+    bench_request_throughput(client, args.duration)
+    bench_fetch_latency(client, args.count)
+    bench_command_roundtrip(client, args.count)
+    bench_command_pipeline(client, args.count, args.in_flight)
+    bench_concurrent_progress(client, args.count, args.in_flight)
+    if args.metrics:
+        print(client.metrics.to_prometheus(), end='')
+
+
+if __name__ == '__main__':
+    main()
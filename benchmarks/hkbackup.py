@@ -0,0 +1,90 @@
+#! /usr/bin/env python
+"""
+Reading of a night of housekeeping from an HK backup session.
+
+A synthetic session of temperature sensors, sampled at 1 Hz during 12 hours
+with a jitter, is written into a temporary directory (or an existing session
+is used). The opening of the session, the range queries and the as-of join
+of all the sensors onto a 10-second grid are timed.
+
+Usage: python benchmarks/hkbackup.py [SESSION_DIRECTORY] [--nsensors N]
+
+"""
+from __future__ import division, print_function
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from pystudio.hkbackup import HKBackup
+
+DURATION = 12 * 3600  # s
+START = 1.55e9
+
+
+def write_session(directory, nsensors):
+    """
+    Write sensors in Double with times in ms, split into two files, as
+    TSingleHkBackup does.
+
+    """
+    random = np.random.RandomState(0)
+    for i in range(nsensors):
+        name = 'EXT_Temperatures_{0}'.format(i)
+        times = START + np.arange(DURATION) + random.uniform(
+            0, 0.1, DURATION)
+        values = 4 + np.cumsum(random.standard_normal(DURATION)) * 1e-3
+        half = DURATION // 2
+        for number, s in enumerate((slice(0, half), slice(half, None))):
+            suffix = '({0})'.format(number) if number > 0 else ''
+            (1000 * times[s]).tofile(os.path.join(
+                directory, '{0}_X{1}.dat'.format(name, suffix)))
+            values[s].tofile(os.path.join(
+                directory, '{0}{1}.dat'.format(name, suffix)))
+
+
+def bench(label, func, *args, **keywords):
+    time0 = time.time()
+    out = func(*args, **keywords)
+    print('{0:<28} {1:10.2f} ms'.format(label, 1000 * (time.time() - time0)))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('session', nargs='?',
+                        help='the session directory, by default a synthetic '
+                        'session is written')
+    parser.add_argument('--nsensors', type=int, default=50,
+                        help='the number of sensors of the synthetic session')
+    args = parser.parse_args()
+    tmpdir = None
+    directory = args.session
+    if directory is None:
+        tmpdir = tempfile.mkdtemp()
+        directory = tmpdir
+        write_session(directory, args.nsensors)
+    try:
+        backup = bench('open session', HKBackup, directory)
+        names = [_ for _ in backup.names if backup[_].times is not None]
+        nvalues = sum(len(backup[_]) for _ in names)
+        print('{0} sensors, {1} values'.format(len(names), nvalues))
+        start, stop = backup.time_range
+        middle = (start + stop) / 2
+        bench('read 1 hour of 1 sensor', backup.read, names[0], middle,
+              middle + 3600)
+        bench('read all of all sensors',
+              lambda: [backup.read(_) for _ in names])
+        times, values = bench('join onto a 10 s grid', backup.join, names,
+                              step=10, tolerance=5)
+        print('joined values: {0}, {1:.2%} missing'.format(
+            values.shape, np.mean(np.isnan(values))))
+        backup.close()
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#! /usr/bin/env python
+"""
+Throughput of the replay of a recorded session.
+
+The recordings are replayed as fast as possible through a persistent request
+of the scientific data (or of the first recorded parameter), consumed in
+batches. If no recording is given, a
+session of the scientific data is first recorded from the in-process fake
+dispatcher into a temporary HDF5 file. The replay client is pure Python:
+its throughput is that of the replay, not of the real client path.
+
+Usage: python benchmarks/replay.py [RECORDING ...] [--count N] [--batch N]
+
+"""
+from __future__ import division, print_function
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from pystudio.replay import ReplayDispatcherAccess
+
+SCIENCE = 'QUBIC_AllPixelsScientificData'
+
+
+def record(filename, count):
+    """ Record transfers of the scientific data of the fake dispatcher. """
+    from pystudio.fake import FakeDispatcherAccess
+    from pystudio.recorder import Recorder
+    with FakeDispatcherAccess(science_rate=2000) as client:
+        with Recorder(client, [SCIENCE, 'QUBIC_Nsample'], filename,
+                      compression=None) as recorder:
+            recorder.record(count=count)
+
+
+def bench_replay(filenames, batch):
+    client = ReplayDispatcherAccess(filenames, speed=None, paused=True)
+    try:
+        parameter = SCIENCE if SCIENCE in client.recorded else \
+                    client.recorded[0]
+        request = client.request(parameter, buffer_size=batch)
+        client.resume()
+        time0 = time.time()
+        while True:
+            try:
+                request.next_batch(min(max(request.available, 1), batch))
+            except EOFError:
+                break
+        ntransfers = client.ntransfers
+        elapsed = time.time() - time0
+    finally:
+        client.close()
+    print('{0:<24} {1} transfers of {2}: {3:8.1f} transfers/s'.format(
+        'replay throughput', ntransfers, parameter, ntransfers / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('recordings', nargs='*',
+                        help='the recordings, by default a session of the '
+                        'fake dispatcher is recorded')
+    parser.add_argument('--count', type=int, default=2000,
+                        help='the number of recorded transfers')
+    parser.add_argument('--batch', type=int, default=100,
+                        help='the number of transfers read at once')
+    args = parser.parse_args()
+    tmpdir = None
+    recordings = args.recordings
+    if len(recordings) == 0:
+        tmpdir = tempfile.mkdtemp()
+        recordings = [os.path.join(tmpdir, 'session.h5')]
+        record(recordings[0], args.count)
+    try:
+        bench_replay(recordings, args.batch)
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#! /usr/bin/env python
+"""
+Time and memory footprint of the creation of a dispatcher client.
+
+The client creation, the first access to the parameter table and the first
+parameter lookups are timed separately. The resident set size is read from
+/proc/self/statm. The benchmark requires the compiled extension: it is
+skipped, with exit status 0, if the extension cannot be imported.
+
+Usage: python benchmarks/startup.py [address [port]]
+
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+
+PARAMETERS = ('QUBIC_Nsample', 'QUBIC_AllPixelsScientificData',
+              'QUBIC_PixelScientificDataTimeLine_0')
+
+
+def rss():
+    """ Return the resident set size in MiB. """
+    with open('/proc/self/statm') as f:
+        npages = int(f.read().split()[1])
+    return npages * os.sysconf('SC_PAGE_SIZE') / 1024**2
+
+
+def report(label, time0, rss0):
+    print('{0:<28} {1:10.1f} ms {2:+10.1f} MiB'.format(
+        label, 1000 * (time.time() - time0), rss() - rss0))
+
+
+def main(args):
+    rss0 = rss()
+    time0 = time.time()
+    try:
+        from pystudio import DispatcherAccess
+    except ImportError as exc:
+        print('startup skipped: {0}'.format(exc))
+        return
+    report('import pystudio', time0, rss0)
+
+    time0 = time.time()
+    client = DispatcherAccess(*args)
+    report('DispatcherAccess()', time0, rss0)
+
+    time0 = time.time()
+    parameters = client.parameters
+    report('parameter table', time0, rss0)
+
+    time0 = time.time()
+    for name in PARAMETERS:
+        parameters[name]
+    report('first lookups', time0, rss0)
+
+    time0 = time.time()
+    for param in parameters:
+        pass
+    report('all parameters', time0, rss0)
+    print('{0} parameters, RSS {1:.1f} MiB'.format(len(parameters), rss()))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) > 1:
+        args[1] = int(args[1])
+    main(args)
@@ -0,0 +1,134 @@
+#! /usr/bin/env python
+"""
+Stress check of the compiled client for deadlocks.
+
+Threads mix fetches, persistent requests and commands on a DispatcherAccess
+client while the main thread processes the Qt events, and they must all
+complete before a deadline. The script fails if they do not: the blocking
+calls release the GIL, so that a wrong ordering of the GIL, the client
+mutex and the kernel thread leaves the threads blocked forever.
+
+Without the address of a dispatcher, the client is not connected: the
+fetches and requests time out or are rejected, and the main thread emits
+the arrival signal of the request slots, so that the waits are also woken
+up through the request slot. The failed calls are then counted, not
+reported as errors.
+
+The check requires the compiled extension. It is skipped, with exit status
+0, if the extension cannot be imported: the fake dispatcher, which has no
+GIL release nor client mutex, cannot reveal these deadlocks.
+
+Usage: python benchmarks/stress.py [--address ADDRESS [--port PORT]]
+                                   [--count N] [--threads N]
+                                   [--deadline SECONDS]
+
+"""
+from __future__ import division, print_function
+import argparse
+import sys
+import threading
+import time
+
+HK = 'QUBIC_Nsample'
+TIMEOUT = 100  # ms, of the requests without a dispatcher
+
+
+def check_no_deadlock(client, count, nthreads, deadline, connected=True):
+    """
+    Run count iterations of fetches, persistent requests and commands in each
+    of nthreads threads, while the main thread calls waitMs, and raise a
+    RuntimeError if they have not completed within the deadline in seconds.
+    If the client is not connected, the arrival of the requests is signalled
+    by the main thread and the failures of the calls are counted.
+
+    """
+    from pystudio import TimeoutError
+    from pystudio.pystudio import _MAX_NB_REQUEST_PER_CLIENT
+    timeout = 5000 if connected else TIMEOUT
+    errors = []
+    failures = [0]
+
+    def call(func, *args):
+        try:
+            return func(*args)
+        except (TimeoutError, RuntimeError, ValueError):
+            if connected:
+                raise
+            failures[0] += 1
+
+    def next_(request):
+        try:
+            request.next()
+        finally:
+            request.abort()
+
+    def work():
+        try:
+            for i in range(count):
+                call(client.fetch, HK, 0, timeout)
+                request = call(client.request, HK, 10, 1, timeout)
+                if request is not None:
+                    call(next_, request)
+                call(client.sendGetStatus, 0xFF)
+        except Exception as exc:
+            errors.append(exc)
+
+    workers = [threading.Thread(target=work, name='stress-{0}'.format(i))
+               for i in range(nthreads)]
+    time0 = time.time()
+    for worker in workers:
+        # a deadlocked worker must not prevent the interpreter from exiting
+        worker.daemon = True
+        worker.start()
+    while any(_.is_alive() for _ in workers) and \
+          time.time() - time0 < deadline:
+        client.waitMs(10)
+        if not connected:
+            for num in range(_MAX_NB_REQUEST_PER_CLIENT):
+                client._emit_request_arrived(num)
+    for worker in workers:
+        worker.join(max(deadline - (time.time() - time0), 0))
+    elapsed = time.time() - time0
+    alive = [_.name for _ in workers if _.is_alive()]
+    if len(alive) > 0:
+        raise RuntimeError(
+            'Stress check: the threads {0} have not completed within {1} s, '
+            'they are deadlocked.'.format(', '.join(alive), deadline))
+    if len(errors) > 0:
+        raise errors[0]
+    print('{0:<24} {1} threads x {2} iterations completed in {3:8.3f} s, '
+          '{4} failed calls'.format('stress check', nthreads, count,
+                                    elapsed, failures[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--address', help='the dispatcher address, by '
+                        'default the client is not connected')
+    parser.add_argument('--port', type=int, default=-1)
+    parser.add_argument('--count', type=int, default=20,
+                        help='the number of iterations per thread')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='the number of threads')
+    parser.add_argument('--deadline', type=float, default=60,
+                        help='the deadline in s')
+    args = parser.parse_args()
+    try:
+        from pystudio import DispatcherAccess
+    except ImportError as exc:
+        print('stress check skipped: {0}'.format(exc))
+        return
+    if args.address is None:
+        client = DispatcherAccess()
+    else:
+        client = DispatcherAccess(args.address, args.port)
+    connected = args.address is not None and client.connected
+    print('Dispatcher {0}:{1}, {2}'.format(
+        client.dispatcherAddress.decode('UTF-8'), client.dispatcherPort,
+        client.state if connected else 'not connected'))
+    check_no_deadlock(client, args.count, args.threads, args.deadline,
+                      connected)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#! /usr/bin/env python
+"""
+Memory footprint and parse time of the parameter table.
+
+The ParameterEntryTable returned by read_all_params is compared with the list
+of ParameterEntry in which every multi-dimensional parameter is expanded into
+one entry per leading index, as read_all_params returned previously. The
+cache of the parsed tables is disabled.
+
+Usage: python benchmarks/tables.py [--repeat N]
+
+"""
+from __future__ import division, print_function
+import argparse
+import itertools
+import os
+import time
+import tracemalloc
+
+os.environ['PYSTUDIO_CACHE_DIR'] = ''
+
+from pystudio.parameters import ParameterEntry, ParameterEntryTable, \
+    read_params
+
+
+def expand(params):
+    """ Return the parameter table as an expanded list of ParameterEntry. """
+    out = []
+    for param in params:
+        out.append(param)
+        if len(param.shape) > 1:
+            shape = (param.shape[-1],)
+            for indices in itertools.product(
+                    *[range(_) for _ in param.shape[:-1]]):
+                name = '{0}_{1}'.format(
+                    param.name, '_'.join(str(i) for i in indices))
+                out.append(ParameterEntry(
+                    name, param.description, param.type, shape, param.ubound,
+                    param.use_tf))
+    return out
+
+
+def measure(label, func, params, repeat):
+    times = []
+    for i in range(repeat):
+        time0 = time.perf_counter()
+        func(params)
+        times.append(time.perf_counter() - time0)
+    tracemalloc.start()
+    table = func(params)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('{0:<20} {1:6} entries, {2:8.1f} KiB, {3:8.3f} ms'.format(
+        label, len(table), size / 1024, 1000 * min(times)))
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    time0 = time.perf_counter()
+    params = read_params()
+    print('{0:<20} {1:6} entries, {2:8.3f} ms'.format(
+        'csv parsing', len(params), 1000 * (time.perf_counter() - time0)))
+    expanded = measure('expanded list', expand, params, args.repeat)
+    table = measure('ParameterEntryTable', ParameterEntryTable, params,
+                    args.repeat)
+    assert list(table) == expanded
+    names = [_.name for _ in expanded]
+    time0 = time.perf_counter()
+    for name in names:
+        table.get(name)
+    print('{0:<20} {1:8.3f} us per name'.format(
+        'table lookup', 1e6 * (time.perf_counter() - time0) / len(names)))
+
+
+if __name__ == '__main__':
+    main()
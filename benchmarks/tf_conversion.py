@@ -0,0 +1,47 @@
+#! /usr/bin/env python
+"""
+Transfer function conversion of a full focal plane timeline.
+
+The conversion of a (16, 128, N) array is timed for the vectorised path and
+for the element-by-element evaluation by the dispatcher library.
+
+Usage: python benchmarks/tf_conversion.py [nsamples [parameter]]
+
+"""
+from __future__ import print_function
+import sys
+import time
+import numpy as np
+from pystudio import DispatcherAccess
+
+NSAMPLES = 1000
+PARAMETER = 'QUBIC_FeedbackDACValues'
+
+
+def bench(func, *args, **keywords):
+    time0 = time.time()
+    out = func(*args, **keywords)
+    return time.time() - time0, out
+
+
+def main(nsamples=NSAMPLES, parameter=PARAMETER):
+    client = DispatcherAccess()
+    adu = np.random.randint(-2**15, 2**15, (16, 128, nsamples))
+    print('Parameter {0}, {1} values'.format(parameter, adu.size))
+    for name, func in (('ADU -> value', client.convertADU2Value),
+                       ('value -> ADU', client.convertValue2ADU)):
+        x = adu if name.startswith('ADU') else \
+            client.convertADU2Value(parameter, adu)
+        t_loop, out_loop = bench(func, parameter, x, vectorize=False)
+        t_vec, out_vec = bench(func, parameter, x)
+        print('{0}: loop {1:8.3f} s, vectorised {2:8.3f} s, speedup {3:6.1f}'
+              ', max abs diff {4:g}'.format(
+                  name, t_loop, t_vec, t_loop / t_vec,
+                  np.max(np.abs(out_loop - out_vec))))
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) > 0:
+        args[0] = int(args[0])
+    main(*args)
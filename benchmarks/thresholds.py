@@ -0,0 +1,121 @@
+#! /usr/bin/env python
+"""
+Threshold evaluation of a housekeeping parameter set.
+
+The housekeeping set is made of the numeric parameters of the dispatcher
+table, except the scientific and raw data. As the thresholds of the TF file
+are usually disabled, warning and alert thresholds are set for each
+parameter at 2.5 and 3.5 standard deviations of synthetic values. The
+per-parameter Python loop of a watchdog and the vectorised ThresholdEngine
+are timed on single snapshots and on a stream of snapshots, and they are
+checked to detect the same transitions.
+
+Usage: python benchmarks/thresholds.py [nsnapshots]
+
+"""
+from __future__ import division, print_function
+import sys
+import time
+import numpy as np
+from pystudio.parameters import TFEntry, read_all_params, read_tf
+from pystudio.thresholds import ThresholdEngine
+
+NSNAPSHOTS = 1000
+EXCLUDED = ('QUBIC_AllPixelsScientificData', 'QUBIC_PixelScientificData',
+            'QUBIC_PreviewPixelScientificData', 'QUBIC_PreviewRawData',
+            'QUBIC_RawData', 'QUBIC_WorkingRawData')
+
+
+def get_hk_parameters():
+    return [_ for _ in read_all_params()
+            if _.type != 0x80 and _.ubound is None and
+            not _.name.startswith(EXCLUDED) and len(_.shape) <= 1]
+
+
+def get_entries(rparams):
+    """ Return TF entries with the thresholds -3.5, -2.5, 2.5 and 3.5. """
+    names = dict((_.name, _) for _ in read_tf())
+    out = []
+    for rparam in rparams:
+        entry = names.get(rparam.name)
+        if entry is None:
+            entry = TFEntry(rparam.name, rparam.name, '', '', None, False,
+                            None, None, None, None, '')
+        out.append(entry._replace(lowalert=-3.5, lowwarn=-2.5, highwarn=2.5,
+                                  highalert=3.5))
+    return out
+
+
+def watchdog(rparams, entries, snapshots):
+    """ Per-parameter evaluation, tracking the state of each element. """
+    thresholds = dict((_.name, _) for _ in entries)
+    states = {}
+    transitions = []
+    for snapshot in snapshots:
+        for rparam, value in zip(rparams, snapshot):
+            entry = thresholds[rparam.name]
+            for index, x in enumerate(np.ravel(value)):
+                if x < entry.lowalert:
+                    state = -2
+                elif x < entry.lowwarn:
+                    state = -1
+                elif x > entry.highalert:
+                    state = 2
+                elif x > entry.highwarn:
+                    state = 1
+                else:
+                    state = 0
+                if state != states.get((rparam.name, index), 0):
+                    transitions.append((rparam.name, index, state))
+                    states[rparam.name, index] = state
+    return transitions
+
+
+def main(nsnapshots=NSNAPSHOTS):
+    rparams = get_hk_parameters()
+    entries = get_entries(rparams)
+    names = [_.name for _ in rparams]
+    engine = ThresholdEngine(names, entries)
+    print('{0} parameters, {1} elements, {2} snapshots'.format(
+        len(names), len(engine), nsnapshots))
+
+    # slowly varying values of unit variance (first-order autoregressive
+    # process), crossing the thresholds from time to time
+    random = np.random.RandomState(0)
+    noise = random.standard_normal((nsnapshots, len(engine)))
+    walk = np.empty_like(noise)
+    walk[0] = noise[0]
+    for i in range(1, nsnapshots):
+        walk[i] = 0.999 * walk[i-1] + np.sqrt(1 - 0.999**2) * noise[i]
+    snapshots = [[walk[i, engine.offsets[j]:engine.offsets[j+1]].reshape(
+        engine.shapes[j]) for j in range(len(names))]
+        for i in range(nsnapshots)]
+
+    time0 = time.time()
+    expected = watchdog(rparams, entries, snapshots)
+    t_loop = time.time() - time0
+
+    time0 = time.time()
+    transitions = []
+    for snapshot in snapshots:
+        transitions += engine.update(snapshot)
+    t_snapshot = time.time() - time0
+
+    engine.reset()
+    time0 = time.time()
+    transitions_stream = engine.update_many(walk)
+    t_stream = time.time() - time0
+
+    assert [(_.name, _.index, _.new) for _ in transitions] == expected
+    assert [(_.name, _.index, _.new) for _ in transitions_stream] == expected
+    print('{0} transitions'.format(len(expected)))
+    for label, elapsed in (('python loop', t_loop),
+                           ('engine, snapshots', t_snapshot),
+                           ('engine, stream', t_stream)):
+        print('{0:<20} {1:10.2f} us/snapshot, speedup {2:8.1f}'.format(
+            label, 1e6 * elapsed / nsnapshots, t_loop / elapsed))
+
+
+if __name__ == '__main__':
+    args = [int(_) for _ in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,102 @@
+#! /usr/bin/env python
+"""
+Wake-up latency of the request waits.
+
+A client is created, without connecting to a dispatcher, and its
+requestArrived signal is emitted from one thread while another thread waits
+for the request as AbstractRequest.wait does. The latency is the delay
+between the emission of the signal and the return of the wait, which covers
+the request slot, the wait condition and the recovery of the GIL:
+    - worker wait: the waiting thread does not own the QApplication, it
+      sleeps on the wait condition of the client,
+    - main-thread wait: the waiting thread owns the QApplication, it
+      processes its events while waiting and is woken up through its event
+      dispatcher.
+
+This benchmark requires the compiled extension: it does not run against the
+fake dispatcher, which does not use the request slot. It is skipped, with
+exit status 0, if the extension cannot be imported.
+
+Usage: python benchmarks/wait_latency.py [--count N] [--interval MS]
+
+"""
+from __future__ import division, print_function
+import argparse
+import threading
+import time
+import numpy as np
+
+NUM = 0  # the request number of the emitted signals
+TIMEOUT = 5000  # ms
+
+
+def report(label, latencies):
+    latencies = 1e6 * np.asarray(latencies)
+    print('{0:<20} p50 {1:8.1f} us, p99 {2:8.1f} us, max {3:8.1f} us'
+          .format(label, np.median(latencies),
+                  np.percentile(latencies, 99),
+                  np.max(latencies)))
+
+
+def measure(client, count, interval, main_waits):
+    """
+    Return the latencies of count waits, the signal being emitted interval
+    seconds after the waiter is ready. If main_waits is true, the calling
+    thread waits and a worker thread emits the signals, and conversely.
+
+    """
+    ready = threading.Semaphore(0)
+    emitted = [0.] * count
+    latencies = []
+    errors = []
+
+    def wait():
+        for i in range(count):
+            ready.release()
+            if not client._wait_request_arrived(NUM, TIMEOUT):
+                errors.append(i)
+                return
+            latencies.append(time.perf_counter() - emitted[i])
+
+    def emit():
+        for i in range(count):
+            if not ready.acquire(timeout=TIMEOUT / 1000):
+                return
+            time.sleep(interval)
+            emitted[i] = time.perf_counter()
+            client._emit_request_arrived(NUM)
+
+    thread = threading.Thread(target=emit if main_waits else wait)
+    thread.daemon = True
+    thread.start()
+    if main_waits:
+        wait()
+    else:
+        emit()
+    thread.join(TIMEOUT / 1000)
+    if len(errors) > 0 or thread.is_alive():
+        raise RuntimeError('The request wait timed out.')
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--count', type=int, default=10000,
+                        help='the number of waits')
+    parser.add_argument('--interval', type=float, default=0.2,
+                        help='the delay in ms between the readiness of the '
+                        'waiter and the emission of the signal')
+    args = parser.parse_args()
+    try:
+        from pystudio import DispatcherAccess
+    except ImportError as exc:
+        print('wait latency skipped: {0}'.format(exc))
+        return
+    client = DispatcherAccess()
+    interval = args.interval / 1000
+    report('worker wait', measure(client, args.count, interval, False))
+    report('main-thread wait', measure(client, args.count, interval, True))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,12 @@
-from .pystudio import DispatcherAccess, TimeoutError
+try:
+    from .pystudio import DispatcherAccess, TimeoutError
+except ImportError as exc:
+    # the extension is not built: the pure Python modules (fake, replay,
+    # rawbackup, hkbackup...) can still be imported
+    _import_error = exc
+else:
+    _import_error = None
+from .parallel import fetch_many
 from . import utils
 
 def _check_dispatcher_files():
@@ -20,6 +28,16 @@ def get_client():
     from . import pystudio
     return pystudio._last_client
 
-_check_dispatcher_files()
+def __getattr__(name):
+    if name in ('DispatcherAccess', 'TimeoutError') and \
+       _import_error is not None:
+        raise ImportError(
+            'The pystudio extension cannot be imported: {}'.format(
+                _import_error))
+    raise AttributeError(
+        "module '{}' has no attribute '{}'".format(__name__, name))
+
+if _import_error is None:
+    _check_dispatcher_files()
 
 __version__ = u'2.0.0'
@@ -0,0 +1,99 @@
+"""
+Cache of the tables parsed from the data files.
+
+The tables are pickled in the directory given by the environment variable
+PYSTUDIO_CACHE_DIR (by default $XDG_CACHE_HOME/pystudio or ~/.cache/pystudio)
+under a file name which includes a hash of the path, modification time and
+size of the source files, so that they are parsed again whenever one of the
+source files changes, without reading the source files on each call. When a
+table is pickled, its previous pickles are removed. If the variable
+PYSTUDIO_CACHE_DIR is set to an empty string, the cache is disabled.
+
+"""
+from __future__ import print_function
+import hashlib
+import os
+import pickle
+import re
+
+VERSION = 2  # to be incremented when the format of the cached tables changes
+
+
+def get_cache_dir():
+    try:
+        return os.environ['PYSTUDIO_CACHE_DIR']
+    except KeyError:
+        pass
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pystudio')
+
+
+def get_key(name, filenames):
+    """
+    Return the cache key of a table, from its name and the path,
+    modification time and size of its source files.
+
+    """
+    h = hashlib.sha1('{0}:{1}'.format(name, VERSION).encode())
+    for filename in filenames:
+        stat = os.stat(filename)
+        h.update('\0{0}:{1}:{2}'.format(
+            os.path.abspath(filename), stat.st_mtime_ns,
+            stat.st_size).encode())
+    return '{0}-{1}'.format(name, h.hexdigest())
+
+
+def prune(directory, name, keep):
+    """
+    Remove the pickles of a table in the cache directory, except keep.
+
+    """
+    rx = re.compile(r'^{0}-[0-9a-f]{{40}}\.pickle$'.format(re.escape(name)))
+    for filename in os.listdir(directory):
+        if filename == keep or rx.match(filename) is None:
+            continue
+        try:
+            os.remove(os.path.join(directory, filename))
+        except OSError:
+            pass
+
+
+def cached(name, filenames, parse, *args):
+    """
+    Return parse(*args), loaded from the cache if the source files have not
+    changed.
+
+    Parameters
+    ----------
+    name : str
+        The table name.
+    filenames : sequence of str
+        The source files of the table.
+    parse : callable
+        The function parsing the source files.
+
+    """
+    directory = get_cache_dir()
+    if directory == '':
+        return parse(*args)
+    key = get_key(name, filenames) + '.pickle'
+    path = os.path.join(directory, key)
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        pass
+    out = parse(*args)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp = '{0}.{1}'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            pickle.dump(out, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        prune(directory, name, key)
+    except (IOError, OSError):
+        # the cache is not writable, the table will be parsed next time
+        pass
+    return out
@@ -1,9 +1,14 @@
 from __future__ import print_function
 from collections import namedtuple
+import functools
 import os
+import sys
+from .cache import cached
 
 FILENAME = os.path.join(
     os.path.dirname(__file__), 'data', 'projectOptions.ini')
+FILENAME_DISPATCHER = os.path.join(
+    os.path.dirname(__file__), 'data', 'commands_dispatcher.txt')
 
 CommandEntry = namedtuple('CommandEntry',
                           'name id nbytes args format description')
@@ -20,7 +25,14 @@ NBYTES_CODE = {
 }
 
 
+@functools.lru_cache(maxsize=None)
 def convert_arg(name, rtype):
+    """
+    Return the ArgumentEntry of a command argument. The entries of the
+    arguments with the same name and type, such as asicNum, are shared by
+    the commands.
+
+    """
     atype = rtype
     try:
         size, atype = atype.split('*')
@@ -62,7 +74,9 @@ def convert_arg(name, rtype):
         dstype += '[{}]'.format(size)
     if atype == 'bytearray':
         pyarg
-    return ArgumentEntry(name, size, pyarg, cytype, nptype, dstype, rtype)
+    intern = sys.intern
+    return ArgumentEntry(intern(name), size, intern(pyarg), intern(cytype),
+                         intern(nptype), intern(dstype), intern(rtype))
 
 
 def read_command(line):
@@ -79,12 +93,24 @@ def read_command(line):
     nbytes = int(info[2])
     args = [convert_arg(info[i], info[i+1])
             for i in range(4, len(info)-1, 2)]
-    format = info[-1]
+    format = sys.intern(info[-1])
     return CommandEntry(
-        name, id, nbytes, args, format, description)
+        sys.intern(name), id, nbytes, args, format, description)
 
 
 def read_commands(filename=FILENAME):
+    """
+    Read the commands from the project options file and from the dispatcher
+    commands file.
+
+    The parsed table is cached, see the cache module.
+
+    """
+    return cached('commands', (filename, FILENAME_DISPATCHER),
+                  _read_commands, filename)
+
+
+def _read_commands(filename):
     out = []
     with open(filename) as f:
         while True:
@@ -106,9 +132,7 @@ def read_commands(filename=FILENAME):
             out.extend([read_command(_) for _ in line.split('\n')
                         if len(_) > 0 and not _.startswith('#')])
 
-    filename2 = os.path.join(
-        os.path.dirname(__file__), 'data', 'commands_dispatcher.txt')
-    with open(filename2) as f:
+    with open(FILENAME_DISPATCHER) as f:
         for line in f:
             line = line.strip()
             if len(line) == 0 or line.startswith('#'):
@@ -1,20 +1,59 @@
 from libcpp cimport bool
-from libhelpers cimport connect_request, slot_request
+from libhelpers cimport (
+    connect_request, NB_REQUEST_SLOTS, RequestState, slot_request,
+    wait_request)
 from libqt cimport (
     QApplication, QByteArray, QList, QString, fromRawData, qint16)
 from libdispatcheraccess cimport TDispatcherAccess, TParamsComputer
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import Metrics
+from .parameters import parse_linear_tf, read_tf
+from .multiplexer import RequestMultiplexer
+from .pipeline import CommandPipeline
 cimport cython
 cimport numpy as np
 import numpy as np
+import os
 import re
+import threading
 import types
 
 __all__ = ['DispatcherAccess']
 
 cdef QApplication *_app = NULL
 _last_client = None
+_linear_tfs = None
+_executor = None
 DEFAULT_TIMEOUT = 5000  # ms
+RAW_DATA_PARAMETERS = ('QUBIC_RawDataFromTM', 'QUBIC_PreviewRawData',
+                       'QUBIC_WorkingRawData')
+
+
+def get_linear_tfs():
+    """
+    Return the coefficients (a, b) of the linear transfer functions 'ax + b'
+    of the TF file, indexed by parameter name.
+
+    """
+    global _linear_tfs
+    if _linear_tfs is None:
+        _linear_tfs = {}
+        for entry in read_tf():
+            coeffs = parse_linear_tf(entry.function)
+            if coeffs is not None:
+                _linear_tfs[entry.name] = coeffs
+    return _linear_tfs
+
+def get_executor():
+    """
+    Return the thread pool in which the raw data are converted.
+
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(os.cpu_count() or 1)
+    return _executor
 
 cdef class Parameter
 # cdef class ParameterTable
@@ -34,6 +73,15 @@ cdef class DispatcherAccess:
     # otherwise we get the cython error "cannot convert to python object"
     cdef TDispatcherAccess *_da
     cdef TParamsComputer *_pc
+    cdef object _pc_lock  # serialises the calls to _pc without the GIL
+    cdef RequestState *_state
+    cdef object _parameters
+    cdef object _multiplexer
+    cdef object __weakref__
+    cdef object _metrics
+    cdef unsigned long long _nbOverlap_seen
+    cdef dict _tfs
+    cdef int _tfs_version
 
     def __cinit__(self, str dispatcherAddress=None, int dispatcherPort=-1):
         global _app, _last_client
@@ -61,20 +109,89 @@ cdef class DispatcherAccess:
         ### but somehow, the parameters get assigned somewhere along the line... not sure where.
         # self.parameters = get_parameters(self)
         self._pc = new TParamsComputer()
+        self._pc_lock = threading.Lock()
+        self._state = new RequestState()
         cdef slot_request slot = &requestArrived
-        connect_request(self._da, slot)
+        connect_request(self._da, slot, self._state)
         _last_client = self
 
     def __dealloc__(self):
         del self._da
         del self._pc
+        del self._state
         # del self.parameters
 
     
     property parameters:
+        """
+        The table of the dispatcher parameters, built on first access.
+
+        """
         def __get__(self):
-            return get_parameters(self)
-    
+            if self._parameters is None:
+                self._parameters = get_parameters(self)
+            return self._parameters
+
+    property multiplexer:
+        """
+        The RequestMultiplexer of the client, through which persistent
+        requests with the same trigger are shared (see the subscribe method).
+
+        """
+        def __get__(self):
+            if self._multiplexer is None:
+                self._multiplexer = RequestMultiplexer(self)
+            return self._multiplexer
+
+    property metrics:
+        """
+        The Metrics recorded by the requests of the client, or None if the
+        metrics are not enabled (see the enable_metrics method).
+
+        """
+        def __get__(self):
+            return self._metrics
+
+    def enable_metrics(self, bounds=None):
+        """
+        Enable the recording of the metrics of the requests: latency between
+        the arrival and the consumption of the transfers, number of consumed
+        transfers and copied bytes, iterations of the wait loops, timeouts,
+        ring buffer overflows and increase of nbOverlap. The metrics are
+        disabled by default, so that the requests do not pay for them.
+
+        Parameters
+        ----------
+        bounds : sequence of float, optional
+            The upper bounds in seconds of the latency histogram buckets.
+
+        Returns
+        -------
+        The Metrics, which can be exported with its as_dict and
+        to_prometheus methods.
+
+        """
+        if self._metrics is None:
+            if bounds is None:
+                self._metrics = Metrics(self)
+            else:
+                self._metrics = Metrics(self, bounds)
+            self._nbOverlap_seen = self._da.nbOverlap()
+        return self._metrics
+
+    def disable_metrics(self):
+        """ Stop the recording of the metrics of the requests. """
+        self._metrics = None
+
+    cdef unsigned long long _overlaps(self):
+        """ Return the increase of nbOverlap since the previous call. """
+        cdef unsigned long long nbOverlap = self._da.nbOverlap()
+        cdef unsigned long long out = 0
+        if nbOverlap > self._nbOverlap_seen:
+            out = nbOverlap - self._nbOverlap_seen
+        self._nbOverlap_seen = nbOverlap
+        return out
+
     property connected:
         def __get__(self):
             return self._da.isConnected()
@@ -163,14 +280,23 @@ cdef class DispatcherAccess:
             self._da.setAutoUpdateWithRequest(value)
 
     def startSubsystemAccess(self):
-        return self._da.startSubsystemAccess()
+        cdef bool out
+        with nogil:
+            out = self._da.startSubsystemAccess()
+        return out
 
     def stopSubsystemAccess(self):
-        return self._da.stopSubsystemAccess()
+        cdef bool out
+        with nogil:
+            out = self._da.stopSubsystemAccess()
+        return out
 
     def stopDispatcher(self, int stopCode):
         """ Stop code is parameterCRC() """
-        return self._da.stopDispatcher(stopCode)
+        cdef bool out
+        with nogil:
+            out = self._da.stopDispatcher(stopCode)
+        return out
 
     '''
     vvvvvvvvvvv
@@ -184,10 +310,20 @@ cdef class DispatcherAccess:
     '''
 
     def waitMs(self, int milliseconds):
-        self._da.waitMs(milliseconds)
+        """
+        Wait for the specified duration, while processing the Qt events. The
+        GIL is released, so that the other Python threads are not blocked.
+
+        """
+        with nogil:
+            self._da.waitMs(milliseconds)
 
     def sendReloadTF(self):
-        return self._da.sendReloadTF()
+        cdef bool out
+        with nogil:
+            out = self._da.sendReloadTF()
+        invalidate_tf()
+        return out
 
     property dispatcherTFVersionLoaded:
         def __get__(self):
@@ -240,9 +376,37 @@ cdef class DispatcherAccess:
     ^^^^^^^^^^^^^
     '''
 
+    def _emit_request_arrived(self, int num):
+        """
+        For testing purposes: emit the signal that the request num has
+        arrived, from the calling thread and without the GIL.
+
+        """
+        if num < 0 or num >= NB_REQUEST_SLOTS:
+            raise ValueError('Invalid request number.')
+        with nogil:
+            self._da.requestArrived(num)
+
+    def _wait_request_arrived(self, int num, int timeout):
+        """
+        For testing purposes: wait for the arrival of the request num as
+        AbstractRequest.wait does, and return True if it has arrived before
+        the timeout in ms.
+
+        """
+        cdef bool arrived
+        cdef RequestState *state = self._state
+        if num < 0 or num >= NB_REQUEST_SLOTS:
+            raise ValueError('Invalid request number.')
+        with nogil:
+            arrived = wait_request(&state.mutex, &state.condition,
+                                   &state.arrived[num], timeout)
+        return arrived
+
     def abort_requests(self):
         """ Abort all pending persistent requests. """
-        self._da.disableAllRequestedParameters()
+        with nogil:
+            self._da.disableAllRequestedParameters()
 
     def fetch(self, parameters, object trigger=0, int timeout=DEFAULT_TIMEOUT):
         """
@@ -280,8 +444,28 @@ cdef class DispatcherAccess:
         request = RequestOneTime(self, parameters, timeout, trigger)
         return request.next()
 
+    async def afetch(self, parameters, object trigger=0,
+                     int timeout=DEFAULT_TIMEOUT):
+        """
+        Coroutine version of the fetch method.
+
+        The requests awaited in the same asyncio loop share a single Qt event
+        pump, so that they can be fetched concurrently in one thread.
+
+        Examples
+        --------
+        >>> hk, data = await asyncio.gather(
+        ...     client.afetch('QUBIC_Nsample'),
+        ...     client.afetch('QUBIC_AllPixelsScientificData'))
+
+        """
+        if isinstance(parameters, str):
+            parameters = [_.strip() for _ in parameters.split(',')]
+        request = RequestOneTime(self, parameters, timeout, trigger)
+        return await request.anext()
+
     def request(self, parameters, object trigger=None, int every=1,
-                int timeout=DEFAULT_TIMEOUT):
+                int timeout=DEFAULT_TIMEOUT, object buffer_size=None):
         """
         Send a persistent request to the dispatcher.
 
@@ -299,6 +483,11 @@ cdef class DispatcherAccess:
         timeout : int, optional
             The request timeout in ms. It controls the duration after which
             calls to the wait method are aborted through a TimeoutException.
+        buffer_size : int, optional
+            The number of transfers held by the ring buffer of the request,
+            into which the requested parameters are copied on arrival. By
+            default, RING_BUFFER_SIZE transfers, within the limit of
+            RING_BUFFER_MAXSIZE bytes. If zero, the request is not buffered.
 
         Examples
         --------
@@ -313,46 +502,384 @@ cdef class DispatcherAccess:
         'QUBIC_AllPixelsScientificData_0' changes:
         >>> req = client.request(parameters, 'QUBIC_AllPixelsScientificData_0')
 
+        To iterate over the request in an asyncio coroutine:
+        >>> async for values in client.request(parameters, 100):
+        ...     process(values)
+
         """
         if isinstance(parameters, str):
             parameters = [_.strip() for _ in parameters.split(',')]
-        return RequestPersistent(self, parameters, timeout, trigger, every)
+        return RequestPersistent(self, parameters, timeout, trigger, every,
+                                 buffer_size)
+
+    def subscribe(self, parameters, object trigger=None, int every=1,
+                  object buffer_size=None):
+        """
+        Subscribe to a persistent request shared with the other subscriptions
+        with the same trigger, so that many consumers of overlapping
+        parameters use a single request slot of the client.
+
+        The arguments are those of the request method. The returned
+        Subscription has the next, next_batch and abort methods of a
+        persistent request. The shared request is aborted with its last
+        subscription.
+
+        Examples
+        --------
+        >>> sub = client.subscribe(['QUBIC_Nsample', 'EXT_Temperatures'],
+        ...                        1000)
+        >>> nsample, temperatures = sub.next()
+        >>> sub.abort()
+
+        """
+        return self.multiplexer.subscribe(parameters, trigger, every,
+                                          buffer_size)
+
+    def pipeline(self, int max_in_flight=4, bool ordered=True):
+        """
+        Return a CommandPipeline, to send commands with up to max_in_flight
+        of them awaiting their acknowledgement.
+
+        Since a dispatcher client waits for the acknowledgement of a command
+        before sending the next one, max_in_flight - 1 additional clients are
+        created, each of them opening its own TCP connection to the
+        dispatcher (and holding its own request slots and kernel thread).
+        They are released when the pipeline is closed. The dispatcher must not
+        be in exclusive command mode (see startSubsystemAccess), and it must
+        accept as many client connections.
+
+        The commands are sent from the worker threads of the pipeline, one
+        per client, and not from the thread which created the clients: each
+        client is only used by its worker while the pipeline is open. This
+        client is driven by the first worker, so that its commands must not
+        be sent from other threads until the pipeline is closed.
+
+        Parameters
+        ----------
+        max_in_flight : int, optional
+            The number of commands awaiting their acknowledgement.
+        ordered : boolean, optional
+            If true, the commands with the same first argument, such as the
+            ASIC number, are sent in the order in which they are queued.
+
+        Examples
+        --------
+        >>> with client.pipeline(8) as pipeline:
+        ...     for asic in range(16):
+        ...         for address in range(16):
+        ...             pipeline.sendSetAsicParam(asic, address, values[asic, address])
+        >>> results = pipeline.results()
+
+        """
+        global _last_client
+        if max_in_flight < 1:
+            raise ValueError('The number of commands in flight must be at '
+                             'least 1.')
+        last_client = _last_client
+        address = self.dispatcherAddress.decode('UTF-8')
+        clients = []
+        try:
+            for i in range(max_in_flight - 1):
+                clients.append(DispatcherAccess(address,
+                                                self.dispatcherPort))
+        finally:
+            _last_client = last_client
+        return CommandPipeline([self] + clients, ordered, clients)
+
+    cdef object _get_linear_tf(self, int parameter_id):
+        """
+        Return the coefficients (a, b) of the transfer function of a parameter
+        if it is linear, or None otherwise. The coefficients read from the TF
+        file are checked against the dispatcher library transfer function.
+
+        """
+        cdef double a, b, x = 1000.5, y
+        if self._tfs is None or self._tfs_version != _tf_version:
+            self._tfs = {}
+            self._tfs_version = _tf_version
+        try:
+            return self._tfs[parameter_id]
+        except KeyError:
+            pass
+        try:
+            name = self.parameters[parameter_id].name
+        except ValueError:
+            coeffs = None
+        else:
+            coeffs = get_linear_tfs().get(name)
+        if coeffs is not None:
+            a, b = coeffs
+            y = a * x + b
+            tol = 1e-6 * abs(a * x)
+            with self._pc_lock:
+                if abs(self._pc.calculate(parameter_id, 0) - b) > tol or \
+                   abs(self._pc.calculate(parameter_id, x) - y) > tol or \
+                   abs(self._pc.invCalculate(parameter_id, y) - x) > \
+                   1e-6 * x:
+                    coeffs = None
+        self._tfs[parameter_id] = coeffs
+        return coeffs
 
     @cython.boundscheck(False)
-    def convertADU2Value(self, parameter, object x not None):
-        cdef int i, parameter_id
-        cdef double[::1] x__, out_
+    @cython.wraparound(False)
+    def convertADU2Value(self, parameter, object x not None,
+                         bool vectorize=True):
+        """
+        Convert ADU into physical values through the parameter transfer
+        function.
+
+        Parameters
+        ----------
+        parameter : str or int
+            The parameter name or id.
+        x : array-like
+            The values in ADU.
+        vectorize : boolean, optional
+            If true, the linear transfer functions are evaluated with array
+            operations. Otherwise, or if the transfer function is not linear,
+            it is evaluated element by element by the dispatcher library,
+            without holding the GIL.
+
+        """
+        cdef Py_ssize_t i, n
+        cdef int parameter_id
+        cdef double[::1] x_, out_
         if isinstance(parameter, int):
             parameter_id = parameter
         else:
             parameter_id = self.parameters[parameter].id
         x = np.asarray(x, np.float64, 'C')
-        x_ = x.ravel()
-        out = np.empty_like(x)
-        out_ = out.ravel()
-        for i in range(x_.size):
-            out_[i] = self._pc.calculate(parameter_id, x_[i])
+        coeffs = self._get_linear_tf(parameter_id) if vectorize else None
+        if coeffs is not None:
+            out = coeffs[0] * x + coeffs[1]
+        else:
+            out = np.empty_like(x)
+            x_ = x.ravel()
+            out_ = out.ravel()
+            n = x_.shape[0]
+            with self._pc_lock:
+                with nogil:
+                    for i in range(n):
+                        out_[i] = self._pc.calculate(parameter_id, x_[i])
         if x.ndim == 0:
             return out[()]
         return out
 
     @cython.boundscheck(False)
-    def convertValue2ADU(self, parameter, object x not None):
-        cdef int i, parameter_id
-        cdef double[::1] x__, out_
+    @cython.wraparound(False)
+    def convertValue2ADU(self, parameter, object x not None,
+                         bool vectorize=True):
+        """
+        Convert physical values into ADU through the parameter inverse
+        transfer function.
+
+        Parameters
+        ----------
+        parameter : str
+            The parameter name.
+        x : array-like
+            The physical values.
+        vectorize : boolean, optional
+            If true, the inverse of the linear transfer functions are
+            evaluated with array operations. Otherwise, or if the transfer
+            function is not linear, it is evaluated element by element by the
+            dispatcher library, without holding the GIL.
+
+        """
+        cdef Py_ssize_t i, n
+        cdef int parameter_id
+        cdef double[::1] x_, out_
         parameter_ = self.parameters[parameter]
         parameter_id = parameter_.id
         x = np.asarray(x, np.float64, 'C')
-        x_ = x.ravel()
-        out = np.empty_like(x)
-        out_ = out.ravel()
-        for i in range(x_.size):
-            out_[i] = self._pc.invCalculate(parameter_id, x_[i])
+        coeffs = self._get_linear_tf(parameter_id) if vectorize else None
+        if coeffs is not None:
+            out = (x - coeffs[1]) / coeffs[0]
+        else:
+            out = np.empty_like(x)
+            x_ = x.ravel()
+            out_ = out.ravel()
+            n = x_.shape[0]
+            with self._pc_lock:
+                with nogil:
+                    for i in range(n):
+                        out_[i] = self._pc.invCalculate(parameter_id, x_[i])
         out = np.array(out, dtype=parameter_.value.dtype, copy=False)
         if x.ndim == 0:
             return out[()]
         return out
 
+    def fetch_raw(self, str parameter='QUBIC_PreviewRawData', asics=None,
+                  object tf=None, object trigger=0,
+                  int timeout=DEFAULT_TIMEOUT, int nthreads=0):
+        """
+        Fetch a raw data parameter as a whole, in a single request.
+
+        The upper bound of the parameter (QUBIC_Nsample for
+        QUBIC_RawDataFromTM, QUBIC_PreviewRawDataSize for
+        QUBIC_PreviewRawData...) is applied once to the whole array, instead
+        of fetching the per-ASIC meta-parameters such as
+        'QUBIC_WorkingRawData_0' one by one.
+
+        Parameters
+        ----------
+        parameter : str, optional
+            The raw data parameter, one of RAW_DATA_PARAMETERS.
+        asics : int, slice or sequence of int, optional
+            The selected ASICs, for the parameters of shape (16, 128, n).
+        tf : str or int, optional
+            If specified, the parameter whose transfer function converts the
+            raw data into physical values, see the convert_raw method.
+        trigger : int or str, optional
+            The trigger of the request, see the fetch method.
+        timeout : int, optional
+            The request timeout in ms.
+        nthreads : int, optional
+            The number of threads of the conversion.
+
+        Examples
+        --------
+        >>> raw = client.fetch_raw('QUBIC_PreviewRawData', asics=[0, 1])
+        >>> raw.shape
+        (2, 128, 100)
+
+        """
+        if parameter not in RAW_DATA_PARAMETERS:
+            raise ValueError(
+                "Invalid raw data parameter '{0}'. Expected parameters are: {1"
+                "}.".format(parameter, ', '.join(RAW_DATA_PARAMETERS)))
+        value = self.fetch(parameter, trigger, timeout)
+        if asics is not None:
+            if value.ndim < 3:
+                raise ValueError(
+                    "The parameter '{0}' is not split by ASIC.".format(
+                        parameter))
+            value = value[asics]
+        if tf is None:
+            return value
+        return self.convert_raw(tf, value, nthreads)
+
+    def fetch_timeline(self, timeline not None,
+                       str parameter='QUBIC_PixelScientificDataTimeLine',
+                       object trigger=0, int timeout=DEFAULT_TIMEOUT):
+        """
+        Fetch the samples of a timeline parameter which have been added since
+        the last call, and append them to a timeline buffer.
+
+        The size counter of the parameter (its upper bound, such as
+        QUBIC_PixelScientificDataTimeLineSize) is tracked by the timeline
+        buffer, and only the new samples are copied from the parameter table,
+        instead of the whole parameter.
+
+        Parameters
+        ----------
+        timeline : TimeLine
+            The timeline buffer, see pystudio.timeline.
+        parameter : str, optional
+            The timeline parameter, whose last dimension is bounded by a size
+            counter.
+        trigger : int or str, optional
+            The trigger of the request, see the fetch method.
+        timeout : int, optional
+            The request timeout in ms.
+
+        Returns
+        -------
+        The view of the samples appended to the timeline buffer.
+
+        Examples
+        --------
+        >>> from pystudio.timeline import TimeLine
+        >>> timeline = TimeLine()
+        >>> new = client.fetch_timeline(timeline, trigger=1000)
+        >>> timeline.data.shape
+        (16, 128, 230)
+
+        """
+        cdef Parameter param = self.parameters[parameter]
+        if param.ubound == -1 or len(param.full_shape()) == 0:
+            raise ValueError(
+                "The parameter '{0}' has no size counter.".format(parameter))
+        request = RequestOneTime(self, [parameter], timeout, trigger)
+        return request._update_timeline(timeline)
+
+    def convert_raw(self, parameter, object x not None, int nthreads=0):
+        """
+        Convert raw data in ADU into physical values through the transfer
+        function of a parameter.
+
+        If the transfer function is linear, the conversion is split into
+        blocks, one per ASIC for arrays of shape (nasics, ...), which are
+        converted in a thread pool without holding the GIL. Otherwise, the
+        transfer function is evaluated element by element by the dispatcher
+        library, which is not thread-safe: the conversion is done in the
+        calling thread, without holding the GIL.
+
+        Parameters
+        ----------
+        parameter : str or int
+            The parameter name or id.
+        x : array-like
+            The raw data in ADU.
+        nthreads : int, optional
+            The maximum number of blocks converted concurrently through a
+            linear transfer function. By default, the number of CPUs.
+
+        """
+        cdef int parameter_id
+        if isinstance(parameter, int):
+            parameter_id = parameter
+        else:
+            parameter_id = self.parameters[parameter].id
+        x = np.asarray(x)
+        out = np.empty(x.shape, np.float64)
+        if x.size == 0:
+            return out
+        if nthreads <= 0:
+            nthreads = os.cpu_count() or 1
+        coeffs = self._get_linear_tf(parameter_id)
+        if coeffs is None:
+            self._convert_block(parameter_id, None, x.reshape(-1),
+                                out.reshape(-1))
+            return out
+        if x.ndim > 1:
+            nblocks = x.shape[0]
+        else:
+            nblocks = min(nthreads, x.size)
+        x_blocks = np.array_split(x.reshape(-1), nblocks)
+        out_blocks = np.array_split(out.reshape(-1), nblocks)
+        executor = get_executor()
+        for i in range(0, nblocks, nthreads):
+            list(executor.map(
+                self._convert_block, [parameter_id] * nthreads,
+                [coeffs] * nthreads, x_blocks[i:i+nthreads],
+                out_blocks[i:i+nthreads]))
+        return out
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def _convert_block(self, int parameter_id, object coeffs, object x,
+                       double[::1] out):
+        """
+        Convert in place a block of raw data through a transfer function,
+        without holding the GIL. The non-linear transfer functions are
+        evaluated by the shared TParamsComputer, one block at a time.
+
+        """
+        cdef Py_ssize_t i, n = out.shape[0]
+        cdef double a, b
+        np.copyto(np.asarray(out), x, casting='unsafe')
+        if coeffs is None:
+            with self._pc_lock:
+                with nogil:
+                    for i in range(n):
+                        out[i] = self._pc.calculate(parameter_id, out[i])
+        else:
+            a, b = coeffs
+            with nogil:
+                for i in range(n):
+                    out[i] = a * out[i] + b
+
     def sendCustomCommand(self, int asicNum, int id, int cn, corps not None):
         """
         sendCustomCommand(int asicNum, int id, int cn, uint8[:] corps)
@@ -366,7 +893,9 @@ cdef class DispatcherAccess:
                 "The command body data type is not uint8.")
         cdef char[::1] corps_ = corps
         cdef QByteArray corps__ = fromRawData(&corps_[0], corps.size)
-        cdef bool out = self._da.sendCustomCommand(asicNum, id, cn, corps__)
+        cdef bool out
+        with nogil:
+            out = self._da.sendCustomCommand(asicNum, id, cn, corps__)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -377,7 +906,9 @@ cdef class DispatcherAccess:
         configure l'asic (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicParam(asicNum, address, value)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicParam(asicNum, address, value)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -387,7 +918,9 @@ cdef class DispatcherAccess:
         Specifie le signal de calib a injecter sur les TES mode:0 pas de signal, 1 envoi du signal, shape: 0 sinus, 1 triangle, 2 continu  (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-       cdef bool out = self._da.sendSetTESDAC(asicNum, shape, frequency, amplitude, offset)
+       cdef bool out
+       with nogil:
+           out = self._da.sendSetTESDAC(asicNum, shape, frequency, amplitude, offset)
        if not out:
            raise RuntimeError(self.lastError)
 
@@ -399,7 +932,9 @@ cdef class DispatcherAccess:
         polarisation des blocs analogiques (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicApol(asicNum, value)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicApol(asicNum, value)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -410,7 +945,9 @@ cdef class DispatcherAccess:
         polarisation des squids (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicSpol(asicNum, value)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicSpol(asicNum, value)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -421,7 +958,9 @@ cdef class DispatcherAccess:
         tension de mode commun Vicm (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicVicm(asicNum, value)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicVicm(asicNum, value)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -432,7 +971,9 @@ cdef class DispatcherAccess:
         tension de mode commun Vocm (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicVocm(asicNum, value)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicVocm(asicNum, value)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -443,7 +984,9 @@ cdef class DispatcherAccess:
         circuit d'adressage: position initiale et finale colonne (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicSetColumn(asicNum, startStopCol)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicSetColumn(asicNum, startStopCol)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -454,7 +997,9 @@ cdef class DispatcherAccess:
         circuit d'adressage: position initiale ligne (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicSelStartRow(asicNum, value)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicSelStartRow(asicNum, value)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -465,7 +1010,9 @@ cdef class DispatcherAccess:
         circuit d'adressage: position finale ligne (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicSelLastRow(asicNum, value)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicSelLastRow(asicNum, value)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -476,7 +1023,9 @@ cdef class DispatcherAccess:
         Envoi une pulse RAZb (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicRazb(asicNum)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicRazb(asicNum)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -487,7 +1036,9 @@ cdef class DispatcherAccess:
         Envoi une pulse INIb (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetAsicInib(asicNum)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicInib(asicNum)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -503,7 +1054,9 @@ cdef class DispatcherAccess:
         if feedbackTable_.size != 128:
             raise ValueError("Expected array size of argument 'feedbackTable' is '128'.")
         cdef qint16[::1] feedbackTable__ = feedbackTable_
-        cdef bool out = self._da.sendSetFeedbackTable(asicNum, <quint16*>&feedbackTable__[0])
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetFeedbackTable(asicNum, <quint16*>&feedbackTable__[0])
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -518,7 +1071,9 @@ cdef class DispatcherAccess:
         if offsetTable_.size != 128:
             raise ValueError("Expected array size of argument 'offsetTable' is '128'.")
         cdef qint16[::1] offsetTable__ = offsetTable_
-        cdef bool out = self._da.sendSetOffsetTable(asicNum, <quint16*>&offsetTable__[0])
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetOffsetTable(asicNum, <quint16*>&offsetTable__[0])
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -533,7 +1088,9 @@ cdef class DispatcherAccess:
         if mask_.size != 125:
             raise ValueError("Expected array size of argument 'mask' is '125'.")
         cdef quint8[::1] mask__ = mask_
-        cdef bool out = self._da.sendSetMask(asicNum, &mask__[0])
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetMask(asicNum, &mask__[0])
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -544,7 +1101,9 @@ cdef class DispatcherAccess:
         configure le Nsample pour tous les ASICs
 
         """
-        cdef bool out = self._da.sendSetNSample(Nsample)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetNSample(Nsample)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -555,7 +1114,9 @@ cdef class DispatcherAccess:
         demarrage de l'acquisition de la carte NetQuic (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendStartAcq(asicNum)
+        cdef bool out
+        with nogil:
+            out = self._da.sendStartAcq(asicNum)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -566,7 +1127,9 @@ cdef class DispatcherAccess:
         arret de l'acquisition de la carte NetQuic (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendStopAcq(asicNum)
+        cdef bool out
+        with nogil:
+            out = self._da.sendStopAcq(asicNum)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -577,7 +1140,9 @@ cdef class DispatcherAccess:
         reset de la carte NetQuic (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendResetNetquic(asicNum)
+        cdef bool out
+        with nogil:
+            out = self._da.sendResetNetquic(asicNum)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -588,7 +1153,9 @@ cdef class DispatcherAccess:
         bascule en mode raw signal cycle (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetCycleRawMode(asicNum, undersampling)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetCycleRawMode(asicNum, undersampling)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -599,7 +1166,9 @@ cdef class DispatcherAccess:
         configure un signal a 1 ou 0
 
         """
-        cdef bool out = self._da.sendSetAsicConf(asicNum, signalId, state)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetAsicConf(asicNum, signalId, state)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -610,7 +1179,9 @@ cdef class DispatcherAccess:
         demande le paquet status de la carte NetQuic (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendGetStatus(asicNum)
+        cdef bool out
+        with nogil:
+            out = self._da.sendGetStatus(asicNum)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -621,7 +1192,9 @@ cdef class DispatcherAccess:
         change la frequence du lien serie pour les commandes ASIC 0-200=> 0=>2kHz (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetASICSerialLinkFrequency(serialFreq)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetASICSerialLinkFrequency(serialFreq)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -632,7 +1205,9 @@ cdef class DispatcherAccess:
         configure les parametres de la regul (si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendConfigurePID(asicNum, P, I, D)
+        cdef bool out
+        with nogil:
+            out = self._da.sendConfigurePID(asicNum, P, I, D)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -643,7 +1218,9 @@ cdef class DispatcherAccess:
         active la regulation onOff = 1, desactive la regulation onOff = 0(si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendActivatePID(asicNum, onOff)
+        cdef bool out
+        with nogil:
+            out = self._da.sendActivatePID(asicNum, onOff)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -651,7 +1228,9 @@ cdef class DispatcherAccess:
         """
         choose the feedback relay resistance: 100kOhm, 10kOhm
         """
-        cdef bool out = self._da.sendSetFeedbackRelay(asicNum, bitmask)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetFeedbackRelay(asicNum, bitmask)
         if not out:
             raise RuntimeError(self.lastError)
         
@@ -664,7 +1243,9 @@ cdef class DispatcherAccess:
         reset des valeurs VOffset (mise a 0) de l'asic specifie(si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendResetVOffset(asicNum)
+        cdef bool out
+        with nogil:
+            out = self._da.sendResetVOffset(asicNum)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -675,7 +1256,9 @@ cdef class DispatcherAccess:
         configure la valeur VOffset pour le pixel (ou tous les pixels si pixelNum = 0xFF) de l'asic specifie(si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetVOffset(asicNum, pixelNum, voffset)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetVOffset(asicNum, pixelNum, voffset)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -690,7 +1273,9 @@ cdef class DispatcherAccess:
         if voffset_.size != 128:
             raise ValueError("Expected array size of argument 'voffset' is '128'.")
         cdef float[::1] voffset__ = voffset_
-        cdef bool out = self._da.sendSetVOffsets(asicNum, &voffset__[0])
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetVOffsets(asicNum, &voffset__[0])
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -701,7 +1286,9 @@ cdef class DispatcherAccess:
         reset des valeurs Vout2Iin (mise a 1) de l'asic specifie(si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendResetVout2IinCoeffs(asicNum)
+        cdef bool out
+        with nogil:
+            out = self._da.sendResetVout2IinCoeffs(asicNum)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -712,7 +1299,9 @@ cdef class DispatcherAccess:
         configure la valeur Vout2Iin =  Min/Mfb* Rfb pour l'asic specifie(si asicNum = 0xFF, la commande est envoyée a tous les ASIC, si asic num < 16, la commande est envoyée a l'ASIC asicNum, pour envoyer à une liste d'ASICs utiliser les bits 8 à 23 pour specifier la liste, ex asicNum = 0x00FF00 configurera les asic 0 à 7)
 
         """
-        cdef bool out = self._da.sendSetVout2IinCoeffs(asicNum, MinMfb, Rfb)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetVout2IinCoeffs(asicNum, MinMfb, Rfb)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -731,7 +1320,9 @@ cdef class DispatcherAccess:
         if Rfb_.size != 16:
             raise ValueError("Expected array size of argument 'Rfb' is '16'.")
         cdef float[::1] Rfb__ = Rfb_
-        cdef bool out = self._da.sendSetVout2IinsCoeffs(&MinMfb__[0], &Rfb__[0])
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetVout2IinsCoeffs(&MinMfb__[0], &Rfb__[0])
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -742,7 +1333,9 @@ cdef class DispatcherAccess:
         applique la fonction de transfert : 0 => signal brut, 1 => Vout, 2 => Iin
 
         """
-        cdef bool out = self._da.sendSetScientificDataTfUsed(tfused)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetScientificDataTfUsed(tfused)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -761,7 +1354,9 @@ cdef class DispatcherAccess:
         cdef QString sessionName__ = QString(sessionName_)
         cdef QByteArray comment_ = QByteArray(comment, len(comment))
         cdef QString comment__ = QString(comment_)
-        cdef bool out = self._da.sendStartBackup(sessionName__, comment__)
+        cdef bool out
+        with nogil:
+            out = self._da.sendStartBackup(sessionName__, comment__)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -773,7 +1368,9 @@ cdef class DispatcherAccess:
         stop backup
 
         """
-        cdef bool out = self._da.sendStopBackup()
+        cdef bool out
+        with nogil:
+            out = self._da.sendStopBackup()
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -786,7 +1383,9 @@ cdef class DispatcherAccess:
         """
         cdef QByteArray sessionName_ = QByteArray(sessionName, len(sessionName))
         cdef QString sessionName__ = QString(sessionName_)
-        cdef bool out = self._da.sendStartRawBackup(sessionName__)
+        cdef bool out
+        with nogil:
+            out = self._da.sendStartRawBackup(sessionName__)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -797,7 +1396,9 @@ cdef class DispatcherAccess:
         stop raw backup
 
         """
-        cdef bool out = self._da.sendStopRawBackup()
+        cdef bool out
+        with nogil:
+            out = self._da.sendStopRawBackup()
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -813,7 +1414,9 @@ cdef class DispatcherAccess:
         cdef QString sessionName__ = QString(sessionName_)
         cdef QByteArray comment_ = QByteArray(comment, len(comment))
         cdef QString comment__ = QString(comment_)
-        cdef bool out = self._da.sendStartHKBackup(sessionName__, comment__)
+        cdef bool out
+        with nogil:
+            out = self._da.sendStartHKBackup(sessionName__, comment__)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -824,7 +1427,9 @@ cdef class DispatcherAccess:
         stop HK backup
 
         """
-        cdef bool out = self._da.sendStopHKBackup()
+        cdef bool out
+        with nogil:
+            out = self._da.sendStopHKBackup()
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -842,7 +1447,9 @@ cdef class DispatcherAccess:
         """
         cdef QByteArray directory_ = QByteArray(directory, len(directory))
         cdef QString directory__ = QString(directory_)
-        cdef bool out = self._da.sendSetBackupDir(directory__)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetBackupDir(directory__)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -853,7 +1460,9 @@ cdef class DispatcherAccess:
         reset the subsystem
 
         """
-        cdef bool out = self._da.sendResetSubsystem(subsystemId)
+        cdef bool out
+        with nogil:
+            out = self._da.sendResetSubsystem(subsystemId)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -864,7 +1473,9 @@ cdef class DispatcherAccess:
         reset the decommutation flags for the subsytem, if subsytemId = 0xFF reset all subsystems flags (DISP_DecommuteLastErrorCode, DISP_Decommute...)
 
         """
-        cdef bool out = self._da.sendResetDecommutationFlags(subsytemId)
+        cdef bool out
+        with nogil:
+            out = self._da.sendResetDecommutationFlags(subsytemId)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -879,7 +1490,9 @@ cdef class DispatcherAccess:
         cdef QString key__ = QString(key_)
         cdef QByteArray comment_ = QByteArray(comment, len(comment))
         cdef QString comment__ = QString(comment_)
-        cdef bool out = self._da.sendAddToLogbook(key__, comment__)
+        cdef bool out
+        with nogil:
+            out = self._da.sendAddToLogbook(key__, comment__)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -892,7 +1505,9 @@ cdef class DispatcherAccess:
         """
         cdef QByteArray filename_ = QByteArray(filename, len(filename))
         cdef QString filename__ = QString(filename_)
-        cdef bool out = self._da.sendSetLogBookFilename(filename__)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetLogBookFilename(filename__)
         if not out:
             raise RuntimeError(self.lastError)
 
@@ -905,6 +1520,8 @@ cdef class DispatcherAccess:
         """
         cdef QByteArray directory_ = QByteArray(directory, len(directory))
         cdef QString directory__ = QString(directory_)
-        cdef bool out = self._da.sendSetLogBookBaseDirectory(directory__)
+        cdef bool out
+        with nogil:
+            out = self._da.sendSetLogBookBaseDirectory(directory__)
         if not out:
             raise RuntimeError(self.lastError)
@@ -0,0 +1,718 @@
+"""
+In-process stand-in for the dispatcher.
+
+The FakeDispatcherAccess client has the request and command interface of
+DispatcherAccess, but no dispatcher is involved: the parameters of the
+dispatcher table are updated by a scheduler thread, the scientific data
+(QUBIC_AllPixelsScientificData*) at the ASIC sampling rate and the other
+parameters, referred to as housekeeping, at a lower rate. The commands are
+acknowledged after a configurable delay.
+
+It is a mock of the Python interface of DispatcherAccess, not a stand-in
+dispatcher speaking its protocol: the compiled client (kernel thread,
+request slot, ring buffers and waits) is not involved. It is meant to test
+and benchmark the code built on the client interface, on machines without
+access to the QubicStudio dispatcher.
+
+Examples
+--------
+>>> from pystudio.fake import FakeDispatcherAccess
+>>> client = FakeDispatcherAccess(science_rate=156.25, hk_rate=1)
+>>> req = client.request('QUBIC_AllPixelsScientificData')
+>>> data = req.next_batch(100)
+>>> client.sendSetNSample(100)
+>>> client.fetch('QUBIC_Nsample')
+100
+
+"""
+from __future__ import division, print_function
+import asyncio
+import collections
+import heapq
+import itertools
+import threading
+import time
+import numpy as np
+from .metrics import Metrics
+from .parameters import read_all_params
+from .multiplexer import RequestMultiplexer
+from .pipeline import CommandPipeline
+
+__all__ = ['FakeDispatcherAccess', 'TimeoutError']
+
+DEFAULT_TIMEOUT = 5000  # ms
+MAX_NB_REQUEST = 256
+RING_BUFFER_SIZE = 100
+SCIENCE_RATE = 156.25  # Hz
+HK_RATE = 1.  # Hz
+ACK_DELAY = 0.001  # s
+NSAMPLE = 100
+POOL_SIZE = 16  # number of distinct synthetic values per parameter
+POOL_MAXSIZE = 16 * 1024**2  # bytes
+SCIENCE_PREFIX = 'QUBIC_AllPixelsScientificData'
+TIMELINE = 'QUBIC_PixelScientificDataTimeLine'
+
+DTYPES = {
+    0x00: np.uint8,
+    0x01: np.uint16,
+    0x02: np.uint32,
+    0x03: np.uint32,
+    0x07: np.uint64,
+    0x08: np.int8,
+    0x09: np.int16,
+    0x0A: np.int32,
+    0x0B: np.int32,
+    0x0F: np.int64,
+    0x13: np.float32,
+    0x27: np.float64,
+}
+
+COMMANDS = (
+    'sendCustomCommand', 'sendSetAsicParam', 'sendSetTESDAC',
+    'sendSetAsicApol', 'sendSetAsicSpol', 'sendSetAsicVicm', 'sendSetAsicVocm',
+    'sendSetAsicSetColumn', 'sendSetAsicSelStartRow', 'sendSetAsicSelLastRow',
+    'sendSetAsicRazb', 'sendSetAsicInib', 'sendSetFeedbackTable',
+    'sendSetOffsetTable', 'sendSetMask', 'sendSetNSample', 'sendStartAcq',
+    'sendStopAcq', 'sendResetNetquic', 'sendSetCycleRawMode',
+    'sendSetAsicConf', 'sendGetStatus', 'sendSetASICSerialLinkFrequency',
+    'sendConfigurePID', 'sendActivatePID', 'sendSetFeedbackRelay',
+    'sendResetVOffset', 'sendSetVOffset', 'sendSetVOffsets',
+    'sendResetVout2IinCoeffs', 'sendSetVout2IinCoeffs',
+    'sendSetVout2IinsCoeffs', 'sendSetScientificDataTfUsed',
+    'sendStartBackup', 'sendStopBackup', 'sendStartRawBackup',
+    'sendStopRawBackup', 'sendStartHKBackup', 'sendStopHKBackup',
+    'sendSetBackupDir', 'sendResetSubsystem', 'sendResetDecommutationFlags',
+    'sendAddToLogbook', 'sendSetLogBookFilename',
+    'sendSetLogBookBaseDirectory')
+
+FakeParameter = collections.namedtuple(
+    'FakeParameter', 'name id dtype shape ubound')
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class FakeRequest(object):
+    """
+    Request to the fake dispatcher, with the interface of RequestOneTime and
+    RequestPersistent. The requested parameters are copied into a ring buffer
+    of buffer_size transfers when the request is triggered.
+
+    """
+    def __init__(self, client, parameters, timeout, trigger, every,
+                 buffer_size, persistent):
+        self.client = client
+        self.timeout = timeout
+        self.params = [client.parameters[_] for _ in parameters]
+        self.persistent = persistent
+        self._buffered = buffer_size > 0
+        self._buffer = collections.deque(maxlen=max(buffer_size, 1))
+        self._received = 0
+        self._overflows = 0
+        self._every = every
+        self._count = 0
+        self._active = True
+        self._nwaits = 0
+        self._condition = threading.Condition(client._lock)
+        if isinstance(trigger, str):
+            self.error_msg = (
+                "The request timed out because the watched parameter '{0}' did"
+                " not change.".format(trigger))
+        else:
+            self.error_msg = 'The request timed out.'
+            self.timeout = max(timeout, trigger + trigger // 2)
+
+    @property
+    def buffer_size(self):
+        """ Capacity of the ring buffer, in number of transfers. """
+        return self._buffer.maxlen if self._buffered else 0
+
+    @property
+    def available(self):
+        """ Number of buffered transfers that have not been read yet. """
+        with self._condition:
+            return len(self._buffer)
+
+    @property
+    def received(self):
+        """ Number of transfers received since the request was sent. """
+        return self._received
+
+    @property
+    def overflows(self):
+        """ Number of transfers dropped because the ring buffer was full. """
+        return self._overflows
+
+    def _push(self, timestamp):
+        # called by the scheduler thread, with the client lock acquired
+        if not self._active:
+            return
+        self._count += 1
+        if self._count < self._every:
+            return
+        self._count = 0
+        if self._buffered and len(self._buffer) == self._buffer.maxlen:
+            self._overflows += 1
+        values = tuple(np.array(self.client._value(_)) for _ in self.params)
+        self._buffer.append((timestamp, values))
+        self._received += 1
+        if not self.persistent:
+            self._active = False
+            self.client._unregister(self)
+        self._condition.notify_all()
+
+    def _pop(self, n):
+        with self._condition:
+            transfers = [self._buffer.popleft() for _ in range(n)]
+        if self.client._metrics is not None:
+            self._record(transfers)
+        return transfers
+
+    def _record(self, transfers):
+        metrics = self.client._metrics
+        label = ','.join(_.name for _ in self.params)
+        metrics.record(
+            label, time.time() - np.array([_[0] for _ in transfers]),
+            len(transfers), sum(_.nbytes for t in transfers for _ in t[1]),
+            self._nwaits)
+        self._nwaits = 0
+
+    def abort(self):
+        """
+        Abort request.
+
+        """
+        with self._condition:
+            if self._active:
+                self._active = False
+                self.client._unregister(self)
+
+    def _timed_out(self):
+        metrics = self.client._metrics
+        if metrics is not None:
+            metrics.record(','.join(_.name for _ in self.params),
+                           wait_iterations=self._nwaits, timeouts=1)
+        self._nwaits = 0
+        self.abort()
+        return TimeoutError(self.error_msg)
+
+    def _wait_available(self, n):
+        # return the number of transfers to be read, which is less than n
+        # only at the end of a replay
+        deadline = time.time() + self.timeout / 1000
+        with self._condition:
+            while len(self._buffer) < n:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise self._timed_out()
+                self._nwaits += 1
+                self._condition.wait(remaining)
+        return n
+
+    def test(self):
+        """
+        Return True if the request has arrived.
+
+        """
+        return self.available > 0
+
+    def wait(self):
+        """
+        Wait until request arrives.
+
+        On timeout, raise a TimeoutError exception.
+
+        """
+        self._wait_available(1)
+
+    def _values(self, values):
+        if len(values) == 1:
+            return values[0]
+        return values
+
+    def next(self):
+        """
+        Wait until request completion and return the requested parameters.
+
+        """
+        self._wait_available(1)
+        return self._values(self._pop(1)[0][1])
+
+    def next_batch(self, n, timestamps=False):
+        """
+        Wait until n transfers are buffered and return them, stacked along
+        the first dimension.
+
+        """
+        if not self._buffered:
+            raise RuntimeError('The request is not buffered.')
+        if n < 1 or n > self._buffer.maxlen:
+            raise ValueError(
+                'The number of transfers must be in the range [1, {0}].'.
+                format(self._buffer.maxlen))
+        n = self._wait_available(n)
+        transfers = self._pop(n)
+        out = [np.array([_[1][i] for _ in transfers])
+               for i in range(len(self.params))]
+        out = self._values(tuple(out))
+        if timestamps:
+            return out, np.array([_[0] for _ in transfers])
+        return out
+
+    def stream(self, n, out=None, timestamps=None):
+        """
+        Store the next n transfers of the requested parameters in place.
+
+        """
+        if not self._buffered:
+            raise RuntimeError('The request is not buffered.')
+        if out is None:
+            out = [np.empty((n,) + _.shape, _.dtype) for _ in self.params]
+        elif isinstance(out, np.ndarray):
+            out = [out]
+        else:
+            out = list(out)
+        if len(out) != len(self.params):
+            raise ValueError(
+                'Invalid number of output arrays: {0} instead of {1}.'.
+                format(len(out), len(self.params)))
+        if timestamps is None:
+            timestamps = np.empty(n)
+        start = 0
+        while start < n:
+            try:
+                self._wait_available(1)
+            except EOFError:
+                # end of a replay: the stored transfers are returned
+                if start == 0:
+                    raise
+                out = [_[:start] for _ in out]
+                timestamps = timestamps[:start]
+                break
+            transfers = self._pop(min(self.available, n - start))
+            for timestamp, values in transfers:
+                timestamps[start] = timestamp
+                for out_, value in zip(out, values):
+                    out_[start] = value
+                start += 1
+        return self._values(tuple(out)), timestamps
+
+    async def anext(self):
+        """
+        Coroutine version of the next method.
+
+        """
+        deadline = time.time() + self.timeout / 1000
+        while self.available < 1:
+            if time.time() > deadline:
+                raise self._timed_out()
+            self._nwaits += 1
+            await asyncio.sleep(0.001)
+        return self._values(self._pop(1)[0][1])
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.anext()
+
+
+class FakeDispatcherAccess(object):
+    """
+    In-process stand-in for DispatcherAccess.
+
+    Parameters
+    ----------
+    science_rate : float, optional
+        The update rate in Hz of the scientific data parameters.
+    hk_rate : float, optional
+        The update rate in Hz of the other parameters.
+    ack_delay : float, optional
+        The delay in seconds after which the commands are acknowledged, when
+        the waitingForAckMode attribute is true.
+    seed : int, optional
+        The seed of the synthetic data generator.
+
+    Attributes
+    ----------
+    commands : deque
+        The last 1000 commands (name, arguments) sent to the fake dispatcher.
+
+    """
+    _request_class = FakeRequest
+
+    def __init__(self, science_rate=SCIENCE_RATE, hk_rate=HK_RATE,
+                 ack_delay=ACK_DELAY, seed=0):
+        if science_rate <= 0 or hk_rate <= 0:
+            raise ValueError('The update rates must be positive.')
+        self.parameters = {}
+        for i, rparam in enumerate(read_all_params()):
+            if rparam.type not in DTYPES and rparam.type != 0x80:
+                continue
+            dtype = DTYPES.get(rparam.type, object)
+            self.parameters[rparam.name] = FakeParameter(
+                rparam.name, i, np.dtype(dtype), rparam.shape, rparam.ubound)
+            if rparam.use_tf:
+                self.parameters[rparam.name + '_TF'] = FakeParameter(
+                    rparam.name + '_TF', i, np.dtype(np.float64),
+                    rparam.shape, rparam.ubound)
+        self.science_rate = science_rate
+        self.hk_rate = hk_rate
+        self.ack_delay = ack_delay
+        self.commands = collections.deque(maxlen=1000)
+        self.waitingForAckMode = False
+        self.waitingForAckTimeOut = DEFAULT_TIMEOUT
+        self.lastError = ''
+        self._random = np.random.RandomState(seed)
+        self._pools = {}
+        self._nsample = NSAMPLE
+        self._acquisition = True
+        self._ticks = {'science': 0, 'hk': 0}
+        self._watchers = {'science': [], 'hk': []}
+        self._requests = {}
+        self._multiplexer = None
+        self._metrics = None
+        self._ids = itertools.count()
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._tasks = []
+        self._sequence = itertools.count()
+        self._stopped = False
+        self._start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _start(self):
+        """ Schedule the parameter updates and start the scheduler thread. """
+        with self._lock:
+            self._schedule(self._tick_science, 1 / self.science_rate)
+            self._schedule(self._tick_hk, 1 / self.hk_rate)
+        self._thread = threading.Thread(target=self._run, name='fake-dispatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def connected(self):
+        return not self._stopped
+
+    @property
+    def state(self):
+        return 'connected' if self.connected else 'disconnected'
+
+    def close(self):
+        """ Stop the scheduler thread. """
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify()
+        self._thread.join()
+
+    def waitMs(self, milliseconds):
+        time.sleep(milliseconds / 1000)
+
+    def sendReloadTF(self):
+        self._command('sendReloadTF')
+        return True
+
+    def abort_requests(self):
+        """ Abort all pending persistent requests. """
+        for request in list(self._requests.values()):
+            request.abort()
+
+    def fetch(self, parameters, trigger=0, timeout=DEFAULT_TIMEOUT):
+        """
+        Fetch a parameter or a list of parameters, see DispatcherAccess.fetch.
+
+        """
+        return self._request(parameters, trigger, 1, timeout, 0, False).next()
+
+    async def afetch(self, parameters, trigger=0, timeout=DEFAULT_TIMEOUT):
+        """
+        Coroutine version of the fetch method.
+
+        """
+        request = self._request(parameters, trigger, 1, timeout, 0, False)
+        return await request.anext()
+
+    def fetch_timeline(self, timeline, parameter=TIMELINE, trigger=0,
+                       timeout=DEFAULT_TIMEOUT):
+        """
+        Fetch the samples of a timeline parameter which have been added since
+        the last call, see DispatcherAccess.fetch_timeline.
+
+        """
+        ubound = self.parameters[parameter].ubound
+        if ubound is None:
+            raise ValueError(
+                "The parameter '{0}' has no size counter.".format(parameter))
+        value, count = self.fetch([parameter, ubound], trigger, timeout)
+        return timeline.update(value, count)
+
+    def request(self, parameters, trigger=None, every=1,
+                timeout=DEFAULT_TIMEOUT, buffer_size=None):
+        """
+        Send a persistent request, see DispatcherAccess.request.
+
+        """
+        if isinstance(parameters, str):
+            parameters = [_.strip() for _ in parameters.split(',')]
+        if trigger is None:
+            trigger = parameters[0]
+        if buffer_size is None:
+            buffer_size = RING_BUFFER_SIZE
+        if not isinstance(trigger, str) and every != 1:
+            raise ValueError(
+                'Argument every can be specified only if the trigger is a '
+                'parameter.')
+        return self._request(parameters, trigger, max(every, 1), timeout,
+                             buffer_size, True)
+
+    @property
+    def multiplexer(self):
+        """ The RequestMultiplexer of the client. """
+        if self._multiplexer is None:
+            self._multiplexer = RequestMultiplexer(self)
+        return self._multiplexer
+
+    def subscribe(self, parameters, trigger=None, every=1,
+                  buffer_size=None):
+        """
+        Subscribe to a shared persistent request, see
+        DispatcherAccess.subscribe.
+
+        """
+        return self.multiplexer.subscribe(parameters, trigger, every,
+                                          buffer_size)
+
+    @property
+    def metrics(self):
+        """ The Metrics of the requests, or None if they are disabled. """
+        return self._metrics
+
+    def enable_metrics(self, bounds=None):
+        """
+        Enable the recording of the metrics of the requests, see
+        DispatcherAccess.enable_metrics.
+
+        """
+        if self._metrics is None:
+            if bounds is None:
+                self._metrics = Metrics(self)
+            else:
+                self._metrics = Metrics(self, bounds)
+        return self._metrics
+
+    def disable_metrics(self):
+        """ Stop the recording of the metrics of the requests. """
+        self._metrics = None
+
+    def pipeline(self, max_in_flight=4, ordered=True):
+        """
+        Return a CommandPipeline, see DispatcherAccess.pipeline. As the
+        dispatcher clients, max_in_flight - 1 connections are opened to the
+        fake dispatcher, each with its own command mode, and closed with the
+        pipeline.
+
+        """
+        if max_in_flight < 1:
+            raise ValueError('The number of commands in flight must be at '
+                             'least 1.')
+        connections = [_FakeConnection(self)
+                       for _ in range(max_in_flight - 1)]
+        return CommandPipeline([self] + connections, ordered, connections)
+
+    def _request(self, parameters, trigger, every, timeout, buffer_size,
+                 persistent):
+        if isinstance(parameters, str):
+            parameters = [_.strip() for _ in parameters.split(',')]
+        for parameter in parameters:
+            if not isinstance(parameter, str):
+                raise TypeError('Invalid parameter type.')
+            if parameter not in self.parameters:
+                raise ValueError(
+                    "Invalid parameter name: '{}'.".format(parameter))
+        if isinstance(trigger, str):
+            if trigger not in self.parameters:
+                raise ValueError(
+                    "Invalid parameter name: '{}'.".format(trigger))
+        else:
+            trigger = max(int(trigger), 1 if persistent else 0)
+        with self._lock:
+            if len(self._requests) >= MAX_NB_REQUEST:
+                raise RuntimeError(
+                    'Rejected request (size too big, too many sent requests'
+                    '...)')
+            request = self._request_class(self, parameters, timeout, trigger,
+                                          every, buffer_size, persistent)
+            request.id = next(self._ids)
+            self._requests[request.id] = request
+            if isinstance(trigger, str):
+                self._watchers[self._group(trigger)].append(request)
+            elif trigger == 0:
+                request._push(time.time())
+            else:
+                self._schedule(request._push, trigger / 1000,
+                               repeat=persistent, request=request)
+        return request
+
+    def _unregister(self, request):
+        # called with the lock acquired
+        self._requests.pop(request.id, None)
+        for watchers in self._watchers.values():
+            if request in watchers:
+                watchers.remove(request)
+
+    def _group(self, name):
+        return 'science' if name.startswith(SCIENCE_PREFIX) else 'hk'
+
+    def _value(self, param):
+        """ Return the current synthetic value of a parameter. """
+        name = param.name
+        if name == 'QUBIC_Nsample':
+            return np.array(self._nsample, param.dtype)
+        if name == TIMELINE + 'Size':
+            # the timeline grows with the scientific data and restarts when
+            # it is full
+            size = self.parameters[TIMELINE].shape[-1]
+            return np.array(self._ticks['science'] % (size + 1), param.dtype)
+        if name == TIMELINE:
+            return self._get_pool(param)[0]
+        group = self._group(name)
+        if group == 'science':
+            # the ASIC sub-parameters are slices of the whole frame
+            whole = self.parameters[
+                SCIENCE_PREFIX + ('_TF' if '_TF' in name else '')]
+            pool = self._get_pool(whole)
+            value = pool[self._ticks['science'] % len(pool)]
+            if param.shape != whole.shape:
+                value = value[int(name.rsplit('_', 1)[1])]
+            return value
+        pool = self._get_pool(param)
+        return pool[self._ticks['hk'] % len(pool)]
+
+    def _get_pool(self, param):
+        try:
+            return self._pools[param.name]
+        except KeyError:
+            pass
+        size = param.dtype.itemsize * int(np.prod(param.shape))
+        shape = (max(min(POOL_SIZE, POOL_MAXSIZE // size), 1),) + param.shape
+        if param.dtype.kind == 'O':
+            pool = np.array(['fake {0}'.format(_) for _ in range(shape[0])],
+                            object)
+        elif param.dtype.kind == 'f':
+            pool = self._random.standard_normal(shape).astype(param.dtype)
+        else:
+            info = np.iinfo(param.dtype)
+            pool = self._random.randint(
+                max(info.min, -2**15), min(info.max, 2**15), shape).astype(
+                    param.dtype)
+        self._pools[param.name] = pool
+        return pool
+
+    def _tick_science(self, timestamp):
+        if not self._acquisition:
+            return
+        self._ticks['science'] += 1
+        for request in list(self._watchers['science']):
+            request._push(timestamp)
+
+    def _tick_hk(self, timestamp):
+        self._ticks['hk'] += 1
+        for request in list(self._watchers['hk']):
+            request._push(timestamp)
+
+    def _schedule(self, callback, delay, repeat=True, request=None):
+        # called with the lock acquired, or before the thread is started
+        task = (time.time() + delay, next(self._sequence), callback,
+                delay if repeat else None, request)
+        heapq.heappush(self._tasks, task)
+        self._wakeup.notify()
+
+    def _run(self):
+        with self._wakeup:
+            while not self._stopped:
+                if len(self._tasks) == 0:
+                    self._wakeup.wait()
+                    continue
+                due = self._tasks[0][0]
+                now = time.time()
+                if due > now:
+                    self._wakeup.wait(due - now)
+                    continue
+                due, _, callback, period, request = heapq.heappop(self._tasks)
+                if request is not None and not request._active:
+                    continue
+                callback(now)
+                if period is not None:
+                    # do not try to catch up if the scheduler is late
+                    due = max(due + period, now)
+                    heapq.heappush(self._tasks, (
+                        due, next(self._sequence), callback, period, request))
+
+    def _command(self, name, *args):
+        self._send(self, name, args)
+
+    def _send(self, connection, name, args):
+        """
+        Execute a command sent through a connection to the fake dispatcher,
+        the client itself or one of its _FakeConnection instances.
+
+        """
+        ack = threading.Event()
+        with self._lock:
+            self.commands.append((name, args))
+            if name == 'sendSetNSample':
+                self._nsample = args[0]
+            elif name == 'sendStartAcq':
+                self._acquisition = True
+            elif name == 'sendStopAcq':
+                self._acquisition = False
+            if connection.waitingForAckMode:
+                self._schedule(lambda timestamp: ack.set(), self.ack_delay,
+                               repeat=False)
+        if connection.waitingForAckMode and \
+           not ack.wait(connection.waitingForAckTimeOut / 1000):
+            connection.lastError = 'Command {0} not acknowledged.'.format(
+                name)
+            raise RuntimeError(connection.lastError)
+
+
+class _FakeConnection(object):
+    """
+    Additional connection to a fake dispatcher, such as those opened by the
+    clients of DispatcherAccess.pipeline: the commands sent through it are
+    executed by the fake dispatcher, but it has its own command mode.
+
+    """
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.waitingForAckMode = False
+        self.waitingForAckTimeOut = dispatcher.waitingForAckTimeOut
+        self.lastError = ''
+
+    def close(self):
+        """ Detach from the fake dispatcher. """
+        self.dispatcher = None
+
+    def _command(self, name, *args):
+        if self.dispatcher is None:
+            raise RuntimeError('The connection is closed.')
+        self.dispatcher._send(self, name, args)
+
+
+def _make_command(name):
+    def command(self, *args):
+        self._command(name, *args)
+    command.__name__ = name
+    command.__doc__ = 'Fake {0}, see DispatcherAccess.{0}.'.format(name)
+    return command
+
+for _name in COMMANDS:
+    setattr(FakeDispatcherAccess, _name, _make_command(_name))
+    setattr(_FakeConnection, _name, _make_command(_name))
+del _name
@@ -0,0 +1,472 @@
+"""
+Reader of the housekeeping backups written by the dispatcher.
+
+An HK backup session (see THKBackup and TSingleHkBackup) is a directory in
+which each saved parameter, or sensor, has its own files:
+    - Y files, holding the successive values of the sensor in its data type,
+      valuesPerX values being saved for each time,
+    - X files, holding the times of the values as float64 (AutoXDataTime and
+      PrivateXDataTime options). With the ExternXDataTime option, the times
+      are read from the X files of another sensor (externXName).
+The files are split when they reach their maximum size, the split files
+being numbered from 1. The file names are matched by the FILENAME_PATTERN
+regular expression: '<name>[_X][(<number>)].dat'. The session directory
+holds the QSettings description file data_description.ini, with a group per
+sensor, from which the dataType, objectDataSize (the number of values per
+time), XDataOptions and externXName of the sensors are read; without it,
+the sensors are assumed to be saved as Double with one value per time, as
+the HK parameters of the TF file.
+
+The files are memory-mapped: only the times are loaded, to build a sorted
+time index per sensor, and the values are gathered from the mapped files on
+request, by range queries or by as-of joins of several sensors onto a
+common time grid, with vectorised operations. The times in ms are converted
+into seconds since the epoch.
+
+Examples
+--------
+>>> from pystudio.hkbackup import HKBackup
+>>> backup = HKBackup('/data/hk/2019-03-05_night')
+>>> times, temps = backup.read('EXT_Temperatures_3', start=t0, stop=t1)
+>>> grid, values = backup.join(['EXT_Temperatures_3', 'EXT_Pressures_0'],
+...                            step=10)
+
+"""
+from __future__ import division, print_function
+import configparser
+import mmap
+import os
+import re
+import warnings
+import numpy as np
+from .utils import PyStudioWarning
+
+__all__ = ['HKBackup', 'HKSensor']
+
+FILENAME_PATTERN = r'^(?P<name>.+?)(?P<x>_X)?(?:\((?P<number>\d+)\))?\.dat$'
+DESCRIPTION_FILENAME = 'data_description.ini'
+
+# TSingleHkBackup::DataType, the dispatcher being built with 32-bit longs
+DATA_TYPES = ('Char', 'Short', 'Int', 'Long', 'UChar', 'UShort', 'UInt',
+              'ULong', 'Float', 'Double', 'Custom')
+DTYPES = {
+    'Char': '<i1',
+    'Short': '<i2',
+    'Int': '<i4',
+    'Long': '<i4',
+    'UChar': '<u1',
+    'UShort': '<u2',
+    'UInt': '<u4',
+    'ULong': '<u4',
+    'Float': '<f4',
+    'Double': '<f8',
+}
+
+# TSingleHkBackup::BackupOptions
+BACKUP_OPTIONS = ('NoXData', 'ExternXData', 'ExternXDataTime', 'spare1',
+                  'PrivateXData', 'PrivateXDataTime', 'spare2',
+                  'OnePlotPerElement', 'AutoXDataTime')
+EXTERN_X_DATA_TIME = 2
+PRIVATE_X_DATA_TIME = 5
+AUTO_X_DATA_TIME = 8
+TIME_OPTIONS = (EXTERN_X_DATA_TIME, PRIVATE_X_DATA_TIME, AUTO_X_DATA_TIME)
+
+# above this value, the times are in ms (the epoch in ms is above 1e12)
+MAX_TIME_SECONDS = 1e11
+
+
+def _map(filename, dtype, itemsize=None):
+    """
+    Return a read-only view of a mapped file, without the trailing partial
+    item of a file still being written.
+
+    """
+    dtype = np.dtype(dtype)
+    itemsize = itemsize or dtype.itemsize
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < itemsize:
+            return np.empty(0, dtype)
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return np.frombuffer(m, dtype, (size // itemsize) * itemsize //
+                         dtype.itemsize)
+
+
+def _read_description(directory):
+    """
+    Return the description of the sensors in the QSettings file of the
+    session directory, indexed by sensor name. The keys are lower case.
+
+    """
+    filename = os.path.join(directory, DESCRIPTION_FILENAME)
+    if not os.path.exists(filename):
+        return {}
+    parser = configparser.RawConfigParser(strict=False)
+    try:
+        parser.read(filename, encoding='latin-1')
+    except configparser.Error as exc:
+        warnings.warn("Invalid description file '{0}': {1}".format(
+            filename, exc), PyStudioWarning)
+        return {}
+    return dict((_, dict(parser.items(_))) for _ in parser.sections())
+
+
+def _get_option(value):
+    if value is None:
+        return AUTO_X_DATA_TIME
+    if value.isdigit():
+        return int(value)
+    try:
+        return BACKUP_OPTIONS.index(value)
+    except ValueError:
+        raise ValueError("Invalid HK backup option '{0}'.".format(value))
+
+
+def _get_dtype(value):
+    if value is None:
+        return np.dtype(DTYPES['Double'])
+    if value.isdigit():
+        value = DATA_TYPES[int(value)]
+    try:
+        return np.dtype(DTYPES[value])
+    except KeyError:
+        raise ValueError("Unhandled HK backup data type '{0}'.".format(value))
+
+
+class HKSensor(object):
+    """
+    Memory-mapped values and sorted time index of a sensor.
+
+    Parameters
+    ----------
+    name : str
+        The sensor name.
+    yfiles : sequence of str
+        The Y files, in order.
+    xfiles : sequence of str
+        The X files, in order. If empty, the sensor has no time.
+    dtype : dtype, optional
+        The data type of the values.
+    size : int, optional
+        The number of values per time (valuesPerX).
+    time_unit : float, optional
+        The duration in seconds of the unit of the times. By default, the
+        times are in ms if they are greater than MAX_TIME_SECONDS, and in
+        seconds otherwise.
+
+    Attributes
+    ----------
+    times : ndarray
+        The sorted times, in seconds since the epoch.
+    order : ndarray or None
+        The positions of the sorted times in the files, None if the times
+        are already sorted.
+
+    """
+    def __init__(self, name, yfiles, xfiles, dtype=np.float64, size=1,
+                 time_unit=None):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.size = max(int(size), 1)
+        self._values = [_map(_, self.dtype, self.dtype.itemsize * self.size)
+                        .reshape(-1, self.size) for _ in yfiles]
+        counts = [len(_) for _ in self._values]
+        self._offsets = np.concatenate([[0], np.cumsum(counts)]).astype(
+            np.intp)
+        self.order = None
+        if len(xfiles) == 0:
+            self.times = None
+            return
+        times = np.concatenate([_map(_, '<f8') for _ in xfiles] +
+                               [np.empty(0)])
+        n = min(len(times), self._offsets[-1])
+        if len(times) != self._offsets[-1]:
+            warnings.warn(
+                "The sensor '{0}' has {1} times for {2} values.".format(
+                    name, len(times), self._offsets[-1]), PyStudioWarning)
+        times = np.array(times[:n], float)
+        if time_unit is None:
+            time_unit = 1e-3 if n > 0 and \
+                np.median(times) > MAX_TIME_SECONDS else 1
+        if time_unit != 1:
+            times *= time_unit
+        if n > 1 and np.any(times[1:] < times[:-1]):
+            self.order = np.argsort(times, kind='mergesort')
+            times = times[self.order]
+        self.times = times
+
+    def __len__(self):
+        return 0 if self.times is None else len(self.times)
+
+    def __repr__(self):
+        return '<HKSensor {0}, {1} values of {2}>'.format(
+            self.name, len(self), self.dtype)
+
+    @property
+    def time_range(self):
+        """ Times of the first and last values, in seconds since the epoch. """
+        if len(self) == 0:
+            return None
+        return float(self.times[0]), float(self.times[-1])
+
+    def _check_times(self):
+        if self.times is None:
+            raise ValueError(
+                "The sensor '{0}' is not saved with its times.".format(
+                    self.name))
+
+    def take(self, positions):
+        """
+        Return the values at the given positions of the sorted time index,
+        as an array of shape (npositions, size).
+
+        """
+        positions = np.asarray(positions, np.intp)
+        if self.order is not None:
+            positions = self.order[positions]
+        out = np.empty((len(positions), self.size), self.dtype)
+        files = np.searchsorted(self._offsets, positions, 'right') - 1
+        for ifile in np.unique(files):
+            mask = files == ifile
+            out[mask] = self._values[ifile][positions[mask] -
+                                            self._offsets[ifile]]
+        return out
+
+    def slice(self, first, last):
+        """
+        Return the values of the positions first to last (excluded) of the
+        sorted time index. If they are contiguous in a single file, a
+        read-only view of the mapped file is returned, otherwise a copy.
+
+        """
+        if self.order is not None or last <= first:
+            return self.take(np.arange(first, last))
+        offsets = self._offsets
+        ifirst = int(np.searchsorted(offsets, first, 'right')) - 1
+        ilast = int(np.searchsorted(offsets, last, 'left'))
+        blocks = [self._values[i][max(first - offsets[i], 0):
+                                  last - offsets[i]]
+                  for i in range(ifirst, ilast)]
+        if len(blocks) == 1:
+            return blocks[0]
+        return np.concatenate(blocks)
+
+    def read(self, start=None, stop=None):
+        """
+        Return the times and values of the sensor such that
+        start <= time < stop.
+
+        Parameters
+        ----------
+        start : float, optional
+            The start time, in seconds since the epoch.
+        stop : float, optional
+            The stop time (excluded), in seconds since the epoch.
+
+        Returns
+        -------
+        times : ndarray
+            The sorted times.
+        values : ndarray
+            The values of shape (ntimes, size), or (ntimes,) if the sensor has
+            one value per time.
+
+        """
+        self._check_times()
+        first = 0 if start is None else \
+            int(np.searchsorted(self.times, start, 'left'))
+        last = len(self.times) if stop is None else \
+            int(np.searchsorted(self.times, stop, 'left'))
+        last = max(first, last)
+        values = self.slice(first, last)
+        if self.size == 1:
+            values = values[:, 0]
+        return self.times[first:last], values
+
+    def asof(self, times, tolerance=None):
+        """
+        Return the last values at or before the given times, as float64
+        arrays. The values are NaN before the first time of the sensor, or
+        if the last value is older than the tolerance, in seconds.
+
+        """
+        self._check_times()
+        times = np.asarray(times, float)
+        out = np.full((len(times), self.size), np.nan)
+        if len(self.times) > 0:
+            positions = np.searchsorted(self.times, times, 'right') - 1
+            valid = positions >= 0
+            if tolerance is not None:
+                valid &= times - self.times[np.maximum(positions, 0)] <= \
+                    tolerance
+            out[valid] = self.take(positions[valid])
+        if self.size == 1:
+            out = out[:, 0]
+        return out
+
+
+class HKBackup(object):
+    """
+    Memory-mapped HK backup session.
+
+    Parameters
+    ----------
+    directory : str
+        The session directory.
+    time_unit : float, optional
+        The duration in seconds of the unit of the times in the X files. By
+        default, it is guessed for each sensor, see HKSensor.
+    pattern : str, optional
+        The regular expression of the file names, with the groups 'name',
+        'x' (matched by the X files) and 'number'.
+
+    Attributes
+    ----------
+    sensors : dict
+        The HKSensor instances, indexed by sensor name.
+
+    """
+    def __init__(self, directory, time_unit=None, pattern=FILENAME_PATTERN):
+        self.directory = directory
+        description = _read_description(directory)
+        rx = re.compile(pattern)
+        files = {}
+        for filename in os.listdir(directory):
+            match = rx.match(filename)
+            if match is None:
+                continue
+            name = match.group('name')
+            isx = match.group('x') is not None
+            if isx and name + '_X' in description:
+                # the Y files of a sensor whose name ends with _X
+                name, isx = name + '_X', False
+            number = int(match.group('number') or 0)
+            files.setdefault((name, isx), []).append((number, filename))
+        files = dict((k, [os.path.join(directory, f) for n, f in sorted(v)])
+                     for k, v in files.items())
+        self.sensors = {}
+        for (name, isx), yfiles in sorted(files.items()):
+            if isx:
+                continue
+            desc = description.get(name, {})
+            options = _get_option(desc.get('xdataoptions'))
+            if options == EXTERN_X_DATA_TIME:
+                xname = desc.get('externxname', '').strip('"')
+            else:
+                xname = name
+            if options in TIME_OPTIONS:
+                xfiles = files.get((xname, True), [])
+                if len(xfiles) == 0:
+                    warnings.warn(
+                        "The X files of the sensor '{0}' are missing.".format(
+                            name), PyStudioWarning)
+            else:
+                xfiles = []
+            self.sensors[name] = HKSensor(
+                name, yfiles, xfiles, _get_dtype(desc.get('datatype')),
+                int(desc.get('objectdatasize', 1)), time_unit)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getitem__(self, name):
+        try:
+            return self.sensors[name]
+        except KeyError:
+            raise ValueError("Invalid sensor name '{0}'.".format(name))
+
+    def __len__(self):
+        return len(self.sensors)
+
+    def close(self):
+        """
+        Release the mapped files. The views returned by the reader keep their
+        file mapped until they are deleted.
+
+        """
+        self.sensors = {}
+
+    @property
+    def names(self):
+        """ Names of the sensors. """
+        return sorted(self.sensors)
+
+    @property
+    def time_range(self):
+        """ Times of the first and last values of the session. """
+        ranges = [_.time_range for _ in self.sensors.values()
+                  if _.times is not None and len(_) > 0]
+        if len(ranges) == 0:
+            return None
+        return min(_[0] for _ in ranges), max(_[1] for _ in ranges)
+
+    def read(self, name, start=None, stop=None):
+        """
+        Return the times and values of a sensor in a time range, see
+        HKSensor.read.
+
+        """
+        return self[name].read(start, stop)
+
+    def join(self, names=None, times=None, step=None, start=None, stop=None,
+             tolerance=None):
+        """
+        As-of join of several sensors onto a common time grid: for each time
+        of the grid, the last value of each sensor at or before this time.
+
+        Parameters
+        ----------
+        names : sequence of str, optional
+            The sensors, by default all the sensors with times.
+        times : array-like, optional
+            The time grid, in seconds since the epoch.
+        step : float, optional
+            If the time grid is not specified, the step of the regular grid
+            from start to stop (excluded), in seconds.
+        start : float, optional
+            The first time of the regular grid, by default the first time of
+            the sensors.
+        stop : float, optional
+            The end of the regular grid, by default after the last time of
+            the sensors.
+        tolerance : float, optional
+            If specified, the values older than the tolerance (in seconds)
+            are replaced by NaN.
+
+        Returns
+        -------
+        times : ndarray
+            The time grid.
+        values : ndarray
+            The float64 array of shape (ntimes, ncolumns) of the joined
+            values, the columns being those of the sensors in order (one per
+            value per time). The missing values are NaN.
+
+        """
+        if names is None:
+            names = [_ for _ in self.names if self.sensors[_].times is not None]
+        elif isinstance(names, str):
+            names = [_.strip() for _ in names.split(',')]
+        sensors = [self[_] for _ in names]
+        if times is None:
+            if step is None or step <= 0:
+                raise ValueError('The time grid or its step is not specified.')
+            ranges = [_.time_range for _ in sensors if len(_) > 0]
+            if start is None:
+                start = min(_[0] for _ in ranges) if len(ranges) > 0 else 0
+            if stop is None:
+                stop = max(_[1] for _ in ranges) + step if len(ranges) > 0 \
+                    else start
+            times = start + step * np.arange(max(int(np.ceil(
+                (stop - start) / step)), 0))
+        times = np.asarray(times, float)
+        values = np.empty((len(times), sum(_.size for _ in sensors)))
+        column = 0
+        for sensor in sensors:
+            values[:, column:column+sensor.size] = sensor.asof(
+                times, tolerance).reshape(len(times), -1)
+            column += sensor.size
+        return times, values
@@ -54,19 +54,19 @@ cdef extern from "tdispatcheraccess.h":
         void setFullCommandsLocked(bool)
         bool fullCommandsLocked()
         void setAutoUpdateWithRequest(bool)
-        bool startSubsystemAccess()
-        bool stopSubsystemAccess()
-        bool stopDispatcher(quint32)
+        bool startSubsystemAccess() nogil
+        bool stopSubsystemAccess() nogil
+        bool stopDispatcher(quint32) nogil
         void setDebug()
-        void waitMs(qint64)
+        void waitMs(qint64) nogil
         bool disableOneRequestedParameters(quint8)
-        bool disableAllRequestedParameters()
+        bool disableAllRequestedParameters() nogil
         int requestSynchroParameters(QList[quint32], quint32, quint16, bool*)
         int requestTimeoutParameters(QList[quint32], quint16, bool*)
         int requestOneTimeSynchroParameters(QList[quint32], quint32, bool*)
         int requestOneTimeTimeoutParameters(QList[quint32], quint16, bool*)
-        void requestArrived(int)
-        bool sendReloadTF()
+        void requestArrived(int) nogil
+        bool sendReloadTF() nogil
         int dispatcherTFVersionLoaded()
         void run()
         void start()
@@ -77,56 +77,56 @@ cdef extern from "tdispatcheraccess.h":
         double requestRate()
         double dataRate()
         quint32 nbOverlap()
-        bool sendCustomCommand(quint32, quint8, quint8, QByteArray)
-        bool sendSetAsicParam(quint32, quint8, quint8)
-        bool sendSetAsicApol(quint32, quint8)
-        bool sendSetAsicSpol(quint32, quint8)
-        bool sendSetAsicVicm(quint32, quint8)
-        bool sendSetAsicVocm(quint32, quint8)
-        bool sendSetAsicSetColumn(quint32, quint8)
-        bool sendSetAsicSelStartRow(quint32, quint8)
-        bool sendSetAsicSelLastRow(quint32, quint8)
-        bool sendSetAsicRazb(quint32)
-        bool sendSetAsicInib(quint32)
-        bool sendSetDiffDAC(quint32, quint16)
-        bool sendSetFeedbackTable(quint32, quint16*)
-        bool sendSetOffsetTable(quint32, quint16*)
-        bool sendSetMask(quint32, quint8*)
-        bool sendSetSlowDAC(quint32, quint16)
-        bool sendSetNSample(quint16)
-        bool sendStartAcq(quint32)
-        bool sendStopAcq(quint32)
-        bool sendSetAcqScienceMode(quint32)
-        bool sendSetAcqTestPatternMode(quint32, quint16)
-        bool sendResetNetquic(quint32)
-        bool sendSetCycleRawMode(quint32, quint16)
-        bool sendSetRawModeList(quint32, quint8*)
-        bool sendSetAsicConf(quint32, quint8, quint8)
-        bool sendGetStatus(quint32)
-        bool sendSetASICSerialLinkFrequency(quint8)
-        bool sendSetTESDAC(quint32, quint8, quint8, quint16, quint16)
-        bool sendConfigurePID(quint32, quint16, quint16, quint16)
-        bool sendActivatePID(quint32, quint16)
-        bool sendSetFeedbackRelay(quint32, quint8)
-        bool sendResetVOffset(quint32)
-        bool sendSetVOffset(quint32, quint8, float)
-        bool sendSetVOffsets(quint32, float*)
-        bool sendResetVout2IinCoeffs(quint32)
-        bool sendSetVout2IinCoeffs(quint32, float, float)
-        bool sendSetVout2IinsCoeffs(float*, float*)
-        bool sendSetScientificDataTfUsed(quint8)
-        bool sendStartBackup(QString, QString)
-        bool sendStopBackup()
-        bool sendStartRawBackup(QString)
-        bool sendStopRawBackup()
-        bool sendStartHKBackup(QString, QString)
-        bool sendStopHKBackup()
-        bool sendSetBackupDir(QString)
-        bool sendResetSubsystem(quint8)
-        bool sendResetDecommutationFlags(quint8)
-        bool sendAddToLogbook(QString, QString)
-        bool sendSetLogBookFilename(QString)
-        bool sendSetLogBookBaseDirectory(QString)
+        bool sendCustomCommand(quint32, quint8, quint8, QByteArray) nogil
+        bool sendSetAsicParam(quint32, quint8, quint8) nogil
+        bool sendSetAsicApol(quint32, quint8) nogil
+        bool sendSetAsicSpol(quint32, quint8) nogil
+        bool sendSetAsicVicm(quint32, quint8) nogil
+        bool sendSetAsicVocm(quint32, quint8) nogil
+        bool sendSetAsicSetColumn(quint32, quint8) nogil
+        bool sendSetAsicSelStartRow(quint32, quint8) nogil
+        bool sendSetAsicSelLastRow(quint32, quint8) nogil
+        bool sendSetAsicRazb(quint32) nogil
+        bool sendSetAsicInib(quint32) nogil
+        bool sendSetDiffDAC(quint32, quint16) nogil
+        bool sendSetFeedbackTable(quint32, quint16*) nogil
+        bool sendSetOffsetTable(quint32, quint16*) nogil
+        bool sendSetMask(quint32, quint8*) nogil
+        bool sendSetSlowDAC(quint32, quint16) nogil
+        bool sendSetNSample(quint16) nogil
+        bool sendStartAcq(quint32) nogil
+        bool sendStopAcq(quint32) nogil
+        bool sendSetAcqScienceMode(quint32) nogil
+        bool sendSetAcqTestPatternMode(quint32, quint16) nogil
+        bool sendResetNetquic(quint32) nogil
+        bool sendSetCycleRawMode(quint32, quint16) nogil
+        bool sendSetRawModeList(quint32, quint8*) nogil
+        bool sendSetAsicConf(quint32, quint8, quint8) nogil
+        bool sendGetStatus(quint32) nogil
+        bool sendSetASICSerialLinkFrequency(quint8) nogil
+        bool sendSetTESDAC(quint32, quint8, quint8, quint16, quint16) nogil
+        bool sendConfigurePID(quint32, quint16, quint16, quint16) nogil
+        bool sendActivatePID(quint32, quint16) nogil
+        bool sendSetFeedbackRelay(quint32, quint8) nogil
+        bool sendResetVOffset(quint32) nogil
+        bool sendSetVOffset(quint32, quint8, float) nogil
+        bool sendSetVOffsets(quint32, float*) nogil
+        bool sendResetVout2IinCoeffs(quint32) nogil
+        bool sendSetVout2IinCoeffs(quint32, float, float) nogil
+        bool sendSetVout2IinsCoeffs(float*, float*) nogil
+        bool sendSetScientificDataTfUsed(quint8) nogil
+        bool sendStartBackup(QString, QString) nogil
+        bool sendStopBackup() nogil
+        bool sendStartRawBackup(QString) nogil
+        bool sendStopRawBackup() nogil
+        bool sendStartHKBackup(QString, QString) nogil
+        bool sendStopHKBackup() nogil
+        bool sendSetBackupDir(QString) nogil
+        bool sendResetSubsystem(quint8) nogil
+        bool sendResetDecommutationFlags(quint8) nogil
+        bool sendAddToLogbook(QString, QString) nogil
+        bool sendSetLogBookFilename(QString) nogil
+        bool sendSetLogBookBaseDirectory(QString) nogil
 
 
 cdef extern from "tvirtualcommandencode.h":
@@ -1,7 +1,17 @@
+from libcpp cimport bool
 from libdispatcheraccess cimport TDispatcherAccess
-
-ctypedef void (*slot_request)(int)
+from libqt cimport QMutex, QWaitCondition
 
 cdef extern from "helpers.h":
-    void connect_request(TDispatcherAccess*, slot_request)
+    int NB_REQUEST_SLOTS
+    cdef cppclass RequestState:
+        QMutex mutex
+        QWaitCondition condition
+        bool arrived[256]
+        void *rings[256]
+        RequestState() except +
+    ctypedef void (*slot_request)(RequestState*, int) noexcept nogil
+    void connect_request(TDispatcherAccess*, slot_request, RequestState*)
+    void wake_request(QWaitCondition*) nogil
+    bool wait_request(QMutex*, QWaitCondition*, bool*, int) nogil
  
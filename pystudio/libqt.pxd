@@ -41,6 +41,11 @@ cdef extern from "<QMutex>" nogil:
     cdef cppclass QMutexLocker:
         QMutexLocker(QMutex*) except +
 
+cdef extern from "<QWaitCondition>" nogil:
+    cdef cppclass QWaitCondition:
+        QWaitCondition() except +
+        void wakeAll()
+
 cdef extern from "<QString>" nogil:
     cdef cppclass QString:
         QString() except +
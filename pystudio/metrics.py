@@ -0,0 +1,241 @@
+"""
+Opt-in metrics of the dispatcher clients.
+
+When enabled on a client (see DispatcherAccess.enable_metrics), the requests
+record, per request:
+    - the delay between the arrival of a transfer, stamped by the request
+      slot, and its consumption by the next, next_batch or stream methods,
+    - the number of consumed transfers and of copied bytes,
+    - the number of iterations of the wait loops and of timeouts,
+    - the number of transfers dropped by the ring buffer,
+and the client records the increase of its nbOverlap counter. The metrics
+can be exported as a dict or in the Prometheus text format, along with the
+instantaneous rates of the client.
+
+Examples
+--------
+>>> metrics = client.enable_metrics()
+>>> req = client.request('QUBIC_AllPixelsScientificData')
+>>> data = req.next_batch(100)
+>>> metrics.as_dict()['latency']['QUBIC_AllPixelsScientificData']['p99']
+0.00081
+>>> print(metrics.to_prometheus())
+
+"""
+from __future__ import division, print_function
+import bisect
+import collections
+import itertools
+import threading
+import numpy as np
+
+__all__ = ['Histogram', 'Metrics']
+
+# upper bounds of the latency buckets, from 10 us to about 20 s
+LATENCY_BOUNDS = tuple(1e-5 * 2**_ for _ in range(22))
+
+COUNTERS = collections.OrderedDict([
+    ('transfers', 'Number of transfers consumed.'),
+    ('copy_bytes', 'Number of bytes copied out of the parameter buffers.'),
+    ('wait_iterations', 'Number of iterations of the wait loops.'),
+    ('timeouts', 'Number of timed out waits.'),
+    ('overflows', 'Number of transfers dropped by the ring buffer.'),
+    ('overlaps', 'Increase of the nbOverlap counter of the client.'),
+])
+
+GAUGES = collections.OrderedDict([
+    ('requestRate', 'Request rate of the client.'),
+    ('dataRate', 'Data rate of the client.'),
+    ('stackSize', 'Size of the TM stack of the client.'),
+    ('stackOccupation', 'Occupation of the TM stack of the client.'),
+    ('nbOverlap', 'Number of overlaps of the client.'),
+])
+
+
+class Histogram(object):
+    """
+    Histogram of values in fixed buckets, with the Prometheus convention that
+    a value v falls into the first bucket whose upper bound b satisfies
+    v <= b. The last bucket holds the values above the largest bound.
+
+    """
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        """ Add a value to the histogram. """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def observe_many(self, values):
+        """ Add an array of values to the histogram. """
+        values = np.asarray(values, float).ravel()
+        if values.size == 0:
+            return
+        if values.size == 1:
+            self.observe(float(values[0]))
+            return
+        counts = np.bincount(np.searchsorted(self.bounds, values),
+                             minlength=len(self.counts))
+        self.counts = [a + b for a, b in zip(self.counts, counts.tolist())]
+        self.sum += float(values.sum())
+        self.count += values.size
+
+    def quantile(self, q):
+        """
+        Return the upper bound of the bucket holding the q-quantile, or None
+        if the histogram is empty. Above the largest bound, inf is returned.
+
+        """
+        if self.count == 0:
+            return None
+        index = bisect.bisect_left(list(itertools.accumulate(self.counts)),
+                                   q * self.count)
+        if index >= len(self.bounds):
+            return float('inf')
+        return self.bounds[index]
+
+    def as_dict(self):
+        return {'count': self.count, 'sum': self.sum,
+                'mean': self.sum / self.count if self.count > 0 else None,
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99),
+                'buckets': list(zip(self.bounds + [float('inf')],
+                                    itertools.accumulate(self.counts)))}
+
+
+class Metrics(object):
+    """
+    Metrics of the requests of a client, indexed by the request label, which
+    is the comma-separated list of the requested parameters.
+
+    Parameters
+    ----------
+    client : DispatcherAccess, optional
+        The client whose instantaneous rates are exported with the metrics.
+    bounds : sequence of float, optional
+        The upper bounds in seconds of the latency buckets.
+
+    """
+    def __init__(self, client=None, bounds=LATENCY_BOUNDS):
+        self.client = client
+        self.bounds = bounds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Clear the recorded metrics. """
+        with self._lock:
+            self.latency = {}
+            self.counters = dict((_, collections.Counter()) for _ in COUNTERS)
+
+    def record(self, label, latencies=None, transfers=0, copy_bytes=0,
+               wait_iterations=0, timeouts=0, overflows=0, overlaps=0):
+        """
+        Record the metrics of a consumption of transfers.
+
+        Parameters
+        ----------
+        label : str
+            The request label.
+        latencies : float or array of float, optional
+            The delays in seconds between the arrival of the transfers and
+            their consumption.
+
+        """
+        with self._lock:
+            if latencies is not None:
+                try:
+                    histogram = self.latency[label]
+                except KeyError:
+                    histogram = Histogram(self.bounds)
+                    self.latency[label] = histogram
+                if isinstance(latencies, np.ndarray):
+                    histogram.observe_many(latencies)
+                else:
+                    histogram.observe(latencies)
+            counters = self.counters
+            if transfers:
+                counters['transfers'][label] += transfers
+            if copy_bytes:
+                counters['copy_bytes'][label] += copy_bytes
+            if wait_iterations:
+                counters['wait_iterations'][label] += wait_iterations
+            if timeouts:
+                counters['timeouts'][label] += timeouts
+            if overflows:
+                counters['overflows'][label] += overflows
+            if overlaps:
+                counters['overlaps'][''] += overlaps
+
+    def gauges(self):
+        """ Return the instantaneous rates of the client. """
+        if self.client is None:
+            return {}
+        out = {}
+        for name in GAUGES:
+            try:
+                out[name] = getattr(self.client, name)
+            except AttributeError:
+                pass
+        return out
+
+    def as_dict(self):
+        """
+        Return the metrics as a dict with the keys 'latency' (histogram
+        summaries by request label), 'counters' (by counter name and request
+        label) and 'gauges'.
+
+        """
+        with self._lock:
+            latency = dict((k, v.as_dict()) for k, v in self.latency.items())
+            counters = dict((k, dict(v)) for k, v in self.counters.items())
+        return {'latency': latency, 'counters': counters,
+                'gauges': self.gauges()}
+
+    def to_prometheus(self, prefix='pystudio'):
+        """ Return the metrics in the Prometheus text exposition format. """
+        def labels(label, **extra):
+            items = [] if label == '' else [('request', label)]
+            items += sorted(extra.items())
+            if len(items) == 0:
+                return ''
+            return '{' + ','.join('{0}="{1}"'.format(
+                k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+                for k, v in items) + '}'
+
+        lines = []
+        name = prefix + '_request_latency_seconds'
+        lines += ['# HELP {0} Delay between the arrival of a transfer and its '
+                  'consumption.'.format(name),
+                  '# TYPE {0} histogram'.format(name)]
+        with self._lock:
+            for label, histogram in sorted(self.latency.items()):
+                cumulative = list(itertools.accumulate(histogram.counts))
+                for bound, count in zip(histogram.bounds, cumulative):
+                    lines.append('{0}_bucket{1} {2}'.format(
+                        name, labels(label, le=repr(bound)), count))
+                lines.append('{0}_bucket{1} {2}'.format(
+                    name, labels(label, le='+Inf'), cumulative[-1]))
+                lines.append('{0}_sum{1} {2!r}'.format(
+                    name, labels(label), histogram.sum))
+                lines.append('{0}_count{1} {2}'.format(
+                    name, labels(label), histogram.count))
+            for counter, help in COUNTERS.items():
+                name = '{0}_request_{1}_total'.format(prefix, counter)
+                lines += ['# HELP {0} {1}'.format(name, help),
+                          '# TYPE {0} counter'.format(name)]
+                for label, value in sorted(self.counters[counter].items()):
+                    lines.append('{0}{1} {2}'.format(name, labels(label),
+                                                     value))
+        for gauge, value in self.gauges().items():
+            name = '{0}_client_{1}'.format(prefix, gauge)
+            lines += ['# HELP {0} {1}'.format(name, GAUGES[gauge]),
+                      '# TYPE {0} gauge'.format(name),
+                      '{0} {1!r}'.format(name, value)]
+        return '\n'.join(lines) + '\n'
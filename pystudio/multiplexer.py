@@ -0,0 +1,453 @@
+"""
+Sharing of persistent requests between consumers.
+
+A dispatcher client can only hold a limited number of requests (see
+MAX_NB_REQUEST_PER_CLIENT in tdispatcheraccesskernel.h), so that tools which
+each send their own persistent requests for overlapping parameters end up
+being rejected. A RequestMultiplexer merges the subscriptions with the same
+trigger into a single persistent request, for the union of their parameters,
+and fans the transfers out to the subscriptions, each of them having its own
+buffer. The shared request is sent again when the union of the parameters
+changes, and it is aborted when its last subscription is.
+
+The transfers are pulled from the shared request by whichever subscription
+is waiting for them, so that no fan-out thread is started: the transfers are
+copied into the ring buffer of the shared request by its request slot, in
+the kernel thread of the client, and they are moved into the buffers of the
+subscriptions when one of them is read.
+
+Examples
+--------
+>>> mux = client.multiplexer
+>>> sub1 = mux.subscribe(['QUBIC_Nsample', 'EXT_Temperatures'], 1000)
+>>> sub2 = mux.subscribe('QUBIC_Nsample', 1000)
+>>> mux.nrequests
+1
+>>> nsample, temperatures = sub1.next()
+>>> sub2.abort()
+
+"""
+from __future__ import division, print_function
+import collections
+import threading
+import time
+import weakref
+import numpy as np
+
+__all__ = ['RequestMultiplexer', 'Subscription']
+
+DEFAULT_TIMEOUT = 5000  # ms
+BUFFER_SIZE = 100
+
+
+class RequestMultiplexer(object):
+    """
+    Merge the persistent requests with the same trigger.
+
+    Parameters
+    ----------
+    client : DispatcherAccess
+        The client through which the shared requests are sent. Only a weak
+        reference to it is kept, since the client holds its multiplexer.
+    timeout : int, optional
+        The timeout in ms of the shared requests, after which the
+        subscriptions waiting for a transfer raise a TimeoutError exception.
+        The shared request is then sent again on the next wait.
+
+    """
+    def __init__(self, client, timeout=DEFAULT_TIMEOUT):
+        self._client = weakref.ref(client)
+        self.timeout = timeout
+        self._groups = {}
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def client(self):
+        """ The client through which the shared requests are sent. """
+        client = self._client()
+        if client is None:
+            raise RuntimeError('The client of the multiplexer is deleted.')
+        return client
+
+    @property
+    def nrequests(self):
+        """ Number of shared requests sent to the dispatcher. """
+        with self._lock:
+            return sum(_.request is not None for _ in self._groups.values())
+
+    @property
+    def nsubscriptions(self):
+        """ Number of active subscriptions. """
+        with self._lock:
+            return sum(len(_.subscriptions) for _ in self._groups.values())
+
+    def subscribe(self, parameters, trigger=None, every=1,
+                  buffer_size=None):
+        """
+        Subscribe to the transfers of parameters.
+
+        Parameters
+        ----------
+        parameters : str or sequence of str
+            The requested parameters.
+        trigger : int or str, optional
+            The trigger of the request, see DispatcherAccess.request. The
+            subscriptions with the same trigger (and every argument) share
+            the same dispatcher request. By default, the watched parameter is
+            the first requested parameter.
+        every : int, optional
+            For a parameter trigger, the number of its updates between two
+            transfers.
+        buffer_size : int, optional
+            The number of transfers held by the subscription, by default
+            BUFFER_SIZE. When it is full, the oldest transfer is dropped (see
+            the overflows attribute).
+
+        Returns
+        -------
+        A Subscription, which has the next, next_batch and abort methods of
+        a request.
+
+        """
+        if isinstance(parameters, str):
+            parameters = [_.strip() for _ in parameters.split(',')]
+        parameters = list(parameters)
+        if len(parameters) == 0:
+            raise ValueError('No parameter is specified.')
+        if trigger is None:
+            trigger = parameters[0]
+        if buffer_size is None:
+            buffer_size = BUFFER_SIZE
+        elif buffer_size < 1:
+            raise ValueError('The buffer size must be positive.')
+        key = trigger, every
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = _SharedRequest(self, trigger, every)
+                self._groups[key] = group
+            subscription = Subscription(group, parameters, buffer_size)
+            try:
+                group.add(subscription)
+            except Exception:
+                group.remove(subscription)
+                raise
+        return subscription
+
+    def close(self):
+        """ Abort all the subscriptions. """
+        with self._lock:
+            for group in list(self._groups.values()):
+                for subscription in list(group.subscriptions):
+                    subscription.abort()
+
+    def _discard(self, group):
+        # called with the lock acquired
+        if self._groups.get((group.trigger, group.every)) is group:
+            del self._groups[group.trigger, group.every]
+
+
+class _SharedRequest(object):
+    """
+    Persistent request for the union of the parameters of the subscriptions
+    with the same trigger.
+
+    """
+    def __init__(self, multiplexer, trigger, every):
+        self.multiplexer = multiplexer
+        self.trigger = trigger
+        self.every = every
+        self.parameters = []
+        self.request = None
+        self._refs = collections.OrderedDict()  # weak ref -> parameters
+        self._counts = collections.Counter()
+        self._layout = {}  # position of the parameters in the request
+        self._condition = threading.Condition(multiplexer._lock)
+        self._pumping = False
+        self._stale = True
+
+    @property
+    def subscriptions(self):
+        out = [_() for _ in self._refs]
+        return [_ for _ in out if _ is not None]
+
+    def add(self, subscription):
+        # called with the lock acquired
+        ref = weakref.ref(subscription, self._collected)
+        self._refs[ref] = subscription.parameters
+        self._counts.update(set(subscription.parameters))
+        new = [_ for _ in subscription.parameters if _ not in self.parameters]
+        if len(new) > 0:
+            self.parameters.extend(new)
+            self._stale = True
+        if not self._pumping:
+            self._drain()
+            self._refresh()
+
+    def remove(self, subscription):
+        # called with the lock acquired
+        for ref in self._refs:
+            if ref() is subscription:
+                self._release(ref)
+                return
+
+    def _collected(self, ref):
+        # the subscription has been garbage-collected without being aborted
+        with self._condition:
+            if ref in self._refs:
+                self._release(ref)
+
+    def _release(self, ref):
+        parameters = self._refs.pop(ref)
+        self._counts.subtract(set(parameters))
+        self._counts += collections.Counter()  # drop the zero counts
+        if len(self._refs) == 0:
+            self._abort()
+            self.multiplexer._discard(self)
+            self._condition.notify_all()
+            return
+        parameters = [_ for _ in self.parameters if _ in self._counts]
+        if parameters != self.parameters:
+            self.parameters = parameters
+            self._stale = True
+        if not self._pumping:
+            self._drain()
+            self._refresh()
+
+    def _abort(self):
+        if self.request is None:
+            return
+        try:
+            self.request.abort()
+        finally:
+            self.request = None
+
+    def _refresh(self):
+        """ Send the shared request again if the parameters have changed. """
+        if not self._stale and self.request is not None:
+            return
+        self._abort()
+        self.request = self.multiplexer.client.request(
+            self.parameters, self.trigger, self.every,
+            self.multiplexer.timeout)
+        self._layout = dict((_, i) for i, _ in enumerate(self.parameters))
+        self._stale = False
+
+    def _drain(self):
+        """ Fan out the transfers already buffered by the shared request. """
+        request = self.request
+        if request is None or request.buffer_size == 0:
+            return
+        n = min(request.available, request.buffer_size)
+        if n > 0:
+            values, timestamps = request.next_batch(n, True)
+            self._dispatch(self._as_tuple(values), timestamps)
+
+    def pump(self):
+        """
+        Wait for the next transfers of the shared request and fan them out.
+        Called with the lock acquired, which is released while waiting.
+
+        """
+        self._refresh()
+        request = self.request
+        self._pumping = True
+        self._condition.release()
+        try:
+            try:
+                if request.buffer_size == 0:
+                    values = [[_] for _ in self._as_tuple(request.next())]
+                    timestamps = [time.time()]
+                else:
+                    n = min(max(request.available, 1), request.buffer_size)
+                    values, timestamps = request.next_batch(n, True)
+                    values = self._as_tuple(values)
+            finally:
+                self._condition.acquire()
+                self._pumping = False
+                self._condition.notify_all()
+        except Exception:
+            # a timed-out request is aborted, it is sent again on next pump
+            if request is self.request:
+                self._abort()
+            raise
+        if request is self.request:
+            self._dispatch(values, timestamps)
+
+    def _as_tuple(self, values):
+        if len(self._layout) == 1:
+            return (values,)
+        return values
+
+    def _dispatch(self, values, timestamps):
+        for value in values:
+            if isinstance(value, np.ndarray):
+                # the transfers are shared by the subscriptions
+                value.flags.writeable = False
+        for subscription in self.subscriptions:
+            try:
+                indices = [self._layout[_] for _ in subscription.parameters]
+            except KeyError:
+                # the subscription was added after the request was sent
+                continue
+            for k, timestamp in enumerate(timestamps):
+                subscription._push(tuple(values[i][k] for i in indices),
+                                   timestamp)
+        self._condition.notify_all()
+
+
+class Subscription(object):
+    """
+    Subscription to the transfers of a shared persistent request, with the
+    interface of RequestPersistent.
+
+    The transfers are read-only, since they are shared with the other
+    subscriptions. A subscription which is garbage-collected is aborted.
+
+    """
+    def __init__(self, group, parameters, buffer_size):
+        self._group = group
+        self.parameters = parameters
+        self.trigger = group.trigger
+        self.every = group.every
+        self._buffer = collections.deque(maxlen=buffer_size)
+        self._received = 0
+        self._overflows = 0
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.abort()
+
+    @property
+    def buffer_size(self):
+        """ Number of transfers that can be held by the subscription. """
+        return self._buffer.maxlen
+
+    @property
+    def available(self):
+        """ Number of buffered transfers that have not been read yet. """
+        with self._group._condition:
+            return len(self._buffer)
+
+    @property
+    def received(self):
+        """ Number of transfers received by the subscription. """
+        return self._received
+
+    @property
+    def overflows(self):
+        """
+        Number of transfers dropped because the subscription buffer was full
+        when they arrived.
+
+        """
+        return self._overflows
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _push(self, values, timestamp):
+        # called with the lock acquired
+        if len(self._buffer) == self._buffer.maxlen:
+            self._overflows += 1
+        self._buffer.append((values, timestamp))
+        self._received += 1
+
+    def _wait_available(self, n):
+        group = self._group
+        while len(self._buffer) < n:
+            if self._closed:
+                raise RuntimeError('The subscription is aborted.')
+            if group._pumping:
+                group._condition.wait()
+            else:
+                group.pump()
+
+    def _values(self, values):
+        if len(values) == 1:
+            return values[0]
+        return values
+
+    def abort(self):
+        """
+        Abort the subscription. The shared request is aborted with its last
+        subscription.
+
+        """
+        with self._group._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._group.remove(self)
+
+    def test(self):
+        """
+        Return True if a transfer is buffered.
+
+        """
+        return self.available > 0
+
+    def next(self):
+        """
+        Wait for a transfer and return the subscribed parameters.
+
+        """
+        with self._group._condition:
+            self._wait_available(1)
+            return self._values(self._buffer.popleft()[0])
+
+    def next_batch(self, n, timestamps=False):
+        """
+        Wait until n transfers are buffered and return them.
+
+        Parameters
+        ----------
+        n : int
+            The number of transfers.
+        timestamps : boolean, optional
+            If true, the arrival times of the transfers (in seconds since the
+            Epoch) are also returned.
+
+        Returns
+        -------
+        The arrays of shape (n, ...) of the subscribed parameters, the
+        transfers being stacked along the first dimension. For the parameters
+        with an upper bound, the last dimension is restricted to the smallest
+        upper bound of the n transfers.
+
+        """
+        if n < 1 or n > self._buffer.maxlen:
+            raise ValueError(
+                'The number of transfers must be in the range [1, {0}].'.
+                format(self._buffer.maxlen))
+        with self._group._condition:
+            self._wait_available(n)
+            transfers = [self._buffer.popleft() for _ in range(n)]
+        out = tuple(_stack([_[0][i] for _ in transfers])
+                    for i in range(len(self.parameters)))
+        out = self._values(out)
+        if timestamps:
+            return out, np.array([_[1] for _ in transfers])
+        return out
+
+
+def _stack(values):
+    """
+    Stack the values of a parameter, restricted to their smallest upper bound.
+
+    """
+    shapes = set(np.shape(_) for _ in values)
+    if len(shapes) > 1 and all(len(_) > 0 for _ in shapes):
+        bound = min(_[-1] for _ in shapes)
+        values = [_[..., :bound] for _ in values]
+    return np.array(values)
@@ -0,0 +1,76 @@
+"""
+Parallel fetches from several dispatcher clients.
+
+Each client has its own request arrival state, and the GIL is released while
+a request is waited for, so that the fetches from several dispatchers, or
+from several clients of the same dispatcher, can wait concurrently in
+threads. The request slot of a client is called in the kernel thread of the
+client, which wakes up the waiting threads directly: the fetches do not rely
+on the events of the main thread, which is meanwhile blocked until the
+thread pool is shut down. The fetch_many function sends the requests in
+parallel and returns the values once all of them have arrived, in a time set
+by the slowest dispatcher rather than by the sum of their latencies.
+
+Examples
+--------
+>>> from pystudio import DispatcherAccess
+>>> from pystudio.parallel import fetch_many
+>>> client1 = DispatcherAccess('134.158.187.21', 3002)
+>>> client2 = DispatcherAccess('134.158.187.22', 3002)
+>>> values = fetch_many({client1: 'QUBIC_Nsample',
+...                      client2: ['QUBIC_Nsample', 'EXT_Temperatures']})
+>>> nsample1 = values[client1]
+
+"""
+from __future__ import division, print_function
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ['fetch_many']
+
+DEFAULT_TIMEOUT = 5000  # ms
+
+
+def fetch_many(requests, trigger=0, timeout=DEFAULT_TIMEOUT):
+    """
+    Fetch parameters from several clients in parallel.
+
+    Parameters
+    ----------
+    requests : dict or sequence of pairs
+        The requested parameters (str or sequence of str), indexed by client.
+        A sequence of (client, parameters) pairs can be used to send several
+        requests to the same client.
+    trigger : int or str, optional
+        The trigger of the requests, see DispatcherAccess.fetch.
+    timeout : int, optional
+        The timeout in ms of each request.
+
+    Returns
+    -------
+    values : dict or list
+        The fetched values, indexed by client if the requests are a dict,
+        or in the order of the pairs otherwise.
+
+    Raises
+    ------
+    The exception of the first failed request (in the order of the requests),
+    once all the requests are completed.
+
+    """
+    if isinstance(requests, dict):
+        pairs = list(requests.items())
+    else:
+        pairs = [tuple(_) for _ in requests]
+    if len(pairs) == 0:
+        return {} if isinstance(requests, dict) else []
+    if len(pairs) == 1:
+        client, parameters = pairs[0]
+        values = [client.fetch(parameters, trigger, timeout)]
+    else:
+        with ThreadPoolExecutor(len(pairs)) as executor:
+            futures = [executor.submit(c.fetch, p, trigger, timeout)
+                       for c, p in pairs]
+        values = [_.result() for _ in futures]
+    if isinstance(requests, dict):
+        return dict((c, v) for (c, _), v in zip(pairs, values))
+    return values
@@ -4,8 +4,15 @@ import csv
 import itertools
 import re
 import os
+import sys
+import numpy as np
+from .cache import cached
 
 FILENAME = os.path.join(os.path.dirname(__file__), 'data', 'parameters.csv')
+FILENAME_DISPATCHER = os.path.join(
+    os.path.dirname(__file__), 'data', 'parameters_dispatcher.txt')
+FILENAME_TF = os.path.join(
+    os.path.dirname(__file__), 'data', 'parametersTF.dispatcher')
 
 TYPE_CODE = {
     'uint8': 0x00,
@@ -33,6 +40,10 @@ TYPE_CODE = {
 ParameterEntry = namedtuple('ParameterEntry',
                             'name description type shape ubound use_tf')
 
+TFEntry = namedtuple('TFEntry',
+                     'name realname unit function precision use_tf lowalert '
+                     'lowwarn highwarn highalert description')
+
 """ $modified: Thu 29 Jun 2017 10:10:54 CEST
     rxType now includes string
 """
@@ -41,6 +52,11 @@ rxType = re.compile(r"""
     (\[(?P<size>\d+)(:(?P<ubound>[A-Za-z0-9_]+))?\])?  # size of array: [16], [16:ubound]
     (\)(?P<shape>(\[\d+\])+))?              # replications: (8[3])[2][2]""", re.VERBOSE)
 
+rxLinearTF = re.compile(r"""
+    ^\s*(?P<a>[-+]?[0-9.]+(e[-+]?\d+)?)?\s*\*?\s*x          # slope: 3.8e-5x
+    (\s*(?P<sign>[-+])\s*(?P<b>[0-9.]+(e[-+]?\d+)?))?\s*$    # offset: + 0.0""",
+    re.VERBOSE | re.IGNORECASE)
+
 
 def read_params(filename=FILENAME):
     """
@@ -48,10 +64,17 @@ def read_params(filename=FILENAME):
     whether or name a parameter should have TF (transfer function) counterpart
     from the original csv file.
 
+    The parsed table is cached, see the cache module.
+
     """
+    return cached('parameters', (filename, FILENAME_DISPATCHER),
+                  _read_params, filename)
+
+
+def _read_params(filename):
     out = []
     nskip = 3
-    with open(filename) as f:
+    with open(filename, encoding='latin-1') as f:
         reader = csv.reader(f, delimiter=';', quotechar='|')
         for _ in range(nskip):
             next(reader)
@@ -85,9 +108,7 @@ def read_params(filename=FILENAME):
                 name, description, ptype, shape, ubound, use_tf)
             out.append(entry)
 
-    filename_dispatcher = os.path.join(os.path.dirname(__file__), 'data',
-                                       'parameters_dispatcher.txt')
-    with open(filename_dispatcher) as f:
+    with open(FILENAME_DISPATCHER) as f:
         for line in f:
             name, ptype, description = line.split(' ; ')
             entry = ParameterEntry(
@@ -102,21 +123,241 @@ def read_all_params(filename=FILENAME):
     Read the parameter table and add entries to access specific parts of
     the multi-dimensional parameters such as QUBIC_PreviewRawData. For example,
     the parameter QUBIC_PreviewRawData_1_24 accesses
-    QUBIC_PreviewRawData[1][24].
+    QUBIC_PreviewRawData[1][24]. The returned ParameterEntryTable is a
+    sequence of ParameterEntry, in which the added entries are derived on
+    access.
+
+    The parsed table is cached, see the cache module.
 
     """
-    params = read_params(filename)
-    out = []
-    for param in params:
-        out.append(param)
-        if len(param.shape) > 1:
-            shape = (param.shape[-1],)
+    return cached('all_parameters', (filename, FILENAME_DISPATCHER),
+                  _read_all_params, filename)
+
+
+def _read_all_params(filename):
+    return ParameterEntryTable(read_params(filename))
+
+
+class ParameterEntryTable(object):
+    """
+    Sequence of the ParameterEntry of the parameters, each of them followed
+    by the entries accessing the last dimension of the multi-dimensional
+    parameters, in C order: QUBIC_PreviewRawData, QUBIC_PreviewRawData_0_0,
+    QUBIC_PreviewRawData_0_1, etc.
+
+    Only the entries of the csv file are stored, with interned strings,
+    along with the positions of their expanded entries. The names and shapes
+    of the expanded entries are derived on access, so that the table does
+    not hold thousands of tuples duplicating the descriptions.
+
+    """
+    __slots__ = ('_entries', '_offsets', '_names')
+
+    def __init__(self, entries):
+        intern = sys.intern
+        self._entries = [
+            _._replace(name=intern(_.name),
+                       description=intern(_.description),
+                       ubound=None if _.ubound is None else intern(_.ubound))
+            for _ in entries]
+        counts = [1 + (int(np.prod(_.shape[:-1])) if len(_.shape) > 1 else 0)
+                  for _ in self._entries]
+        self._offsets = np.zeros(len(counts) + 1, np.int64)
+        np.cumsum(counts, out=self._offsets[1:])
+        self._names = dict((_.name, i) for i, _ in enumerate(self._entries))
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get(_) for _ in range(*index.indices(len(self)))]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('The parameter index is out of range.')
+        return self._get(index)
+
+    def __iter__(self):
+        for entry in self._entries:
+            yield entry
+            if len(entry.shape) < 2:
+                continue
             for indices in itertools.product(
-                    *[range(_) for _ in param.shape[:-1]]):
-                name = '{0}_{1}'.format(
-                    param.name, '_'.join(str(i) for i in indices))
-                entry = ParameterEntry(
-                    name, param.description, param.type, shape, param.ubound,
-                    param.use_tf)
-                out.append(entry)
+                    *[range(_) for _ in entry.shape[:-1]]):
+                yield self._expand(entry, indices)
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def _get(self, index):
+        i = int(np.searchsorted(self._offsets, index, 'right')) - 1
+        entry = self._entries[i]
+        flat = index - int(self._offsets[i]) - 1
+        if flat < 0:
+            return entry
+        return self._expand(entry, np.unravel_index(flat, entry.shape[:-1]))
+
+    @staticmethod
+    def _expand(entry, indices):
+        name = '{0}_{1}'.format(entry.name, '_'.join(str(_) for _ in indices))
+        return ParameterEntry(name, entry.description, entry.type,
+                              entry.shape[-1:], entry.ubound, entry.use_tf)
+
+    def _find(self, name):
+        """ Return the position of an entry in the table, or None. """
+        try:
+            return int(self._offsets[self._names[name]])
+        except KeyError:
+            pass
+        parts = name.split('_')
+        for n in range(1, len(parts)):
+            i = self._names.get('_'.join(parts[:-n]))
+            if i is None:
+                continue
+            shape = self._entries[i].shape[:-1]
+            indices = parts[-n:]
+            if len(shape) != n or not all(_.isdigit() for _ in indices):
+                return None
+            indices = [int(_) for _ in indices]
+            if any(j >= s for j, s in zip(indices, shape)) or \
+               any(str(j) != _ for j, _ in zip(indices, parts[-n:])):
+                return None
+            return int(self._offsets[i]) + 1 + \
+                int(np.ravel_multi_index(indices, shape))
+        return None
+
+    def index(self, name):
+        """ Return the position of the entry of a parameter in the table. """
+        out = self._find(name)
+        if out is None:
+            raise ValueError("Invalid parameter name: '{}'.".format(name))
+        return out
+
+    def get(self, name, default=None):
+        """ Return the entry of a parameter, or default if it is unknown. """
+        index = self._find(name)
+        if index is None:
+            return default
+        return self._get(index)
+
+    @property
+    def entries(self):
+        """ The entries of the csv file, without the expanded entries. """
+        return list(self._entries)
+
+
+def get_entry(name, entries=None):
+    """
+    Return the ParameterEntry of a parameter name of the client parameter
+    table, or None if it is unknown. In addition to the names of the table
+    returned by read_all_params, the names of the transfer function
+    parameters (suffix _TF) and of the meta-parameters of the 3-dimensional
+    parameters (such as QUBIC_WorkingRawData_0, see get_parameters) are
+    resolved.
+
+    """
+    if entries is None:
+        entries = read_all_params()
+    entry = entries.get(name)
+    if entry is not None:
+        return entry
+    if name.endswith('_TF'):
+        entry = entries.get(name[:-3])
+        if entry is None or not entry.use_tf:
+            return None
+        return entry._replace(name=name)
+    root, _, index = name.rpartition('_')
+    if not index.isdigit() or str(int(index)) != index:
+        return None
+    entry = entries.get(root)
+    if entry is None or len(entry.shape) < 3 or entry.use_tf or \
+       int(index) >= entry.shape[0]:
+        return None
+    return ParameterEntry(name, entry.description, entry.type,
+                          entry.shape[1:], entry.ubound, False)
+
+
+def full_shape(name, shape, entries=None):
+    """
+    Return the shape of a parameter regardless of its upper bound, given the
+    shape of one of its values, which may be restricted to the bound. The
+    latter is returned if the parameter is unknown.
+
+    """
+    entry = get_entry(name, entries)
+    if entry is not None and len(entry.shape) == len(shape):
+        return tuple(entry.shape)
+    return tuple(shape)
+
+
+def read_tf(filename=FILENAME_TF):
+    """
+    Extract the transfer function descriptions of the parameters from the
+    dispatcher TF file: real name, unit, function, precision, whether the
+    TF is used, alert and warning thresholds and description. The
+    thresholds which are not enabled are set to None.
+
+    The parsed table is cached, see the cache module.
+
+    """
+    return cached('tf', (filename,), _read_tf, filename)
+
+
+def _read_tf(filename):
+    def convert(section):
+        def threshold(key):
+            if section.get(key) != 'true':
+                return None
+            return float(section[key + 'v'])
+        precision = section.get('precision')
+        return TFEntry(
+            section['name'], section.get('realname', ''),
+            section.get('unit', '').partition('|')[0],
+            section.get('function', ''),
+            None if precision is None else int(precision),
+            section.get('useTF') == '1', threshold('lowalert'),
+            threshold('lowwarn'), threshold('highwarn'),
+            threshold('highalert'), section.get('description', ''))
+
+    out = []
+    section = None
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line == '':
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                if section is not None:
+                    out.append(convert(section))
+                section = {'name': line[1:-1]}
+                continue
+            if section is None:
+                continue
+            key, _, value = line.partition('=')
+            section[key] = value
+    if section is not None:
+        out.append(convert(section))
     return out
+
+
+def parse_linear_tf(function):
+    """
+    Return the coefficients (a, b) of a transfer function of the form
+    'ax + b', or None if the transfer function is not linear.
+
+    """
+    match = rxLinearTF.match(function)
+    if match is None:
+        return None
+    a = 1. if match.group('a') is None else float(match.group('a'))
+    if match.group('b') is None:
+        b = 0.
+    else:
+        b = float(match.group('b'))
+        if match.group('sign') == '-':
+            b = -b
+    if a == 0:
+        return None
+    return a, b
@@ -1,9 +1,14 @@
+from cpython.buffer cimport (
+    PyBUF_C_CONTIGUOUS, PyBUF_F_CONTIGUOUS, PyBUF_FORMAT, PyBUF_ND,
+    PyBUF_STRIDES)
+from libc.stdlib cimport free, malloc
 cimport numpy as np
 from libcpp cimport bool
 from libcpp.string cimport string
 from libdispatcheraccess cimport TParametersTable
 from libqt cimport quint8, quint16, quint32
 from .parameters import read_all_params, ParameterEntry
+import weakref
 
 
 cdef class DispatcherAccess
@@ -16,35 +21,120 @@ class ParameterTable(object):
     Except for the QString case, the parameter value is a view of
     the parameter member of TParametersTable class (i.e.: there is not copy).
 
+    The table is built from a compact list of entries and the Parameter
+    instances are only created on first access. The parameters are indexed
+    by name and by id, so that item access does not require a scan of the
+    table.
+
     """
-    #cdef object _params
-    #cdef quint32 NETQUIC_rate
-    NETQUIC_rate=None
-    
-    def __init__(self, params):
-        self._params = params
-        for param in params:
-            setattr(self, param.name, param)
+    def __init__(self, entries, DispatcherAccess da not None, table=None):
+        """
+        Parameters
+        ----------
+        entries : list of tuple
+            The (name, id, rparam, iparam, use_tf) entries of the parameters,
+            where rparam is the ParameterEntry from which the parameter is
+            created, or its position in the table of read_all_params, and
+            iparam its index in the TParametersTable.
+        da : DispatcherAccess
+            The client whose TParametersTable holds the parameter values.
+            Only a weak reference to it is kept, since the client holds its
+            table.
+        table : ParameterEntryTable, optional
+            The table of read_all_params, to which the positions refer.
+
+        """
+        self._entries = entries
+        self._table = table
+        self._da = weakref.ref(da)
+        self._params = len(entries) * [None]
+        self._names = {}
+        self._ids = {}
+        for i, entry in enumerate(entries):
+            self._names[entry[0]] = i
+            self._ids.setdefault(entry[1], i)
+
+    def _get(self, int index):
+        param = self._params[index]
+        if param is None:
+            name, id, rparam, iparam, use_tf = self._entries[index]
+            if isinstance(rparam, int):
+                rparam = self._table[rparam]
+                if use_tf:
+                    rparam = rparam._replace(name=name, type=0x27,
+                                             use_tf=False)
+            da = self._da()
+            if da is None:
+                raise RuntimeError(
+                    'The client of the parameter table is deleted.')
+            param = convert_parameter(rparam, iparam, self, use_tf, da)
+            param.id = id
+            self._params[index] = param
+        return param
+
+    def __getattr__(self, name):
+        try:
+            index = self.__dict__['_names'][name]
+        except KeyError:
+            raise AttributeError(
+                "'{0}' object has no attribute '{1}'".format(
+                    type(self).__name__, name))
+        return self._get(index)
+
+    def __dir__(self):
+        return sorted(set(dir(type(self))) | set(self.__dict__) |
+                      set(self._names))
 
     def __getitem__(self, value):
         if isinstance(value, str):
-            if not hasattr(self, value):
+            try:
+                return self._get(self._names[value])
+            except KeyError:
                 raise ValueError("Invalid parameter name: '{}'.".format(value))
-            return getattr(self, value)
         value = int(value)
-        for param in self._params:
-            if param.id == value:
-                return param
-        raise ValueError("Invalid parameter value: '{}'.".format(value))
+        try:
+            return self._get(self._ids[value])
+        except KeyError:
+            raise ValueError("Invalid parameter value: '{}'.".format(value))
 
     def __len__(self):
-        return len(self._params)
+        return len(self._entries)
 
     def __iter__(self):
-        return iter(self._params)
+        return (self._get(i) for i in range(len(self._entries)))
             
 
+# data types of the numerical parameters, indexed by the parameter type
+PARAMETER_DTYPES = {
+    0x00: np.uint8,
+    0x01: np.uint16,
+    0x02: np.uint32,  # ASIC_RowColumnRange stored as quint32
+    0x03: np.uint32,
+    0x07: np.uint64,
+    0x08: np.int8,
+    0x09: np.int16,
+    0x0A: np.int32,
+    0x0B: np.int32,
+    0x0F: np.int64,
+    0x13: np.float32,
+    0x27: np.float64,
+}
+# types reported for the parameters stored as another type
+PARAMETER_TYPES = {0x02: 0x03, 0x0A: 0x0B}
+
+
 cdef class Parameter:
+    """
+    Parameter of the TParametersTable.
+
+    The value is a NumPy view of the parameter buffer, which is created on
+    first access and cached: it is only rebuilt when the upper bound of the
+    parameter changes. The same array is therefore returned by successive
+    accesses and it must not be reshaped in place. The parameter also
+    exposes its value through the buffer protocol, so that memoryview or
+    other libraries can read it without copy.
+
+    """
     cdef void *_ptr
     cdef void *_ptr_bound
     cdef public str name
@@ -52,14 +142,27 @@ cdef class Parameter:
     cdef public int type
     cdef int ubound
     cdef int s1
-
-    def __cinit__(self, str name, int id, int ubound, int s1, *args):
-        if s1 < 0:
+    cdef tuple _full_shape
+    cdef object _dtype
+    cdef bytes _format
+    cdef object _array  # view of the whole buffer
+    cdef object _value  # view restricted to the upper bound
+    cdef int _bound  # upper bound of the cached _value
+
+    def __cinit__(self, str name, int id, int ubound, tuple shape,
+                  int type=-1, *args):
+        if any(_ < 0 for _ in shape):
             raise ValueError('Invalid parameter shape.')
         self.name = name
         self.id = id
         self.ubound = ubound
-        self.s1 = s1
+        self.s1 = shape[-1] if len(shape) > 0 else 0
+        self._full_shape = shape
+        self.type = PARAMETER_TYPES.get(type, type)
+        if type in PARAMETER_DTYPES:
+            self._dtype = np.dtype(PARAMETER_DTYPES[type])
+            self._format = self._dtype.char.encode()
+        self._bound = -1
 
     def __str__(self):
         out = '<{0} {1}'.format(type(self).__name__, self.name, self.value)
@@ -73,11 +176,82 @@ cdef class Parameter:
 
     __repr__ = __str__
 
+    property dtype:
+        def __get__(self):
+            return self._dtype
+
     property shape:
         def __get__(self):
-            if self.s1 == 0:
-                return ()
-            return (self.get_bound(),)
+            if self.ubound == -1 or self.s1 == 0:
+                return self._full_shape
+            return self._full_shape[:-1] + (self.get_bound(),)
+
+    property value:
+        def __get__(self):
+            cdef int bound
+            if self._array is None:
+                self._array = self._get_array()
+            if self.ubound == -1:
+                return self._array
+            bound = self.get_bound()
+            if bound != self._bound:
+                self._value = self._array[..., :bound]
+                self._bound = bound
+            return self._value
+
+    cdef object _get_array(self):
+        """ Return a view of the whole parameter buffer. """
+        cdef Py_ssize_t nbytes
+        if self._dtype is None:
+            raise TypeError(
+                "The type '{0}' of parameter '{1}' is not handled.".format(
+                    self.type, self.name))
+        nbytes = self._dtype.itemsize * int(np.prod(self._full_shape))
+        cdef unsigned char[::1] view = <unsigned char[:nbytes]> self._ptr
+        return np.asarray(view).view(self._dtype).reshape(self._full_shape)
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        cdef Py_ssize_t *dims
+        cdef int i, ndim
+        value = self.value
+        ndim = value.ndim
+        if not value.flags.c_contiguous and (
+                (flags & PyBUF_STRIDES) != PyBUF_STRIDES or
+                (flags & PyBUF_C_CONTIGUOUS) == PyBUF_C_CONTIGUOUS):
+            raise BufferError(
+                "The value of parameter '{0}' is not contiguous.".format(
+                    self.name))
+        if not value.flags.f_contiguous and \
+           (flags & PyBUF_F_CONTIGUOUS) == PyBUF_F_CONTIGUOUS:
+            raise BufferError(
+                "The value of parameter '{0}' is not Fortran contiguous.".
+                format(self.name))
+        dims = <Py_ssize_t*>malloc(max(2 * ndim, 1) * sizeof(Py_ssize_t))
+        if dims == NULL:
+            raise MemoryError()
+        for i in range(ndim):
+            dims[i] = value.shape[i]
+            dims[ndim + i] = value.strides[i]
+        buffer.buf = self._ptr
+        buffer.obj = self
+        buffer.len = value.nbytes
+        buffer.itemsize = value.itemsize
+        buffer.readonly = 0
+        buffer.ndim = ndim
+        buffer.format = NULL
+        buffer.shape = NULL
+        buffer.strides = NULL
+        if flags & PyBUF_FORMAT:
+            buffer.format = self._format
+        if flags & PyBUF_ND:
+            buffer.shape = dims
+        if (flags & PyBUF_STRIDES) == PyBUF_STRIDES:
+            buffer.strides = dims + ndim
+        buffer.suboffsets = NULL
+        buffer.internal = dims
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        free(buffer.internal)
 
     cdef int get_bound(self):
         cdef int bound
@@ -91,153 +265,9 @@ cdef class Parameter:
             raise ValueError("Invalid bound type: '{}'.".format(self.ubound))
         return max(0, min(self.s1, bound))
 
-
-cdef class Parameter2d(Parameter):
-    cdef int s2
-    def __cinit__(self, str name, int id, int ubound, int s1, int s2, *args):
-        self.s2 = s2
-    property shape:
-        def __get__(self):
-            return (self.s2, self.get_bound())
-
-
-cdef class Parameter3d(Parameter2d):
-    cdef int s3
-    def __cinit__(self, str name, int id, int ubound, int s1, int s2, int s3):
-        self.s3 = s3
-    property shape:
-        def __get__(self):
-            return (self.s3, self.s2, self.get_bound())
-
-
-cdef class ParameterUInt8(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x00
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.uint8_t[::1] view = <np.uint8_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
-
-
-cdef class ParameterUInt16(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x01
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.uint16_t[::1] view = <np.uint16_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
-
-
-cdef class ParameterUInt32(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x03
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.uint32_t[::1] view = <np.uint32_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
-
-
-cdef class ParameterUInt64(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x07
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.uint64_t[::1] view = <np.uint64_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
-
-
-cdef class ParameterInt8(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x08
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.int8_t[::1] view = <np.int8_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
-
-
-cdef class ParameterInt16(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x09
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.int16_t[::1] view = <np.int16_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
-
-
-cdef class ParameterInt32(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x0B
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.int32_t[::1] view = <np.int32_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
-
-
-cdef class ParameterInt64(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x0F
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.int64_t[::1] view = <np.int64_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
-
-
-cdef class ParameterFloat32(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x13
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.float32_t[::1] view = <np.float32_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
-
-
-cdef class ParameterFloat64(Parameter):
-    def __cinit__(self, *args):
-        self.type = 0x27
-    property value:
-        def __get__(self):
-            cdef int bound = self.get_bound()
-            cdef np.float64_t[::1] view = <np.float64_t[:bound]> self._ptr
-            out = np.asarray(view)
-            if self.s1 == 0:
-                out.shape = ()
-            return out
+    cdef tuple full_shape(self):
+        """ Shape of the parameter buffer, regardless of the upper bound. """
+        return self._full_shape
 
 
 cdef class ParameterString(Parameter):
@@ -248,246 +278,10 @@ cdef class ParameterString(Parameter):
             cdef QString *p = <QString *> self._ptr
             cdef string s = p.toStdString()
             return s.decode('UTF-8')
-
-
-cdef class Parameter2dUInt8(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x00
-    property value:
-        def __get__(self):
-            cdef np.uint8_t[:, ::1] view = <np.uint8_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter2dUInt16(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x01
-    property value:
-        def __get__(self):
-            cdef np.uint16_t[:, ::1] view = <np.uint16_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter2dUInt32(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x03
-    property value:
-        def __get__(self):
-            cdef np.uint32_t[:, ::1] view = <np.uint32_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter2dUInt64(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x07
-    property value:
-        def __get__(self):
-            cdef np.uint64_t[:, ::1] view = <np.uint64_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter2dInt8(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x08
-    property value:
-        def __get__(self):
-            cdef np.int8_t[:, ::1] view = <np.int8_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter2dInt16(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x09
-    property value:
-        def __get__(self):
-            cdef np.int16_t[:, ::1] view = <np.int16_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter2dInt32(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x0B
-    property value:
-        def __get__(self):
-            cdef np.int32_t[:, ::1] view = <np.int32_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter2dInt64(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x0F
-    property value:
-        def __get__(self):
-            cdef np.int64_t[:, ::1] view = <np.int64_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter2dFloat32(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x13
-    property value:
-        def __get__(self):
-            cdef np.float32_t[:, ::1] view = <np.float32_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter2dFloat64(Parameter2d):
-    def __cinit__(self, *args):
-        self.type = 0x27
-    property value:
-        def __get__(self):
-            cdef np.float64_t[:, ::1] view = <np.float64_t[:self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :self.get_bound()]
-
-
-cdef class Parameter3dUInt8(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x00
-    property value:
-        def __get__(self):
-            cdef np.uint8_t[:, :, ::1] view = <np.uint8_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
-
-
-cdef class Parameter3dUInt16(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x01
-    property value:
-        def __get__(self):
-            cdef np.uint16_t[:, :, ::1] view = <np.uint16_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
-
-
-cdef class Parameter3dUInt32(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x03
-    property value:
-        def __get__(self):
-            cdef np.uint32_t[:, :, ::1] view = <np.uint32_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
-
-
-cdef class Parameter3dUInt64(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x07
-    property value:
-        def __get__(self):
-            cdef np.uint64_t[:, :, ::1] view = <np.uint64_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
-
-
-cdef class Parameter3dInt8(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x08
-    property value:
-        def __get__(self):
-            cdef np.int8_t[:, :, ::1] view = <np.int8_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
-
-
-cdef class Parameter3dInt16(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x09
-    property value:
-        def __get__(self):
-            cdef np.int16_t[:, :, ::1] view = <np.int16_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
-
-
-cdef class Parameter3dInt32(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x0B
-    property value:
-        def __get__(self):
-            cdef np.int32_t[:, :, ::1] view = <np.int32_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
-
-
-cdef class Parameter3dInt64(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x0F
-    property value:
-        def __get__(self):
-            cdef np.int64_t[:, :, ::1] view = <np.int64_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
-
-
-cdef class Parameter3dFloat32(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x13
-    property value:
-        def __get__(self):
-            cdef np.float32_t[:, :, ::1] view = <np.float32_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
-
-
-cdef class Parameter3dFloat64(Parameter3d):
-    def __cinit__(self, *args):
-        self.type = 0x27
-    property value:
-        def __get__(self):
-            cdef np.float64_t[:, :, ::1] view = <np.float64_t[:self.s3, :self.s2, :self.s1]> self._ptr
-            a = np.asarray(view)
-            if self.ubound == -1:
-                return a
-            return a[:, :, :self.get_bound()]
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        raise BufferError(
+            "The string parameter '{0}' does not support the buffer "
+            "protocol.".format(self.name))
 
 
 cdef class ParameterUnhandled(Parameter):
@@ -495,11 +289,8 @@ cdef class ParameterUnhandled(Parameter):
         self.type = -1
 
 
-def convert_parameter(rparam, int iparam, params, bparams, use_tf,
+def convert_parameter(rparam, int iparam, table, use_tf,
                       DispatcherAccess da not None):
-    cdef int s1
-    cdef int s2
-    cdef int s3
     cdef int id = iparam
     cdef TParametersTable *pt = da._da.parameters()
 
@@ -509,115 +300,22 @@ def convert_parameter(rparam, int iparam, params, bparams, use_tf,
     ptype = rparam.type
     if rparam.ubound is not None:
         try:
-            pbound = bparams[rparam.ubound]
-        except KeyError:
-            try:
-                pbound = next(_ for _ in params if _.name == rparam.ubound)
-                bparams[pbound.name] = pbound
-            except ValueError:
-                raise ValueError("Undefined parameter '{}'.".
-                                 format(rparam.ubound))
+            pbound = table[rparam.ubound]
+        except ValueError:
+            raise ValueError("Undefined parameter '{}'.".
+                             format(rparam.ubound))
         ubound = pbound.type
     else:
         ubound = -1
-    ndim = len(rparam.shape)
-    if ndim == 0:
-        s1 = 0
+    shape = tuple(rparam.shape)
+    if ptype == 0x80:
+        param = ParameterString(name, id, -1, ())
+    elif ptype in PARAMETER_DTYPES:
+        param = Parameter(name, id, ubound, shape, ptype)
     else:
-        s1 = rparam.shape[-1]
-    if ndim <= 1:
-        if ptype == 0x00:
-            param = ParameterUInt8(name, id, ubound, s1)
-        elif ptype == 0x01:
-            param = ParameterUInt16(name, id, ubound, s1)
-        elif ptype == 0x02:
-            # ASIC_RowColumnRange stored as quint32
-            param = ParameterUInt32(name, id, ubound, s1)
-        elif ptype == 0x03:
-            param = ParameterUInt32(name, id, ubound, s1)
-        elif ptype == 0x07:
-            param = ParameterUInt64(name, id, ubound, s1)
-        elif ptype == 0x08:
-            param = ParameterInt8(name, id, ubound, s1)
-        elif ptype == 0x09:
-            param = ParameterInt16(name, id, ubound, s1)
-        elif ptype == 0x0A:
-            param = ParameterInt32(name, id, ubound, s1)
-        elif ptype == 0x0B:
-            param = ParameterInt32(name, id, ubound, s1)
-        elif ptype == 0x0F:
-            param = ParameterInt64(name, id, ubound, s1)
-        elif ptype == 0x13:
-            param = ParameterFloat32(name, id, ubound, s1)
-        elif ptype == 0x27:
-            param = ParameterFloat64(name, id, ubound, s1)
-        elif ptype == 0x80:
-            param = ParameterString(name, id, -1, 0)
-        else:
-            param = ParameterUnhandled(name, id, ubound, s1)
-            print("Parameter '{}' of type '{}' is not handled.".
-                  format(name, ptype))
-    elif ndim == 2:
-        s2 = rparam.shape[0]
-        if ptype == 0x00:
-            param = Parameter2dUInt8(name, id, ubound, s1, s2)
-        elif ptype == 0x01:
-            param = Parameter2dUInt16(name, id, ubound, s1, s2)
-        elif ptype == 0x02:
-            param = Parameter2dUInt32(name, id, ubound, s1, s2)
-        elif ptype == 0x03:
-            param = Parameter2dUInt32(name, id, ubound, s1, s2)
-        elif ptype == 0x07:
-            param = Parameter2dUInt64(name, id, ubound, s1, s2)
-        elif ptype == 0x08:
-            param = Parameter2dInt8(name, id, ubound, s1, s2)
-        elif ptype == 0x09:
-            param = Parameter2dInt16(name, id, ubound, s1, s2)
-        elif ptype == 0x0A:
-            param = Parameter2dInt32(name, id, ubound, s1, s2)
-        elif ptype == 0x0B:
-            param = Parameter2dInt32(name, id, ubound, s1, s2)
-        elif ptype == 0x0F:
-            param = Parameter2dInt64(name, id, ubound, s1, s2)
-        elif ptype == 0x13:
-            param = Parameter2dFloat32(name, id, ubound, s1, s2)
-        elif ptype == 0x27:
-            param = Parameter2dFloat64(name, id, ubound, s1, s2)
-        else:
-            param = ParameterUnhandled(name, id, ubound, s1)
-            print("Parameter '{}' of type '{}' is not handled.".
-                  format(name, ptype))
-    elif ndim == 3:
-        s2 = rparam.shape[1]
-        s3 = rparam.shape[0]
-        if ptype == 0x00:
-            param = Parameter3dUInt8(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x01:
-            param = Parameter3dUInt16(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x02:
-            param = Parameter3dUInt32(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x03:
-            param = Parameter3dUInt32(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x07:
-            param = Parameter3dUInt64(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x08:
-            param = Parameter3dInt8(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x09:
-            param = Parameter3dInt16(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x0A:
-            param = Parameter3dInt32(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x0B:
-            param = Parameter3dInt32(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x0F:
-            param = Parameter3dInt64(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x13:
-            param = Parameter3dFloat32(name, id, ubound, s1, s2, s3)
-        elif ptype == 0x27:
-            param = Parameter3dFloat64(name, id, ubound, s1, s2, s3)
-        else:
-            param = ParameterUnhandled(name, id, ubound, s1)
-            print("Parameter '{}' of type '{}' is not handled.".
-                  format(name, ptype))
+        param = ParameterUnhandled(name, id, ubound, shape)
+        print("Parameter '{}' of type '{}' is not handled.".
+              format(name, ptype))
 
     if use_tf:
         param._ptr = pt.paramAddressTF[iparam]
@@ -631,22 +329,16 @@ def convert_parameter(rparam, int iparam, params, bparams, use_tf,
 
 def get_parameters(DispatcherAccess da):
     cdef int i, j
-    # cdef TParametersTable _params
 
     rparams = read_all_params()
-    params = []
-    paramsTF = []
-    bparams = {}
+    entries = []
     for i, rparam in enumerate(rparams):
-        param = convert_parameter(rparam, i, params, bparams, False, da)
-        params.append(param)
+        # the entries refer to the position of their ParameterEntry in the
+        # table, which derives them on access
+        entries.append((rparam.name, i, i, i, False))
         if rparam.use_tf:
-            rparam_tf = ParameterEntry(
-                rparam.name+'_TF', rparam.description, 0x27, rparam.shape,
-                rparam.ubound, False)
-            param = convert_parameter(rparam_tf, i, params, bparams, True, da)
-            params.append(param)
-   
+            entries.append((rparam.name + '_TF', i | cTF_FLAG, i, i, True))
+
     # As of 28/09/2015, parameter access to 3-dimensional arrays through
     # the Dispatcher Client is limited to either the whole array or each of
     # the last dimension. We provide a transparent access to the last two
@@ -669,10 +361,6 @@ def get_parameters(DispatcherAccess da):
             rparam_ = ParameterEntry(
                 '{0}_{1}'.format(rparam.name, j), rparam.description,
                 rparam.type, rparam.shape[1:], rparam.ubound, False)
-            param = convert_parameter(
-                rparam_, iparam, None, bparams, False, da)
-            param.id |= cMETA_FLAG
-            params.append(param)
-            # _params=params
-    return ParameterTable(params)
-    # return params
+            entries.append(
+                (rparam_.name, iparam | cMETA_FLAG, rparam_, iparam, False))
+    return ParameterTable(entries, da, rparams)
@@ -1,15 +1,63 @@
 from libdispatcheraccess cimport TParamsComputer
+from collections import namedtuple
+
+TFMetadata = namedtuple('TFMetadata',
+                        'unit rawUnit precision hasTf canInvCalculate '
+                        'realName dispName description')
+
+# version of the transfer functions, incremented when they are reloaded
+cdef int _tf_version = 0
+
+
+cdef void invalidate_tf():
+    """ Invalidate the caches of transfer function metadata. """
+    global _tf_version
+    _tf_version += 1
 
 
 cdef class ParamsComputer:
+    """
+    Transfer function computer.
+
+    The metadata of a parameter (unit, precision, names...) are read from
+    the dispatcher library on first access and cached until the transfer
+    functions are reloaded through updateTF or DispatcherAccess.sendReloadTF.
+
+    """
     cdef TParamsComputer* _pc
+    cdef dict _metadata
+    cdef int _version
+
     def __cinit__(self):
         self._pc = new TParamsComputer()
-        
+        self._metadata = {}
+        self._version = _tf_version
 
     def __dealloc__(self):
         del self._pc
 
+    cdef object _get(self, int parameter_id):
+        cdef string unit, rawUnit, realName, dispName, description
+        if self._version != _tf_version:
+            self._metadata = {}
+            self._version = _tf_version
+        try:
+            return self._metadata[parameter_id]
+        except KeyError:
+            pass
+        unit = self._pc.unit(parameter_id).toStdString()
+        rawUnit = self._pc.rawUnit(parameter_id).toStdString()
+        realName = self._pc.realName(parameter_id).toStdString()
+        dispName = self._pc.dispName(parameter_id).toStdString()
+        description = self._pc.description(parameter_id).toStdString()
+        out = TFMetadata(
+            unit.decode('UTF-8'), rawUnit.decode('UTF-8'),
+            self._pc.precision(parameter_id), self._pc.hasTf(parameter_id),
+            self._pc.canInvCalculate(parameter_id), realName.decode('UTF-8'),
+            dispName.decode('UTF-8'), description.decode('UTF-8'))
+        self._metadata[parameter_id] = out
+        return out
+
     def calculate(self, int parameter_id, double value):
         return self._pc.calculate(parameter_id, value)
 
@@ -18,35 +66,41 @@ cdef class ParamsComputer:
 
     def updateTF(self):
         self._pc.updateTF()
+        invalidate_tf()
 
     def fileVersion(self):
         return self._pc.fileVersion()
 
+    def metadata(self, parameter_ids):
+        """
+        Return the TFMetadata of a parameter id or of a sequence of
+        parameter ids.
+
+        """
+        if isinstance(parameter_ids, int):
+            return self._get(parameter_ids)
+        return [self._get(_) for _ in parameter_ids]
+
     def unit(self, int parameter_id):
-        cdef string out = self._pc.unit(parameter_id).toStdString()
-        return out.decode('UTF-8')
+        return self._get(parameter_id).unit
 
     def rawUnit(self, int parameter_id):
-        cdef string out = self._pc.rawUnit(parameter_id).toStdString()
-        return out.decode('UTF-8')
+        return self._get(parameter_id).rawUnit
 
     def precision(self, int parameter_id):
-        return self._pc.precision(parameter_id)
+        return self._get(parameter_id).precision
 
     def hasTf(self, int parameter_id):
-        return self._pc.hasTf(parameter_id)
+        return self._get(parameter_id).hasTf
 
     def canInvCalculate(self, int parameter_id):
-        return self._pc.canInvCalculate(parameter_id)
+        return self._get(parameter_id).canInvCalculate
 
     def realName(self, int parameter_id):
-        cdef string out = self._pc.realName(parameter_id).toStdString()
-        return out.decode('UTF-8')
+        return self._get(parameter_id).realName
 
     def dispName(self, int parameter_id):
-        cdef string out = self._pc.dispName(parameter_id).toStdString()
-        return out.decode('UTF-8')
+        return self._get(parameter_id).dispName
 
     def description(self, int parameter_id):
-        cdef string out = self._pc.description(parameter_id).toStdString()
-        return out.decode('UTF-8')
+        return self._get(parameter_id).description
@@ -0,0 +1,202 @@
+"""
+Pipelined execution of dispatcher commands.
+
+In waitingForAckMode, a dispatcher client waits for the acknowledgement of a
+command before sending the next one, so that the configuration sweeps are
+dominated by the round-trip time of the commands. A CommandPipeline sends the
+commands through several connections to the dispatcher, each of them driven
+by a worker thread in waitingForAckMode, so that up to max_in_flight commands
+are awaiting their acknowledgement at any time. The outcome and latency of
+each command are gathered as CommandResult tuples.
+
+Each connection is a separate client (DispatcherAccess.pipeline creates
+max_in_flight - 1 of them in addition to the calling client), whose command
+methods are called from its worker thread only, rather than from the thread
+which created it. The clients must not be used from other threads while the
+pipeline is open. The additional clients are released when the pipeline is
+closed, which closes their connection once the caller holds no reference to
+them.
+
+Examples
+--------
+>>> with client.pipeline(4) as pipeline:
+...     for asic in range(16):
+...         for pixel in range(128):
+...             pipeline.sendSetVOffset(asic, pixel, voffsets[asic, pixel])
+>>> failed = [_ for _ in pipeline.results() if not _.ok]
+
+"""
+from __future__ import division, print_function
+from collections import namedtuple
+from concurrent.futures import Future, wait
+import functools
+import queue
+import threading
+import time
+
+__all__ = ['CommandPipeline', 'CommandResult']
+
+CommandResult = namedtuple('CommandResult', 'name args ok error latency')
+
+
+class CommandPipeline(object):
+    """
+    Send commands through several dispatcher clients, each of them having at
+    most one command awaiting its acknowledgement.
+
+    The commands are queued by calling the pipeline's send* methods, which
+    have the signature of those of DispatcherAccess and return a Future
+    whose result is a CommandResult (name, args, ok, error, latency), the
+    latency being in seconds.
+
+    Parameters
+    ----------
+    clients : sequence of DispatcherAccess
+        The clients through which the commands are sent. Their number sets
+        the number of commands in flight. They are put in waitingForAckMode
+        until the pipeline is closed.
+    ordered : boolean, optional
+        If true, the commands with the same first argument, such as the ASIC
+        number, are sent through the same client, in the order in which they
+        are queued. Otherwise, a command is sent through the client with the
+        fewest queued commands.
+    owned : sequence of DispatcherAccess, optional
+        The clients created for the pipeline, which are released when it is
+        closed: they are closed, if they have a close method, and the
+        pipeline drops its references to them.
+
+    """
+    def __init__(self, clients, ordered=True, owned=()):
+        self.clients = list(clients)
+        if len(self.clients) == 0:
+            raise ValueError('No client is specified.')
+        self.ordered = ordered
+        self._owned = list(owned)
+        self._futures = []
+        self._lock = threading.Lock()
+        self._pending = [0] * len(self.clients)
+        self._queues = [queue.Queue() for _ in self.clients]
+        self._modes = [_.waitingForAckMode for _ in self.clients]
+        self._workers = [
+            threading.Thread(target=self._run, args=(i,),
+                             name='command-pipeline-{0}'.format(i))
+            for i in range(len(self.clients))]
+        for worker in self._workers:
+            worker.daemon = True
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getattr__(self, name):
+        if not name.startswith('send'):
+            raise AttributeError(
+                "'{0}' object has no attribute '{1}'".format(
+                    type(self).__name__, name))
+        return functools.partial(self.submit, name)
+
+    @property
+    def max_in_flight(self):
+        """ Maximum number of commands awaiting their acknowledgement. """
+        return len(self._queues)
+
+    def submit(self, name, *args):
+        """
+        Queue a command.
+
+        Parameters
+        ----------
+        name : str
+            The name of the DispatcherAccess command method, such as
+            'sendSetVOffset'.
+        args
+            The arguments of the command.
+
+        Returns
+        -------
+        A Future whose result is the CommandResult of the command.
+
+        """
+        if self._workers is None:
+            raise RuntimeError('The pipeline is closed.')
+        if not name.startswith('send') or \
+           not callable(getattr(self.clients[0], name, None)):
+            raise ValueError("Invalid command '{0}'.".format(name))
+        future = Future()
+        with self._lock:
+            if self.ordered:
+                index = hash(args[0] if len(args) > 0 else None) % \
+                        len(self.clients)
+            else:
+                index = self._pending.index(min(self._pending))
+            self._pending[index] += 1
+            self._futures.append(future)
+        self._queues[index].put((future, name, args))
+        return future
+
+    def _run(self, index):
+        client = self.clients[index]
+        client.waitingForAckMode = True
+        while True:
+            item = self._queues[index].get()
+            if item is None:
+                break
+            future, name, args = item
+            if future.set_running_or_notify_cancel():
+                time0 = time.time()
+                try:
+                    getattr(client, name)(*args)
+                    error = None
+                except Exception as exc:
+                    error = str(exc) or type(exc).__name__
+                latency = time.time() - time0
+                future.set_result(
+                    CommandResult(name, args, error is None, error, latency))
+            with self._lock:
+                self._pending[index] -= 1
+
+    def join(self, timeout=None):
+        """
+        Wait until the queued commands are acknowledged or have failed.
+
+        """
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures, timeout)
+
+    def results(self):
+        """
+        Wait for the queued commands and return their CommandResult, in the
+        order in which they were queued.
+
+        """
+        self.join()
+        with self._lock:
+            futures = list(self._futures)
+        return [_.result() for _ in futures if not _.cancelled()]
+
+    def close(self):
+        """
+        Wait for the queued commands, stop the worker threads, restore the
+        command mode of the clients and release the clients created for the
+        pipeline.
+
+        """
+        if self._workers is None:
+            return
+        for queue_ in self._queues:
+            queue_.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = None
+        for client, mode in zip(self.clients, self._modes):
+            client.waitingForAckMode = mode
+        owned = set(id(_) for _ in self._owned)
+        self.clients = [_ for _ in self.clients if id(_) not in owned]
+        for client in self._owned:
+            if hasattr(client, 'close'):
+                client.close()
+        self._owned = []
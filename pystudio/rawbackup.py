@@ -0,0 +1,312 @@
+"""
+Reader of the raw backups written by the dispatcher.
+
+A raw backup session is made of one or more files 'rawBackup-*.bin', in which
+each buffer received from a subsystem is saved as a record: an 11-byte header
+followed by the buffer itself. The header contains, in big-endian order:
+    - the sync word 0x5AA5 (uint16),
+    - the subsystem id (uint8),
+    - the size of the buffer in bytes (uint32),
+    - the UTC time of the record in seconds since the epoch (uint32).
+Records of the subsystem DATATION_SUBSYSTEM are empty time marks.
+
+The files are memory-mapped and only the record headers are read, so that
+multi-GB sessions can be indexed and sliced by time range without loading
+them. The payloads are returned as NumPy views of the mapped files.
+
+Examples
+--------
+>>> from pystudio.rawbackup import RawBackup
+>>> backup = RawBackup('rawBackup-2018.04.25.101010.bin')
+>>> backup.subsystems
+{2: 1520, 254: 312}
+>>> frames = backup.frames('MultiNetQuicManager', dtype, start=t0, stop=t1)
+>>> frames = backup.stack('MultiNetQuicManager', dtype)
+
+"""
+from __future__ import division, print_function
+import mmap
+import os
+import re
+import struct
+import warnings
+import numpy as np
+from .utils import PyStudioWarning
+
+__all__ = ['RawBackup', 'read_subsystems']
+
+FILENAME_OPTIONS = os.path.join(
+    os.path.dirname(__file__), 'data', 'projectOptions.ini')
+
+SYNC = 0x5AA5
+DATATION_SUBSYSTEM = 0xFE
+HEADER_DTYPE = np.dtype([('sync', '>u2'), ('subsystem', 'u1'),
+                         ('size', '>u4'), ('time', '>u4')])
+INDEX_DTYPE = np.dtype([('file', 'u2'), ('subsystem', 'u1'), ('time', 'u4'),
+                        ('offset', 'i8'), ('size', 'u4')])
+
+_header = struct.Struct('>HBII')
+assert _header.size == HEADER_DTYPE.itemsize
+
+
+def read_subsystems(filename=FILENAME_OPTIONS):
+    """
+    Return the subsystem ids of the project options file, indexed by the
+    upper-case subsystem name. The QUBIC_RAW and QUBIC_SUM telemetries are
+    sent by the subsystem MULTINETQUICMANAGER.
+
+    """
+    names = {}
+    ids = {}
+    rx = re.compile(r'^subsys(Name|Id)(\d+)=(.*)$')
+    with open(filename, 'rb') as f:
+        for line in f:
+            m = rx.match(line.decode('latin-1').strip())
+            if m is None:
+                continue
+            if m.group(1) == 'Name':
+                names[m.group(2)] = m.group(3).upper()
+            else:
+                ids[m.group(2)] = int(m.group(3))
+    return dict((names[k], ids[k]) for k in names if k in ids)
+
+
+class RawBackup(object):
+    """
+    Memory-mapped raw backup session.
+
+    Parameters
+    ----------
+    filenames : str or sequence of str
+        The raw backup file(s) of the session, in chronological order.
+    strict : boolean, optional
+        If true, a record with an invalid sync word raises a ValueError.
+        Otherwise, the indexing of the file stops at the invalid record,
+        with a warning. A truncated last record, such as the one of a file
+        still being written, is always ignored.
+
+    Attributes
+    ----------
+    index : structured ndarray
+        The records, with the fields 'file', 'subsystem', 'time', 'offset'
+        (of the payload in the file) and 'size' (of the payload).
+
+    """
+    def __init__(self, filenames, strict=True):
+        if isinstance(filenames, str):
+            filenames = [filenames]
+        self.filenames = list(filenames)
+        self._subsystems = read_subsystems()
+        self._mmaps = []
+        self._data = []
+        indexes = []
+        for ifile, filename in enumerate(self.filenames):
+            data = self._map(filename)
+            indexes.append(self._index(ifile, data, strict))
+            self._data.append(data)
+        self.index = np.concatenate(indexes) if len(indexes) > 0 else \
+                     np.empty(0, INDEX_DTYPE)
+
+    def _map(self, filename):
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return np.empty(0, np.uint8)
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._mmaps.append(m)
+        return np.frombuffer(m, np.uint8)
+
+    def _index(self, ifile, data, strict):
+        buf = data.data if data.size > 0 else b''
+        nbytes = data.size
+        subsystems = []
+        times = []
+        offsets = []
+        sizes = []
+        offset = 0
+        while offset + _header.size <= nbytes:
+            sync, subsystem, size, time = _header.unpack_from(buf, offset)
+            if sync != SYNC:
+                msg = "Invalid sync word 0x{0:04X} at offset {1} of '{2}'." \
+                      .format(sync, offset, self.filenames[ifile])
+                if strict:
+                    raise ValueError(msg)
+                warnings.warn(msg, PyStudioWarning)
+                break
+            offset += _header.size
+            if offset + size > nbytes:
+                break
+            subsystems.append(subsystem)
+            times.append(time)
+            offsets.append(offset)
+            sizes.append(size)
+            offset += size
+        index = np.empty(len(offsets), INDEX_DTYPE)
+        index['file'] = ifile
+        index['subsystem'] = subsystems
+        index['time'] = times
+        index['offset'] = offsets
+        index['size'] = sizes
+        return index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        """
+        Unmap the files. The views returned by the reader must have been
+        released beforehand.
+
+        """
+        self._data = []
+        while len(self._mmaps) > 0:
+            self._mmaps.pop().close()
+
+    @property
+    def subsystems(self):
+        """ Number of records per subsystem id. """
+        ids, counts = np.unique(self.index['subsystem'], return_counts=True)
+        return dict(zip(ids.tolist(), counts.tolist()))
+
+    @property
+    def time_range(self):
+        """ Times (in seconds since the epoch) of the first and last records. """
+        if len(self.index) == 0:
+            return None
+        time = self.index['time']
+        return int(time.min()), int(time.max())
+
+    def _subsystem_id(self, subsystem):
+        if isinstance(subsystem, str):
+            try:
+                return self._subsystems[subsystem.upper()]
+            except KeyError:
+                raise ValueError("Invalid subsystem name '{0}'. Expected "
+                                 "names are: {1}.".format(
+                                     subsystem, sorted(self._subsystems)))
+        return subsystem
+
+    def select(self, subsystem=None, start=None, stop=None):
+        """
+        Return the positions in the index of the records of a subsystem
+        whose time t satisfies start <= t < stop.
+
+        Parameters
+        ----------
+        subsystem : int or str, optional
+            The subsystem id or name. By default, the records of all the
+            subsystems, except the datation marks, are selected.
+        start : float, optional
+            The start time, in seconds since the epoch.
+        stop : float, optional
+            The stop time (excluded), in seconds since the epoch.
+
+        """
+        index = self.index
+        if subsystem is None:
+            mask = index['subsystem'] != DATATION_SUBSYSTEM
+        else:
+            mask = index['subsystem'] == self._subsystem_id(subsystem)
+        if start is not None:
+            mask &= index['time'] >= start
+        if stop is not None:
+            mask &= index['time'] < stop
+        return np.flatnonzero(mask)
+
+    def payload(self, i, dtype=np.uint8):
+        """
+        Return the payload of the i-th record as a read-only view of the
+        mapped file.
+
+        Parameters
+        ----------
+        i : int
+            The position of the record in the index.
+        dtype : dtype, optional
+            The data type of the view. The payload size must be a multiple
+            of its item size.
+
+        """
+        record = self.index[i]
+        data = self._data[record['file']]
+        offset = int(record['offset'])
+        out = data[offset:offset + int(record['size'])]
+        dtype = np.dtype(dtype)
+        if dtype != np.uint8:
+            if out.size % dtype.itemsize != 0:
+                raise ValueError(
+                    'The payload size {0} of record {1} is not a multiple of '
+                    'the item size {2}.'.format(out.size, i, dtype.itemsize))
+            out = out.view(dtype)
+        return out
+
+    def frames(self, subsystem, dtype=np.uint8, start=None, stop=None):
+        """
+        Return the payloads of the records of a subsystem in a time range,
+        as read-only views of the mapped files.
+
+        The decommutation of the telemetries is not performed: for the
+        QUBIC_RAW and QUBIC_SUM telemetries, the subsystem is
+        'MultiNetQuicManager' and the dtype describes the layout of the
+        buffers sent by the NetQuic boards.
+
+        Parameters
+        ----------
+        subsystem : int or str
+            The subsystem id or name.
+        dtype : dtype, optional
+            The data type of the views.
+        start : float, optional
+            The start time, in seconds since the epoch.
+        stop : float, optional
+            The stop time (excluded), in seconds since the epoch.
+
+        """
+        return [self.payload(i, dtype)
+                for i in self.select(subsystem, start, stop)]
+
+    def stack(self, subsystem, dtype=np.uint8, start=None, stop=None):
+        """
+        Return the payloads of the records of a subsystem in a time range
+        as a single read-only 2-dimensional view of a mapped file, of shape
+        (nrecords, size). The selected records must have the same size and
+        be evenly spaced in a single file, which is the case of a session in
+        which the subsystem sends fixed-size buffers and is the only one
+        saved. Otherwise, use the frames method.
+
+        Parameters
+        ----------
+        subsystem : int or str
+            The subsystem id or name.
+        dtype : dtype, optional
+            The data type of the view.
+        start : float, optional
+            The start time, in seconds since the epoch.
+        stop : float, optional
+            The stop time (excluded), in seconds since the epoch.
+
+        """
+        index = self.index[self.select(subsystem, start, stop)]
+        dtype = np.dtype(dtype)
+        if len(index) == 0:
+            return np.empty((0, 0), dtype)
+        size = int(index['size'][0])
+        offsets = index['offset']
+        step = int(offsets[1] - offsets[0]) if len(index) > 1 else size
+        if np.any(index['size'] != size) or \
+           np.any(index['file'] != index['file'][0]) or \
+           np.any(np.diff(offsets) != step):
+            raise ValueError(
+                'The selected records are not evenly spaced in a single file.')
+        if size % dtype.itemsize != 0:
+            raise ValueError(
+                'The payload size {0} is not a multiple of the item size {1}.'
+                .format(size, dtype.itemsize))
+        data = self._data[index['file'][0]]
+        return np.ndarray((len(index), size // dtype.itemsize), dtype, data,
+                          int(offsets[0]), (step, dtype.itemsize))
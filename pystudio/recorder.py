@@ -0,0 +1,334 @@
+"""
+Recording of persistent requests into HDF5 files or Zarr stores.
+
+The transfers of the request are moved from its ring buffer into chunk
+buffers by the recording thread, and the full chunks are compressed and
+written by a background writer thread. The number of chunk buffers is fixed,
+so that the memory footprint does not grow with the duration of the
+recording: when the writer lags behind, the recording thread waits for a
+free chunk buffer, during which the transfers accumulate in the ring buffer
+of the request. The waits are reported by the stats attribute.
+
+Each requested parameter is stored in a dataset of shape (ntransfers, ...)
+named after the parameter, and the arrival times of the transfers (in
+seconds since the Epoch) in the dataset 'timestamp'. For the parameters with
+an upper bound, the values beyond the bound are set to zero and the bound of
+each transfer, i.e. the number of valid values along the last dimension, is
+stored in the dataset '<parameter>_bound'.
+
+The h5py or zarr package is required, depending on the format.
+
+Examples
+--------
+>>> with Recorder(client, ['QUBIC_AllPixelsScientificData', 'QUBIC_Nsample'],
+...               'session.h5') as recorder:
+...     recorder.record(3600)
+>>> recorder.stats['overflows']
+0
+
+"""
+from __future__ import division, print_function
+import queue
+import threading
+import time
+import numpy as np
+from .parameters import full_shape, get_entry, read_all_params
+
+__all__ = ['Recorder']
+
+DEFAULT_TIMEOUT = 5000  # ms
+CHUNK_SIZE = 1000  # transfers
+NBUFFERS = 4
+
+
+class _HDF5Writer(object):
+    """ Append the chunks to the resizable datasets of an HDF5 file. """
+    def __init__(self, filename, names, dtypes, shapes, chunk_size,
+                 compression, attrs):
+        import h5py
+        self.file = h5py.File(filename, 'w')
+        self.file.attrs.update(attrs)
+        self.datasets = [
+            self.file.create_dataset(
+                name, (0,) + shape, dtype, maxshape=(None,) + shape,
+                chunks=(chunk_size,) + shape, compression=compression,
+                shuffle=compression is not None)
+            for name, dtype, shape in zip(names, dtypes, shapes)]
+
+    def append(self, arrays):
+        for dataset, array in zip(self.datasets, arrays):
+            n = len(dataset)
+            dataset.resize(n + len(array), 0)
+            dataset[n:] = array
+
+    def close(self):
+        self.file.close()
+
+
+class _ZarrWriter(object):
+    """ Append the chunks to the arrays of a Zarr group. """
+    def __init__(self, filename, names, dtypes, shapes, chunk_size,
+                 compression, attrs):
+        import zarr
+        self.group = zarr.open_group(filename, mode='w')
+        self.group.attrs.update(attrs)
+        if hasattr(self.group, 'create_array'):  # zarr >= 3
+            create = self.group.create_array
+            key = 'compressors'
+        else:
+            create = self.group.create_dataset
+            key = 'compressor'
+        kwargs = {key: None} if compression is None else {}
+        self.datasets = [
+            create(name, shape=(0,) + shape, dtype=dtype,
+                   chunks=(chunk_size,) + shape, **kwargs)
+            for name, dtype, shape in zip(names, dtypes, shapes)]
+
+    def append(self, arrays):
+        for dataset, array in zip(self.datasets, arrays):
+            dataset.append(array, axis=0)
+
+    def close(self):
+        pass
+
+
+class Recorder(object):
+    """
+    Record the transfers of a persistent request.
+
+    Parameters
+    ----------
+    client : DispatcherAccess
+        The client through which the request is sent.
+    parameters : str or sequence of str
+        The recorded parameters. String parameters cannot be recorded.
+    filename : str
+        The output HDF5 file, or Zarr store if the name ends with '.zarr'.
+    trigger : int or str, optional
+        The trigger of the request, see DispatcherAccess.request.
+    every : int, optional
+        For a parameter trigger, the number of its updates between two
+        transfers.
+    chunk_size : int, optional
+        The number of transfers per chunk of the datasets.
+    nbuffers : int, optional
+        The number of chunk buffers, which bounds the number of transfers
+        awaiting to be written to nbuffers * chunk_size.
+    compression : str, optional
+        The HDF5 compression filter, such as 'gzip' or 'lzf'. For Zarr
+        stores, the default compressor is used unless compression is None.
+    timeout : int, optional
+        The request timeout in ms.
+
+    Attributes
+    ----------
+    stats : dict
+        The recording statistics: number of recorded transfers and written
+        chunks, transfers dropped by the ring buffer of the request
+        ('overflows'), time spent by the recording thread waiting for a
+        free chunk buffer ('wait_time', in s) and number of such waits
+        ('waits'), maximum number of chunks awaiting to be written
+        ('max_pending') and time spent writing ('write_time', in s).
+
+    """
+    def __init__(self, client, parameters, filename, trigger=None, every=1,
+                 chunk_size=CHUNK_SIZE, nbuffers=NBUFFERS, compression='gzip',
+                 timeout=DEFAULT_TIMEOUT):
+        if isinstance(parameters, str):
+            parameters = [_.strip() for _ in parameters.split(',')]
+        if chunk_size < 1 or nbuffers < 1:
+            raise ValueError(
+                'The chunk size and number of buffers must be positive.')
+        self.client = client
+        self.parameters = list(parameters)
+        self.filename = filename
+        self.trigger = trigger
+        self.every = every
+        self.chunk_size = chunk_size
+        self.nbuffers = nbuffers
+        self.compression = compression
+        self.timeout = timeout
+        self.stats = dict.fromkeys(
+            ['transfers', 'chunks', 'overflows', 'waits', 'wait_time',
+             'max_pending', 'write_time'], 0)
+        self.request = None
+        self._writer = None
+        self._thread = None
+        self._bounded = []
+        self._error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def recording(self):
+        return self.request is not None
+
+    def start(self):
+        """
+        Send the request and start the writer thread. The output file is
+        created on arrival of the first transfer, which determines the
+        layout of the datasets.
+
+        """
+        if self.recording:
+            raise RuntimeError('The recorder is already started.')
+        self.request = self.client.request(
+            self.parameters, self.trigger, self.every, self.timeout)
+        if self.request.buffer_size == 0:
+            self.request.abort()
+            self.request = None
+            raise TypeError('String parameters cannot be recorded.')
+        self._buffers = None
+        self._free = queue.Queue()
+        self._pending = queue.Queue()
+        self._current = None
+        self._count = 0
+        self._error = None
+
+    def _init_buffers(self, values):
+        entries = read_all_params()
+        dtypes = [_.dtype for _ in values]
+        shapes = [full_shape(n, v.shape[1:], entries)
+                  for n, v in zip(self.parameters, values)]
+        # the parameters whose values are restricted to an upper bound
+        self._bounded = []
+        for i, (name, shape) in enumerate(zip(self.parameters, shapes)):
+            entry = get_entry(name, entries)
+            if len(shape) > 0 and entry is not None and \
+               entry.ubound is not None:
+                self._bounded.append(i)
+        bound_names = [self.parameters[_] + '_bound' for _ in self._bounded]
+        attrs = {'parameters': ','.join(self.parameters),
+                 'trigger': str(self.trigger), 'every': self.every,
+                 'start': time.time()}
+        cls = _ZarrWriter if self.filename.rstrip('/').endswith('.zarr') \
+              else _HDF5Writer
+        self._writer = cls(
+            self.filename, self.parameters + ['timestamp'] + bound_names,
+            dtypes + [np.dtype(float)] + [np.dtype(np.int32)] *
+            len(bound_names), shapes + [()] * (1 + len(bound_names)),
+            self.chunk_size, self.compression, attrs)
+        self._buffers = [
+            [np.zeros((self.chunk_size,) + shape, dtype)
+             for dtype, shape in zip(dtypes, shapes)] +
+            [np.empty(self.chunk_size)] +
+            [np.empty(self.chunk_size, np.int32) for _ in bound_names]
+            for _ in range(self.nbuffers)]
+        for i in range(self.nbuffers):
+            self._free.put(i)
+        self._thread = threading.Thread(target=self._run,
+                                        name='recorder-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._pending.get()
+            if item is None:
+                break
+            i, n = item
+            if self._error is None:
+                time0 = time.time()
+                try:
+                    self._writer.append([_[:n] for _ in self._buffers[i]])
+                except Exception as exc:
+                    self._error = exc
+                self.stats['write_time'] += time.time() - time0
+                self.stats['chunks'] += 1
+            self._free.put(i)
+
+    def _submit(self):
+        """ Queue the current chunk buffer to be written. """
+        self._pending.put((self._current, self._count))
+        self.stats['max_pending'] = max(self.stats['max_pending'],
+                                        self._pending.qsize())
+        self._current = None
+        self._count = 0
+
+    def _store(self, values, timestamps):
+        n = len(timestamps)
+        start = 0
+        while start < n:
+            if self._error is not None:
+                raise self._error
+            if self._current is None:
+                try:
+                    self._current = self._free.get_nowait()
+                except queue.Empty:
+                    time0 = time.time()
+                    self._current = self._free.get()
+                    self.stats['waits'] += 1
+                    self.stats['wait_time'] += time.time() - time0
+            nstore = min(n - start, self.chunk_size - self._count)
+            buffers = self._buffers[self._current]
+            slice_ = slice(self._count, self._count + nstore)
+            for buf, value in zip(buffers, values):
+                if value.ndim > 1 and value.shape[-1] < buf.shape[-1]:
+                    bound = value.shape[-1]
+                    buf[slice_, ..., :bound] = value[start:start+nstore]
+                    buf[slice_, ..., bound:] = 0
+                else:
+                    buf[slice_] = value[start:start+nstore]
+            buffers[len(values)][slice_] = timestamps[start:start+nstore]
+            for buf, i in zip(buffers[len(values)+1:], self._bounded):
+                buf[slice_] = values[i].shape[-1]
+            self._count += nstore
+            start += nstore
+            if self._count == self.chunk_size:
+                self._submit()
+        self.stats['transfers'] += n
+
+    def record(self, duration=None, count=None):
+        """
+        Record the transfers of the request until the duration in seconds
+        has elapsed or count transfers have been recorded, or forever.
+
+        """
+        if not self.recording:
+            raise RuntimeError('The recorder is not started.')
+        request = self.request
+        time0 = time.time()
+        ntransfers = 0
+        while (duration is None or time.time() - time0 < duration) and \
+              (count is None or ntransfers < count):
+            n = min(max(request.available, 1), request.buffer_size)
+            if count is not None:
+                n = min(n, count - ntransfers)
+            values, timestamps = request.next_batch(n, True)
+            if not isinstance(values, tuple):
+                values = (values,)
+            if self._buffers is None:
+                self._init_buffers(values)
+            self._store(values, timestamps)
+            ntransfers += n
+        self.stats['overflows'] = request.overflows
+
+    def stop(self):
+        """
+        Abort the request, write the buffered transfers and close the output
+        file. An error raised by the writer thread is raised again.
+
+        """
+        if not self.recording:
+            return
+        try:
+            self.stats['overflows'] = self.request.overflows
+            self.request.abort()
+        finally:
+            self.request = None
+            if self._thread is not None:
+                if self._current is not None and self._count > 0:
+                    self._submit()
+                self._pending.put(None)
+                self._thread.join()
+                self._thread = None
+                self._writer.close()
+                self._writer = None
+                self._buffers = None
+        if self._error is not None:
+            raise self._error
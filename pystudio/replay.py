@@ -0,0 +1,406 @@
+"""
+Replay of recorded sessions through the DispatcherAccess interface.
+
+The ReplayDispatcherAccess client has the request and command interface of
+DispatcherAccess (see pystudio.fake), but the parameters are updated from the
+HDF5 files or Zarr stores written by the Recorder, or from the HK backup
+sessions of the dispatcher (see pystudio.hkbackup), instead of a dispatcher.
+The transfers of the recordings are merged by arrival time and replayed at a
+selectable speed: in real time, N times faster or slower, or as fast as
+possible. In the latter case, the replay only proceeds while a persistent
+request is sent and waits for the consumers whose buffers are full, so that
+no transfer is lost and the throughput of an analysis pipeline can be
+benchmarked and profiled offline. To send several requests before the replay
+starts, the client can be created paused.
+
+When a recorded transfer is replayed, its parameters are set in the
+parameter table of the client, and the requests watching them are triggered.
+The timestamps of the transfers are the recorded arrival times, and the
+periods of the timed requests are counted in replay time. The commands are
+recorded in the commands attribute but have no effect. At the end of the
+replay, the transfers still buffered by a request are returned, possibly as
+a partial batch, after which the request raises an EOFError exception.
+
+Each value saved in an HK backup session is replayed as a transfer of the
+parameter of the same name, with the shape (valuesPerX,) of the sensor, or
+as a scalar if the sensor has one value per time. The sensors which are not
+saved with their times are not replayed.
+
+The h5py or zarr package is required, depending on the format.
+
+Examples
+--------
+>>> from pystudio.replay import ReplayDispatcherAccess
+>>> client = ReplayDispatcherAccess('session.h5', speed=None)
+>>> req = client.request('QUBIC_AllPixelsScientificData')
+>>> while True:
+...     try:
+...         data = req.next_batch(100)
+...     except EOFError:
+...         break
+
+"""
+from __future__ import division, print_function
+import collections
+import heapq
+import os
+import threading
+import time
+import numpy as np
+from .fake import FakeDispatcherAccess, FakeRequest
+
+__all__ = ['ReplayDispatcherAccess']
+
+BLOCK_SIZE = 1000  # transfers read at once from a recording
+EXTENSIONS = ('.h5', '.hdf5', '.zarr')
+
+
+class _Recording(object):
+    """ Transfers of a recording, read by blocks. """
+    def __init__(self, filename):
+        self.filename = filename
+        if filename.rstrip('/').endswith('.zarr'):
+            import zarr
+            self.file = zarr.open_group(filename, mode='r')
+        else:
+            import h5py
+            self.file = h5py.File(filename, 'r')
+        parameters = self.file.attrs.get('parameters')
+        if parameters is None:
+            raise ValueError(
+                "The file '{0}' is not a recording of pystudio.Recorder."
+                .format(filename))
+        self.names = str(parameters).split(',')
+        self.datasets = [self.file[_] for _ in self.names]
+        self.timestamps = np.asarray(self.file['timestamp'][:], float)
+        self.initial = dict((n, np.zeros(d.shape[1:], d.dtype))
+                            for n, d in zip(self.names, self.datasets))
+        self._block = None
+        self._start = 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _read(self, start, stop):
+        return [_[start:stop] for _ in self.datasets]
+
+    def row(self, i):
+        """ Return the recorded values of the i-th transfer. """
+        if self._block is None or not \
+           self._start <= i < self._start + len(self._block[0]):
+            self._start = i - i % BLOCK_SIZE
+            self._block = self._read(self._start, self._start + BLOCK_SIZE)
+        return [_[i - self._start] for _ in self._block]
+
+    def close(self):
+        if hasattr(self.file, 'close'):
+            self.file.close()
+
+
+class _HKRecording(_Recording):
+    """ Values of a sensor of an HK backup session, read by blocks. """
+    def __init__(self, filename, sensor):
+        self.filename = filename
+        self.sensor = sensor
+        self.names = [sensor.name]
+        self.timestamps = sensor.times
+        shape = (sensor.size,) if sensor.size > 1 else ()
+        self.initial = {sensor.name: np.zeros(shape, sensor.dtype)}
+        self._block = None
+        self._start = 0
+
+    def _read(self, start, stop):
+        values = self.sensor.slice(start, min(stop, len(self.sensor)))
+        if self.sensor.size == 1:
+            values = values[:, 0]
+        return [values]
+
+    def close(self):
+        # the files are unmapped when the sensor is deleted
+        pass
+
+
+def _open_recordings(filename):
+    """
+    Return the recordings of a file written by the Recorder, or of each
+    sensor of an HK backup session.
+
+    """
+    if os.path.isdir(filename) and not filename.rstrip('/').endswith(
+            '.zarr'):
+        from .hkbackup import HKBackup
+        backup = HKBackup(filename)
+        return [_HKRecording(filename, backup[_]) for _ in backup.names
+                if len(backup[_]) > 0]
+    return [_Recording(filename)]
+
+
+def _find_recordings(filenames):
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    out = []
+    for filename in filenames:
+        if os.path.isdir(filename) and not filename.rstrip('/').endswith(
+                '.zarr'):
+            recordings = sorted(os.path.join(filename, _)
+                                for _ in os.listdir(filename)
+                                if _.endswith(EXTENSIONS))
+            # a directory without recordings is an HK backup session
+            out += recordings if len(recordings) > 0 else [filename]
+        else:
+            out.append(filename)
+    if len(out) == 0:
+        raise ValueError('No recording is specified.')
+    return out
+
+
+class ReplayRequest(FakeRequest):
+    """
+    Request to the replay client. The consumption of the transfers wakes the
+    replay up. At the end of the replay, the remaining transfers are returned
+    by the next wait, even if fewer than requested, and the following waits
+    raise an EOFError exception.
+
+    """
+    def _pop(self, n):
+        transfers = FakeRequest._pop(self, n)
+        with self._condition:
+            self.client._wakeup.notify()
+        return transfers
+
+    def abort(self):
+        """
+        Abort request.
+
+        """
+        with self._condition:
+            FakeRequest.abort(self)
+            self.client._wakeup.notify()
+
+    def _wait_available(self, n):
+        deadline = time.time() + self.timeout / 1000
+        with self._condition:
+            while len(self._buffer) < n:
+                if self.client._finished:
+                    if len(self._buffer) == 0:
+                        raise EOFError('The replay is finished.')
+                    return len(self._buffer)
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise self._timed_out()
+                self._nwaits += 1
+                self._condition.wait(remaining)
+        return n
+
+
+class ReplayDispatcherAccess(FakeDispatcherAccess):
+    """
+    Client replaying recorded sessions, with the interface of
+    DispatcherAccess.
+
+    Parameters
+    ----------
+    filenames : str or sequence of str
+        The recordings written by the Recorder (HDF5 files or Zarr stores),
+        directories containing them, or HK backup session directories. Their
+        transfers are merged by arrival time.
+    speed : float, optional
+        The replay speed, relative to real time. If None, the transfers are
+        replayed as fast as the consumers read them, without loss.
+    start : float, optional
+        The arrival time of the first replayed transfer, in seconds since
+        the Epoch.
+    stop : float, optional
+        The arrival time (excluded) of the last replayed transfer.
+    loop : boolean, optional
+        If true, the recordings are replayed again at their end, their
+        timestamps being shifted so that they remain increasing.
+    paused : boolean, optional
+        If true, the replay starts when the resume method is called.
+
+    """
+    _request_class = ReplayRequest
+
+    def __init__(self, filenames, speed=1., start=None, stop=None,
+                 loop=False, paused=False):
+        if speed is not None and speed <= 0:
+            raise ValueError('The replay speed must be positive.')
+        self.speed = speed
+        self.loop = loop
+        self.filenames = _find_recordings(filenames)
+        self._recordings = [_ for f in self.filenames
+                            for _ in _open_recordings(f)]
+        times = np.concatenate([_.timestamps for _ in self._recordings])
+        sources = np.concatenate([np.full(len(r), i, np.intp)
+                                  for i, r in enumerate(self._recordings)])
+        rows = np.concatenate([np.arange(len(_)) for _ in self._recordings])
+        mask = np.ones(len(times), bool)
+        if start is not None:
+            mask &= times >= start
+        if stop is not None:
+            mask &= times < stop
+        order = np.flatnonzero(mask)
+        order = order[np.argsort(times[order], kind='mergesort')]
+        self._times = times[order]
+        self._sources = sources[order]
+        self._rows = rows[order]
+        if len(self._times) > 1:
+            self._duration = self._times[-1] - self._times[0] + \
+                np.median(np.diff(self._times))
+        else:
+            self._duration = 1.
+        self._values_ = {}
+        for recording in self._recordings:
+            self._values_.update(recording.initial)
+        self._next = 0
+        self._offset = 0.
+        self._paused = paused
+        self._finished = len(self._times) == 0
+        self._clock = self._times[0] if len(self._times) > 0 else 0.
+        FakeDispatcherAccess.__init__(self, ack_delay=0)
+        with self._lock:
+            self._watchers = collections.defaultdict(list)
+
+    @property
+    def recorded(self):
+        """ Names of the recorded parameters. """
+        return sorted(self._values_)
+
+    @property
+    def position(self):
+        """ Arrival time of the last replayed transfer. """
+        return self._clock
+
+    @property
+    def ntransfers(self):
+        """ Number of replayed transfers. """
+        return self._next
+
+    @property
+    def finished(self):
+        """ True if all the transfers have been replayed. """
+        return self._finished
+
+    def pause(self):
+        """ Suspend the replay. """
+        with self._lock:
+            self._paused = True
+
+    def resume(self):
+        """ Resume the replay from the last replayed transfer. """
+        with self._lock:
+            self._paused = False
+            self._wall0 = time.time()
+            self._time0 = self._clock
+            self._wakeup.notify()
+
+    def close(self):
+        """ Stop the replay and close the recordings. """
+        FakeDispatcherAccess.close(self)
+        for recording in self._recordings:
+            recording.close()
+
+    def _start(self):
+        self._wall0 = time.time()
+        self._time0 = self._clock
+        self._thread = threading.Thread(target=self._run, name='replay')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _request(self, parameters, trigger, every, timeout, buffer_size,
+                 persistent):
+        if isinstance(parameters, str):
+            parameters = [_.strip() for _ in parameters.split(',')]
+        names = list(parameters)
+        if isinstance(trigger, str):
+            names.append(trigger)
+        for name in names:
+            if isinstance(name, str) and name in self.parameters and \
+               name not in self._values_:
+                raise ValueError(
+                    "The parameter '{0}' is not recorded.".format(name))
+        with self._lock:
+            request = FakeDispatcherAccess._request(
+                self, parameters, trigger, every, timeout, buffer_size,
+                persistent)
+            self._wakeup.notify()
+        return request
+
+    def _group(self, name):
+        return name
+
+    def _value(self, param):
+        return self._values_[param.name]
+
+    def _send(self, connection, name, args):
+        with self._lock:
+            self.commands.append((name, args))
+
+    def _schedule(self, callback, delay, repeat=True, request=None):
+        # called with the lock acquired, the delay is counted in replay time
+        task = (self._clock + delay, next(self._sequence), callback,
+                delay if repeat else None, request)
+        heapq.heappush(self._tasks, task)
+        self._wakeup.notify()
+
+    def _blocked(self):
+        """ Return True if a persistent request has a full buffer. """
+        return any(_.persistent and len(_._buffer) == _._buffer.maxlen
+                   for _ in self._requests.values())
+
+    def _replay(self):
+        """ Replay the next transfer. """
+        i = self._next
+        recording = self._recordings[self._sources[i]]
+        timestamp = self._times[i] + self._offset
+        self._values_.update(zip(recording.names,
+                                 recording.row(int(self._rows[i]))))
+        self._clock = timestamp
+        self._next += 1
+        for name in recording.names:
+            for request in list(self._watchers.get(name, ())):
+                request._push(timestamp)
+
+    def _finish(self):
+        self._finished = True
+        for request in list(self._requests.values()):
+            request._condition.notify_all()
+
+    def _run(self):
+        with self._wakeup:
+            while not self._stopped:
+                if self._finished or self._paused or self.speed is None and \
+                   not any(_.persistent for _ in self._requests.values()):
+                    self._wakeup.wait()
+                    continue
+                if self._next == len(self._times):
+                    if not self.loop:
+                        self._finish()
+                        continue
+                    self._next = 0
+                    self._offset += self._duration
+                due = self._times[self._next] + self._offset
+                task = len(self._tasks) > 0 and self._tasks[0][0] <= due
+                if task:
+                    due = self._tasks[0][0]
+                if self.speed is not None:
+                    wait = self._wall0 + (due - self._time0) / self.speed - \
+                           time.time()
+                    if wait > 0:
+                        self._wakeup.wait(wait)
+                        continue
+                elif self._blocked():
+                    self._wakeup.wait()
+                    continue
+                if not task:
+                    self._replay()
+                    continue
+                due, _, callback, period, request = heapq.heappop(self._tasks)
+                if request is not None and not request._active:
+                    continue
+                self._clock = due
+                callback(due)
+                if period is not None:
+                    heapq.heappush(self._tasks, (
+                        due + period, next(self._sequence), callback, period,
+                        request))
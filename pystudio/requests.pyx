@@ -1,34 +1,169 @@
+from libc.stdlib cimport calloc, free, malloc
+from libc.string cimport memcpy
 from libcpp cimport bool
 from libdispatcheraccess cimport TDispatcherAccess
-from libqt cimport processEvents, QList, QMutex, QMutexLocker, quint8, quint16, quint32
+from libhelpers cimport RequestState, wait_request, wake_request
+from libqt cimport (
+    processEvents, QList, QMutexLocker, quint8, quint16, quint32)
+from posix.time cimport clock_gettime, timespec, CLOCK_REALTIME
+cimport numpy as np
+import asyncio
+import numpy as np
 import time
+import weakref
 
-cdef QMutex _mutex
-cdef bool *_requestsArrived = 256 * [False]
 MAX_UINT16 = 65535
 
+# default number of transfers buffered by a persistent request
+RING_BUFFER_SIZE = 100
+# upper limit in bytes of the default ring buffer of a persistent request
+RING_BUFFER_MAXSIZE = 64 * 1024**2
+
+
+cdef struct RingBuffer:
+    # Snapshots of the requested parameters, taken in the request slot
+    int nparams
+    void **sources          # addresses of the parameter values
+    void **bounds           # addresses of the parameter upper bounds or NULL
+    int *boundTypes         # 0: quint8, 1: quint16
+    size_t *offsets         # offsets of the parameters in a transfer
+    size_t frameSize        # size in bytes of a transfer
+    int capacity            # number of transfers
+    char *data
+    int *frameBounds        # upper bounds at arrival time
+    double *timestamps      # arrival times
+    unsigned long long nwritten
+    unsigned long long nread
+    unsigned long long noverflow
+
+cdef void ring_push(RingBuffer *ring) noexcept nogil:
+    """ Copy the requested parameters into the ring buffer. """
+    cdef int i, slot
+    cdef char *frame
+    cdef timespec ts
+    if ring.nwritten - ring.nread == <unsigned long long>ring.capacity:
+        # the oldest transfer is dropped
+        ring.nread += 1
+        ring.noverflow += 1
+    slot = ring.nwritten % ring.capacity
+    frame = ring.data + slot * ring.frameSize
+    for i in range(ring.nparams):
+        memcpy(frame + ring.offsets[i], ring.sources[i],
+               ring.offsets[i+1] - ring.offsets[i])
+        if ring.bounds[i] == NULL:
+            ring.frameBounds[slot * ring.nparams + i] = -1
+        elif ring.boundTypes[i] == 0:
+            ring.frameBounds[slot * ring.nparams + i] = (
+                <quint8*>ring.bounds[i])[0]
+        else:
+            ring.frameBounds[slot * ring.nparams + i] = (
+                <quint16*>ring.bounds[i])[0]
+    clock_gettime(CLOCK_REALTIME, &ts)
+    ring.timestamps[slot] = ts.tv_sec + 1e-9 * ts.tv_nsec
+    ring.nwritten += 1
+
+
+cdef void ring_free(RingBuffer *ring) noexcept nogil:
+    if ring == NULL:
+        return
+    free(ring.sources)
+    free(ring.bounds)
+    free(ring.boundTypes)
+    free(ring.offsets)
+    free(ring.data)
+    free(ring.frameBounds)
+    free(ring.timestamps)
+    free(ring)
+
 
 class TimeoutError(Exception):
     pass
 
 
 cdef class DispatcherAccess
+cdef class AbstractRequest
+
+_event_pumps = weakref.WeakKeyDictionary()
+
+
+class _EventPump(object):
+    """
+    Qt event pump shared by all the requests awaited in an asyncio loop.
+
+    A single callback, scheduled in the loop as long as some requests are
+    awaited, processes the Qt events and resolves the futures of the requests
+    that have arrived or timed out.
+
+    """
+    interval = 0.001  # s
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.waiters = []
+        self.handle = None
 
+    @classmethod
+    def get(cls, loop):
+        try:
+            return _event_pumps[loop]
+        except KeyError:
+            pump = cls(loop)
+            _event_pumps[loop] = pump
+            return pump
 
-cdef void requestArrived(int num) nogil:
-    cdef QMutexLocker *locker = new QMutexLocker(&_mutex)
-    _requestsArrived[num] = True
+    def wait(self, AbstractRequest request not None):
+        future = self.loop.create_future()
+        deadline = self.loop.time() + request.timeout / 1000
+        self.waiters.append((request, future, deadline))
+        if self.handle is None:
+            self.handle = self.loop.call_soon(self.run)
+        return future
+
+    def run(self):
+        self.handle = None
+        processEvents()
+        now = self.loop.time()
+        waiters = []
+        for request, future, deadline in self.waiters:
+            if future.done():
+                # the awaiting task has been cancelled
+                continue
+            if request.test():
+                future.set_result(None)
+            elif now > deadline:
+                future.set_exception(request._timed_out())
+            else:
+                waiters.append((request, future, deadline))
+        self.waiters = waiters
+        if len(waiters) > 0:
+            self.handle = self.loop.call_later(self.interval, self.run)
+
+
+cdef void requestArrived(RequestState *state, int num) noexcept nogil:
+    """
+    Request slot of a client: copy the requested parameters into the ring
+    buffer of the request and signal its arrival to the waiting threads.
+
+    """
+    cdef QMutexLocker *locker = new QMutexLocker(&state.mutex)
+    if state.rings[num] != NULL:
+        ring_push(<RingBuffer*>state.rings[num])
+    state.arrived[num] = True
+    wake_request(&state.condition)
     del locker
 
 
 cdef int convert_requested_parameters(DispatcherAccess da, object parameters,
                                       QList[quint32] *meta_ids,
-                                      QList[quint32] *out) except 1:
+                                      QList[quint32] *out,
+                                      list params) except 1:
     cdef quint32 paramId
+    table = da.parameters
     for parameter in parameters:
         if not isinstance(parameter, str):
             raise TypeError('Invalid parameter type.')
-        param = da.parameters[parameter.strip()]
+        param = table[parameter.strip()]
+        params.append(param)
         meta_ids.append(<quint32>param.id)
         if param.id & cMETA_FLAG:
             paramId = param.id & ~cMETA_FLAG
@@ -40,21 +175,240 @@ cdef int convert_requested_parameters(DispatcherAccess da, object parameters,
     return 0
 
 
+# the request must reach its client in __dealloc__, even when it is collected
+# in a reference cycle through the multiplexer of the client
+@cython.no_gc_clear
 cdef class AbstractRequest:
     cdef public int id
     cdef public int timeout
     cdef DispatcherAccess da
+    cdef RequestState *state  # the arrival state of the client
     cdef QList[quint32] paramMetaIds
+    cdef list params  # the requested Parameter instances
     cdef str error_msg
+    cdef RingBuffer *ring
+    cdef list dtypes
+    cdef list shapes
+    cdef str _label  # the label of the request metrics
+    cdef unsigned long long _nwaits  # waits since the last recorded metrics
+    cdef unsigned long long _noverflow_seen
 
     def __cinit__(self, DispatcherAccess da not None, object parameters,
                   int timeout, *args):
         self.da = da
+        self.state = da._state
         self.timeout = timeout
+        self.params = []
+        self.id = -1
 
     def __dealloc__(self):
-        if self.id >= 0:
-            self.da._da.disableOneRequestedParameters(<quint8>self.id)
+        if self.da is not None:
+            if self.id >= 0:
+                self.da._da.disableOneRequestedParameters(<quint8>self.id)
+            self._detach_ring()
+        ring_free(self.ring)
+
+    cdef int _init_ring(self, object buffer_size, int default_size) except -1:
+        """
+        Allocate the ring buffer in which the requested parameters are copied
+        on arrival. Requests including string parameters are not buffered.
+        If not specified, the ring buffer size is default_size, within the
+        limit of RING_BUFFER_MAXSIZE bytes.
+
+        """
+        cdef Parameter param
+        cdef int i
+        cdef int nparams = self.paramMetaIds.count()
+        cdef size_t frameSize = 0
+        cdef RingBuffer *ring
+        if buffer_size is not None and buffer_size <= 0:
+            return 0
+        params = self.params
+        if any(isinstance(_, (ParameterString, ParameterUnhandled))
+               for _ in params):
+            if buffer_size is not None:
+                raise TypeError('String parameters cannot be buffered.')
+            return 0
+        self.dtypes = [_.value.dtype for _ in params]
+        self.shapes = [(<Parameter>_).full_shape() for _ in params]
+        sizes = [int(np.prod(shape)) * dtype.itemsize
+                 for shape, dtype in zip(self.shapes, self.dtypes)]
+        frameSize = sum(sizes)
+        if buffer_size is None:
+            # the frames of empty parameters only hold their arrival time
+            buffer_size = max(1, min(
+                default_size, RING_BUFFER_MAXSIZE // max(frameSize, 1)))
+        ring = <RingBuffer*>calloc(1, sizeof(RingBuffer))
+        if ring == NULL:
+            raise MemoryError()
+        self.ring = ring
+        ring.nparams = nparams
+        ring.frameSize = frameSize
+        ring.capacity = buffer_size
+        ring.sources = <void**>malloc(nparams * sizeof(void*))
+        ring.bounds = <void**>malloc(nparams * sizeof(void*))
+        ring.boundTypes = <int*>malloc(nparams * sizeof(int))
+        ring.offsets = <size_t*>malloc((nparams + 1) * sizeof(size_t))
+        ring.data = <char*>malloc(max(ring.capacity * frameSize, 1))
+        ring.frameBounds = <int*>malloc(
+            max(ring.capacity * nparams * sizeof(int), 1))
+        ring.timestamps = <double*>malloc(ring.capacity * sizeof(double))
+        if (ring.sources == NULL or ring.bounds == NULL or
+            ring.boundTypes == NULL or ring.offsets == NULL or
+            ring.data == NULL or ring.frameBounds == NULL or
+            ring.timestamps == NULL):
+            raise MemoryError()
+        ring.offsets[0] = 0
+        for i, param in enumerate(params):
+            ring.sources[i] = param._ptr
+            ring.bounds[i] = param._ptr_bound if param.ubound >= 0 else NULL
+            ring.boundTypes[i] = param.ubound
+            ring.offsets[i+1] = ring.offsets[i] + sizes[i]
+        return 0
+
+    cdef void _detach_ring(self):
+        """ Stop the copy of the arrived parameters into the ring buffer. """
+        cdef QMutexLocker *locker
+        if self.ring == NULL or self.id < 0:
+            return
+        locker = new QMutexLocker(&self.state.mutex)
+        if self.state.rings[self.id] == self.ring:
+            self.state.rings[self.id] = NULL
+        del locker
+
+    cdef int _move(self, list out, double[::1] timestamps,
+                   int[:, ::1] bounds, Py_ssize_t start, int n) except -1:
+        """
+        Move the n oldest transfers from the ring buffer into the C-contiguous
+        arrays out[i][start:start+n], and their arrival times and upper bounds
+        into timestamps[start:start+n] and bounds[start:start+n].
+
+        """
+        cdef RingBuffer *ring = self.ring
+        cdef int i, k, slot
+        cdef int nparams = ring.nparams
+        cdef size_t size
+        cdef unsigned char[::1] out_
+        cdef QMutexLocker *locker
+        # the byte views are built before locking the client mutex, which is
+        # also locked by the request slot of the kernel thread
+        views = [_.reshape(-1).view(np.uint8) for _ in out]
+        locker = new QMutexLocker(&self.state.mutex)
+        try:
+            if ring.nwritten - ring.nread < <unsigned long long>n:
+                raise RuntimeError('Not enough buffered transfers.')
+            for i in range(nparams):
+                out_ = views[i]
+                size = ring.offsets[i+1] - ring.offsets[i]
+                for k in range(n):
+                    slot = (ring.nread + k) % ring.capacity
+                    memcpy(&out_[(start + k) * size],
+                           ring.data + slot * ring.frameSize +
+                           ring.offsets[i], size)
+                    if bounds is not None:
+                        bounds[start + k, i] = ring.frameBounds[
+                            slot * nparams + i]
+            for k in range(n):
+                slot = (ring.nread + k) % ring.capacity
+                timestamps[start + k] = ring.timestamps[slot]
+            ring.nread += n
+        finally:
+            del locker
+        return 0
+
+    cdef str _metrics_label(self):
+        if self._label is None:
+            self._label = ','.join(_.name for _ in self.params)
+        return self._label
+
+    cdef int _record(self, object timestamps, Py_ssize_t n,
+                     size_t nbytes) except -1:
+        """
+        Record the metrics of the consumption of n transfers, which arrived at
+        the given times, if the metrics of the client are enabled. This is the
+        only cost of the metrics in the hot path when they are disabled.
+
+        """
+        cdef unsigned long long overflows = 0
+        metrics = self.da._metrics
+        if metrics is None:
+            self._nwaits = 0
+            return 0
+        if self.ring != NULL:
+            overflows = self.ring.noverflow - self._noverflow_seen
+            self._noverflow_seen = self.ring.noverflow
+        latencies = None
+        if timestamps is not None:
+            latencies = time.time() - timestamps
+        metrics.record(self._metrics_label(), latencies, n, nbytes,
+                       self._nwaits, 0, overflows, self.da._overlaps())
+        self._nwaits = 0
+        return 0
+
+    cdef object _pop(self, int n, bool squeeze):
+        """
+        Remove the n oldest transfers from the ring buffer and return them
+        as arrays of shape (n, ...), along with their arrival times.
+
+        """
+        cdef int i
+        cdef int nparams = self.ring.nparams
+        out = [np.empty((n,) + shape, dtype)
+               for shape, dtype in zip(self.shapes, self.dtypes)]
+        bounds = np.empty((n, nparams), np.intc)
+        timestamps = np.empty(n)
+        self._move(out, timestamps, bounds, 0, n)
+
+        # the transfers are restricted to the smallest upper bound
+        for i in range(nparams):
+            if bounds[0, i] < 0 or len(self.shapes[i]) == 0:
+                continue
+            bound = max(0, min(self.shapes[i][-1], bounds[:, i].min()))
+            out[i] = out[i][..., :bound]
+        self._record(timestamps, n, n * self.ring.frameSize)
+        if squeeze:
+            out = [_[0] for _ in out]
+            timestamps = timestamps[0]
+        if len(out) == 1:
+            return out[0], timestamps
+        return tuple(out), timestamps
+
+    property buffer_size:
+        """ Number of transfers that can be held in the ring buffer. """
+        def __get__(self):
+            if self.ring == NULL:
+                return 0
+            return self.ring.capacity
+
+    property available:
+        """ Number of buffered transfers that have not been read yet. """
+        def __get__(self):
+            cdef QMutexLocker *locker
+            cdef unsigned long long out
+            if self.ring == NULL:
+                return 0
+            locker = new QMutexLocker(&self.state.mutex)
+            out = self.ring.nwritten - self.ring.nread
+            del locker
+            return out
+
+    property received:
+        """ Number of transfers copied into the ring buffer. """
+        def __get__(self):
+            if self.ring == NULL:
+                return 0
+            return self.ring.nwritten
+
+    property overflows:
+        """
+        Number of transfers dropped because the ring buffer was full when they
+        arrived.
+
+        """
+        def __get__(self):
+            if self.ring == NULL:
+                return 0
+            return self.ring.noverflow
 
     def _check(self, bool isValid, str watched=None):
         if self.id < 0:
@@ -75,41 +429,134 @@ cdef class AbstractRequest:
 
         """
         self.da._da.disableOneRequestedParameters(<quint8>self.id)
+        self._detach_ring()
 
     def next(self):
         """
         Wait until request completion and return the requested parameters.
 
-        A copy of the requested parameter values is returned. Here we precisely
-        do what TDispatcherKernelScriptEngine's ValueForId does, in the sense
-        that there is no guarantee that the returned parameter value is what
-        the dispatcher transferred when it sent a "request arrived" signal,
-        because the unprotected buffer held by TParametersTable may have been
-        overwritten in the meantime by the following transfers, in the case of
-        persistent or concurrent requests.
-        For the same reason, there is also no guarantee that the parameter
-        values returned in the output tuple do originate from the same
-        transfer.
+        The requested parameters are copied into the ring buffer of the
+        request by the request slot, when the dispatcher sends the "request
+        arrived" signal. The returned values are those of the oldest transfer
+        that has not been read yet, so that the values in the output tuple
+        originate from the same transfer and no transfer is lost, unless the
+        ring buffer overflows (see the overflows attribute).
+
+        Requests including string parameters are not buffered. In this case,
+        we precisely do what TDispatcherKernelScriptEngine's ValueForId does,
+        in the sense that there is no guarantee that the returned parameter
+        value is what the dispatcher transferred when it sent a "request
+        arrived" signal, because the unprotected buffer held by
+        TParametersTable may have been overwritten in the meantime by the
+        following transfers, in the case of persistent or concurrent requests.
         At least, the copy which is performed insures that the returned values
         won't be modified between two calls to this method.
 
         """
+        if self.ring == NULL:
+            self.wait()
+            return self._values()
+        self._wait_available(1)
+        return self._pop(1, True)[0]
+
+    def next_batch(self, int n, bool timestamps=False):
+        """
+        Wait until n transfers are buffered and return them.
+
+        Parameters
+        ----------
+        n : int
+            The number of transfers.
+        timestamps : boolean, optional
+            If true, the arrival times of the transfers (in seconds since the
+            Epoch) are also returned.
+
+        Returns
+        -------
+        The arrays of shape (n, ...) of the requested parameters, the
+        transfers being stacked along the first dimension. For the parameters
+        with an upper bound, the last dimension is restricted to the smallest
+        upper bound of the n transfers.
+
+        """
+        if self.ring == NULL:
+            raise RuntimeError('The request is not buffered.')
+        if n < 1 or n > self.ring.capacity:
+            raise ValueError(
+                'The number of transfers must be in the range [1, {0}].'.
+                format(self.ring.capacity))
+        self._wait_available(n)
+        out, timestamps_ = self._pop(n, False)
+        if timestamps:
+            return out, timestamps_
+        return out
+
+    def _wait_available(self, int n):
+        while self.available < n:
+            self.wait()
+
+    async def anext(self):
+        """
+        Coroutine version of the next method.
+
+        The request is awaited through the Qt event pump of the running asyncio
+        loop, so that many requests can be awaited concurrently in a single
+        thread.
+
+        """
+        pump = _EventPump.get(asyncio.get_running_loop())
+        if self.ring == NULL:
+            self._nwaits += 1
+            await pump.wait(self)
+            return self._values()
+        while self.available < 1:
+            self._nwaits += 1
+            await pump.wait(self)
+        return self._pop(1, True)[0]
+
+    def _update_timeline(self, timeline):
+        """
+        Wait until the request arrives and append to the timeline the samples
+        of the requested parameter that have been added since its last update.
+        The request must not be buffered: the samples are copied from the
+        parameter table, as in the case of the string parameters.
+
+        """
+        cdef Parameter param = self.params[0]
         self.wait()
-        out = tuple(self.da.parameters[self.paramMetaIds.at(i)].value.copy()
-                    for i in range(self.paramMetaIds.count()))
+        if param._array is None:
+            param._array = param._get_array()
+        out = timeline.update(param._array, param.get_bound())
+        self._record(None, 1, out.nbytes)
+        return out
+
+    def _values(self):
+        out = tuple(_.value.copy() for _ in self.params)
+        if self.da._metrics is not None:
+            self._record(None, 1, sum(_.nbytes for _ in out))
         if len(out) == 1:
             out = out[0]
         return out
 
+    def _timed_out(self):
+        metrics = self.da._metrics
+        if metrics is not None:
+            metrics.record(self._metrics_label(),
+                           wait_iterations=self._nwaits, timeouts=1)
+            self._nwaits = 0
+        self.abort()
+        return TimeoutError(self.error_msg)
+
     def test(self):
         """
         Return True if the request has arrived.
 
         """
-        cdef QMutexLocker *locker = new QMutexLocker(&_mutex)
-        out = _requestsArrived[self.id]
+        cdef bool out
+        cdef QMutexLocker *locker = new QMutexLocker(&self.state.mutex)
+        out = self.state.arrived[self.id]
         if out:
-            _requestsArrived[self.id] = False
+            self.state.arrived[self.id] = False
         del locker
         return out
 
@@ -117,62 +564,98 @@ cdef class AbstractRequest:
         """
         Wait until request arrives.
 
+        The GIL is released and the calling thread is blocked until the request
+        slot, called in the kernel thread of the client, signals the arrival
+        of the request (the Qt events are processed meanwhile if the calling
+        thread owns the QApplication).
         On timeout, raise a TimeoutError exception.
 
         """
-        time0 = time.time()
-        while not self.test():
-            time.sleep(0.001)
-            processEvents()
-            if 1000 * (time.time() - time0) > self.timeout:
-                self.abort()
-                raise TimeoutError(self.error_msg)
+        cdef bool arrived
+        cdef int num = self.id
+        cdef int timeout = self.timeout
+        cdef RequestState *state = self.state
+        self._nwaits += 1
+        with nogil:
+            arrived = wait_request(&state.mutex, &state.condition,
+                                   &state.arrived[num], timeout)
+        if not arrived:
+            raise self._timed_out()
 
 
+@cython.no_gc_clear
 cdef class RequestOneTime(AbstractRequest):
     def __cinit__(self, DispatcherAccess da not None, object parameters,
-                  int timeout, object trigger=0):
+                  int timeout, object trigger=0, bool buffered=False):
         cdef QList[quint32] paramIds
-        convert_requested_parameters(da, parameters, &self.paramMetaIds, &paramIds)
+        convert_requested_parameters(da, parameters, &self.paramMetaIds,
+                                     &paramIds, self.params)
+        if buffered:
+            self._init_ring(None, 1)
         cdef quint32 watchedId
+        cdef quint16 delay
         cdef bool isValid = False
-        cdef QMutexLocker *locker = new QMutexLocker(&_mutex)
-        if isinstance(trigger, str):
+        cdef bool synchro = isinstance(trigger, str)
+        cdef QMutexLocker *locker
+        if synchro:
             watchedId = da.parameters[trigger].id & ~cMETA_FLAG
-            self.id = da._da.requestOneTimeSynchroParameters(paramIds, watchedId, &isValid)
-            self._check(isValid, trigger)
         else:
             trigger = max(int(trigger), 0)
             if trigger > MAX_UINT16:
                 raise ValueError('Delay cannot exceed {0} ms.'.
                                  format(MAX_UINT16))
-            self.id = da._da.requestOneTimeTimeoutParameters(paramIds, <quint16>trigger, &isValid)
+            delay = trigger
+        # no Python code is run while the client mutex is locked, so that it
+        # cannot be left locked by an exception
+        locker = new QMutexLocker(&self.state.mutex)
+        if synchro:
+            self.id = da._da.requestOneTimeSynchroParameters(
+                paramIds, watchedId, &isValid)
+        else:
+            self.id = da._da.requestOneTimeTimeoutParameters(
+                paramIds, delay, &isValid)
+        if self.id >= 0:
+            self.state.arrived[self.id] = False
+            self.state.rings[self.id] = self.ring
+        del locker
+        if synchro:
+            self._check(isValid, trigger)
+        else:
             self.timeout = max(timeout, trigger + trigger // 2)
             self._check(isValid)
-        _requestsArrived[self.id] = False
-        del locker
 
 
+@cython.no_gc_clear
 cdef class RequestPersistent(AbstractRequest):
+    """
+    Persistent request.
+
+    The request can be iterated over asynchronously:
+    >>> async for values in client.request(parameters):
+    ...     process(values)
+
+    """
     def __cinit__(self, DispatcherAccess da not None, object parameters,
-                  int timeout, object trigger, int every=1):
+                  int timeout, object trigger, int every=1,
+                  object buffer_size=None):
         cdef QList[quint32] paramIds
         convert_requested_parameters(da, parameters, &self.paramMetaIds,
-                                     &paramIds)
+                                     &paramIds, self.params)
+        self._init_ring(buffer_size, RING_BUFFER_SIZE)
         cdef quint32 watchedId
+        cdef quint16 period
         cdef bool isValid = False
-        cdef QMutexLocker *locker = new QMutexLocker(&_mutex)
+        cdef bool synchro
+        cdef QMutexLocker *locker
         if trigger is None:
             trigger = parameters[0]
-        if isinstance(trigger, str):
+        synchro = isinstance(trigger, str)
+        if synchro:
             watchedId = da.parameters[trigger].id & ~cMETA_FLAG
             if every > MAX_UINT16:
                 raise ValueError(
                     'Argument every cannot exceed {0}.'.format(MAX_UINT16))
             every = max(every, 1)
-            self.id =  da._da.requestSynchroParameters(
-                paramIds, watchedId, <quint16>every, &isValid)
-            self._check(isValid, trigger)
         else:
             if every != 1:
                 raise ValueError(
@@ -182,9 +665,106 @@ cdef class RequestPersistent(AbstractRequest):
             if trigger > MAX_UINT16:
                 raise ValueError('Period cannot exceed {0} ms.'.
                                  format(MAX_UINT16))
+            period = trigger
+        # no Python code is run while the client mutex is locked, so that it
+        # cannot be left locked by an exception
+        locker = new QMutexLocker(&self.state.mutex)
+        if synchro:
+            self.id = da._da.requestSynchroParameters(
+                paramIds, watchedId, <quint16>every, &isValid)
+        else:
             self.id = da._da.requestTimeoutParameters(
-                paramIds, <quint16>trigger, &isValid)
+                paramIds, period, &isValid)
+        if self.id >= 0:
+            self.state.arrived[self.id] = False
+            self.state.rings[self.id] = self.ring
+        del locker
+        if synchro:
+            self._check(isValid, trigger)
+        else:
             self.timeout = max(timeout, trigger + trigger // 2)
             self._check(isValid)
-        _requestsArrived[self.id] = False
-        del locker
+
+    def stream(self, int n, out=None, timestamps=None):
+        """
+        Store the next n transfers of the requested parameters in place.
+
+        The transfers are moved from the ring buffer into the output arrays as
+        they arrive, without allocating intermediate arrays, so that long
+        timelines, such as those of QUBIC_AllPixelsScientificData, can be
+        acquired with a single call. The number of transfers is not limited
+        by the ring buffer size.
+
+        Parameters
+        ----------
+        n : int
+            The number of transfers.
+        out : ndarray or sequence of ndarray, optional
+            The C-contiguous arrays of shape (n, ...) in which the transfers
+            of the requested parameters are stored. For the parameters with
+            an upper bound, the last dimension is not restricted to the upper
+            bound. If not specified, they are allocated.
+        timestamps : ndarray, optional
+            The float64 array of shape (n,) in which the arrival times of the
+            transfers (in seconds since the Epoch) are stored. If not
+            specified, it is allocated.
+
+        Returns
+        -------
+        out, timestamps
+
+        Examples
+        --------
+        >>> req = client.request('QUBIC_AllPixelsScientificData')
+        >>> timeline = np.empty((nsamples, 16, 128), np.int32)
+        >>> req.stream(nsamples, timeline)
+
+        """
+        cdef Py_ssize_t start = 0
+        cdef int nparams, navailable
+        if self.ring == NULL:
+            raise RuntimeError('The request is not buffered.')
+        if n < 0:
+            raise ValueError('Invalid number of transfers.')
+        nparams = self.ring.nparams
+        if out is None:
+            out = [np.empty((n,) + shape, dtype)
+                   for shape, dtype in zip(self.shapes, self.dtypes)]
+        elif isinstance(out, np.ndarray):
+            out = [out]
+        else:
+            out = list(out)
+        if len(out) != nparams:
+            raise ValueError(
+                'Invalid number of output arrays: {0} instead of {1}.'.
+                format(len(out), nparams))
+        for out_, shape, dtype in zip(out, self.shapes, self.dtypes):
+            if not isinstance(out_, np.ndarray) or \
+               out_.shape != (n,) + shape or out_.dtype != dtype or \
+               not out_.flags.c_contiguous:
+                raise ValueError(
+                    'The output array is not a C-contiguous array of shape {0'
+                    '} and dtype {1}.'.format((n,) + shape, dtype))
+        if timestamps is None:
+            timestamps = np.empty(n)
+        elif not isinstance(timestamps, np.ndarray) or \
+             timestamps.shape != (n,) or timestamps.dtype != np.float64:
+            raise ValueError(
+                'The timestamps are not a float64 array of shape ({0},).'.
+                format(n))
+        while start < n:
+            self._wait_available(1)
+            navailable = min(self.available, n - start)
+            self._move(out, timestamps, None, start, navailable)
+            self._record(timestamps[start:start+navailable], navailable,
+                         navailable * self.ring.frameSize)
+            start += navailable
+        if nparams == 1:
+            return out[0], timestamps
+        return tuple(out), timestamps
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.anext()
@@ -0,0 +1,446 @@
+"""
+Fan-out of live dispatcher data to the local processes.
+
+A Publisher owns the dispatcher client: it sends a persistent request and
+copies the transfers into a ring of slots held by a shared memory segment.
+The other processes of the host attach a Subscriber to the segment, by name,
+without connecting to the dispatcher. The subscribers only read the segment.
+
+Each slot is protected by a sequence lock: the sequence number of the slot of
+the k-th transfer is set to 2k + 1 before it is written and to 2k + 2 once it
+is written, so that a subscriber detects the transfers that it reads while
+they are being overwritten. The segment starts with a header, followed by the
+JSON description of the parameters and by the slots:
+    - header: magic (8 bytes), version, description size (uint32), number
+      of slots, slot size, number of written transfers, closed flag (uint64),
+    - slot: sequence number (uint64), arrival time (float64), upper bounds
+      (int32, one per parameter), values of the parameters.
+
+Examples
+--------
+In the process connected to the dispatcher:
+>>> publisher = Publisher(client, ['QUBIC_AllPixelsScientificData',
+...                                'QUBIC_Nsample'], name='qubic')
+>>> publisher.run()
+
+In the other processes:
+>>> subscriber = Subscriber('qubic')
+>>> data, nsample = subscriber.next()
+
+"""
+from __future__ import division, print_function
+import json
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from .parameters import full_shape, read_all_params
+
+__all__ = ['Publisher', 'Subscriber']
+
+DEFAULT_NAME = 'pystudio'
+DEFAULT_TIMEOUT = 5000  # ms
+CAPACITY = 1000
+POLL_INTERVAL = 0.001  # s
+MAGIC = b'PYSTUDIO'
+VERSION = 1
+ALIGNMENT = 64
+
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<u4'),
+                         ('description_size', '<u4'), ('capacity', '<u8'),
+                         ('slot_size', '<u8'), ('written', '<u8'),
+                         ('closed', '<u8')])
+
+
+def _align(size, alignment=8):
+    return (size + alignment - 1) // alignment * alignment
+
+
+def _attach(name):
+    """
+    Attach the shared memory segment of a publisher, without registering it
+    in the resource tracker, which would remove it at the exit of the
+    subscriber process.
+
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Python < 3.13: the segment is registered by its POSIX name
+        shm = shared_memory.SharedMemory(name)
+        if os.name == 'posix':
+            resource_tracker.unregister('/' + shm.name, 'shared_memory')
+        return shm
+
+
+class _Layout(object):
+    """
+    Position of the arrays of the parameters in the slots of the segment.
+
+    """
+    def __init__(self, description):
+        self.description = description
+        self.names = [_['name'] for _ in description['parameters']]
+        self.dtypes = [np.dtype(_['dtype']) for _ in description['parameters']]
+        self.shapes = [tuple(_['shape']) for _ in description['parameters']]
+        self.capacity = description['capacity']
+        nparams = len(self.names)
+        offset = _align(16 + 4 * nparams)
+        self.offsets = []
+        for dtype, shape in zip(self.dtypes, self.shapes):
+            self.offsets.append(offset)
+            offset = _align(offset + dtype.itemsize * int(np.prod(shape)))
+        self.slot_size = offset
+        self.encoded = json.dumps(description).encode('utf-8')
+        self.start = _align(HEADER_DTYPE.itemsize + len(self.encoded),
+                            ALIGNMENT)
+        self.size = self.start + self.capacity * self.slot_size
+
+    def views(self, buf):
+        """
+        Return the header, the sequence numbers, the arrival times, the
+        upper bounds and the values of the parameters, as arrays mapped on
+        the segment buffer.
+
+        """
+        capacity = self.capacity
+        slot_size = self.slot_size
+        header = np.ndarray((), HEADER_DTYPE, buf)
+        sequences = np.ndarray((capacity,), '<u8', buf, self.start,
+                               (slot_size,))
+        timestamps = np.ndarray((capacity,), '<f8', buf, self.start + 8,
+                                (slot_size,))
+        bounds = np.ndarray((capacity, len(self.names)), '<i4', buf,
+                            self.start + 16, (slot_size, 4))
+        values = []
+        for dtype, shape, offset in zip(self.dtypes, self.shapes,
+                                        self.offsets):
+            strides = tuple(dtype.itemsize * int(np.prod(shape[i+1:]))
+                            for i in range(len(shape)))
+            values.append(np.ndarray((capacity,) + shape, dtype, buf,
+                                     self.start + offset,
+                                     (slot_size,) + strides))
+        return header, sequences, timestamps, bounds, values
+
+
+class Publisher(object):
+    """
+    Publish the transfers of a persistent request in a shared memory segment.
+
+    The layout of the segment is determined by the first transfer, which is
+    awaited on creation.
+
+    Parameters
+    ----------
+    client : DispatcherAccess
+        The client through which the request is sent.
+    parameters : str or sequence of str
+        The published parameters. String parameters cannot be published.
+    trigger : int or str, optional
+        The trigger of the request, see DispatcherAccess.request.
+    every : int, optional
+        For a parameter trigger, the number of its updates between two
+        transfers.
+    name : str, optional
+        The name of the shared memory segment, by which the subscribers
+        attach to it.
+    capacity : int, optional
+        The number of transfers held by the segment. A subscriber which lags
+        by more transfers loses the oldest ones.
+    timeout : int, optional
+        The request timeout in ms.
+
+    """
+    def __init__(self, client, parameters, trigger=None, every=1,
+                 name=DEFAULT_NAME, capacity=CAPACITY,
+                 timeout=DEFAULT_TIMEOUT):
+        if isinstance(parameters, str):
+            parameters = [_.strip() for _ in parameters.split(',')]
+        parameters = list(parameters)
+        if capacity < 1:
+            raise ValueError('The capacity must be positive.')
+        self.client = client
+        self.name = name
+        self.request = client.request(parameters, trigger, every, timeout)
+        if self.request.buffer_size == 0:
+            self.request.abort()
+            raise TypeError('String parameters cannot be published.')
+        try:
+            values, timestamps = self._next_batch(1)
+            entries = read_all_params()
+            description = {
+                'parameters': [
+                    {'name': n, 'dtype': v.dtype.str,
+                     'shape': list(full_shape(n, v.shape[1:], entries))}
+                    for n, v in zip(parameters, values)],
+                'capacity': capacity}
+            self.layout = _Layout(description)
+            self._shm = shared_memory.SharedMemory(name, True,
+                                                   self.layout.size)
+        except Exception:
+            self.request.abort()
+            raise
+        self._header, self._sequences, self._timestamps, self._bounds, \
+            self._values = self.layout.views(self._shm.buf)
+        self._header['version'] = VERSION
+        self._header['description_size'] = len(self.layout.encoded)
+        self._header['capacity'] = capacity
+        self._header['slot_size'] = self.layout.slot_size
+        self._shm.buf[HEADER_DTYPE.itemsize:HEADER_DTYPE.itemsize +
+                      len(self.layout.encoded)] = self.layout.encoded
+        self._header['magic'] = MAGIC
+        self._write(values, timestamps)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def written(self):
+        """ Number of transfers published since the creation. """
+        return int(self._header['written'])
+
+    def _next_batch(self, n):
+        values, timestamps = self.request.next_batch(n, True)
+        if not isinstance(values, tuple):
+            values = (values,)
+        return values, timestamps
+
+    def _write(self, values, timestamps):
+        written = int(self._header['written'])
+        capacity = self.layout.capacity
+        for k in range(len(timestamps)):
+            islot = (written + k) % capacity
+            seq = 2 * (written + k)
+            self._sequences[islot] = seq + 1
+            self._timestamps[islot] = timestamps[k]
+            for i, (value, out) in enumerate(zip(values, self._values)):
+                if value.ndim > 1:
+                    bound = value.shape[-1]
+                    out[islot, ..., :bound] = value[k]
+                else:
+                    bound = -1
+                    out[islot] = value[k]
+                self._bounds[islot, i] = bound
+            self._sequences[islot] = seq + 2
+        self._header['written'] = written + len(timestamps)
+
+    def publish(self):
+        """
+        Wait for the next transfers of the request and publish them.
+
+        Returns
+        -------
+        The number of published transfers.
+
+        """
+        n = min(max(self.request.available, 1), self.request.buffer_size)
+        values, timestamps = self._next_batch(n)
+        self._write(values, timestamps)
+        return n
+
+    def run(self, duration=None):
+        """
+        Publish the transfers, until the duration in seconds has elapsed, if
+        specified.
+
+        """
+        time0 = time.time()
+        while duration is None or time.time() - time0 < duration:
+            self.publish()
+
+    def close(self):
+        """
+        Abort the request and remove the shared memory segment. The attached
+        subscribers can still read the published transfers.
+
+        """
+        if self._shm is None:
+            return
+        self.request.abort()
+        self._header['closed'] = 1
+        self._header = self._sequences = self._timestamps = None
+        self._bounds = self._values = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+
+class Subscriber(object):
+    """
+    Read the transfers published in a shared memory segment.
+
+    The subscriber starts with the next published transfer. When it lags by
+    more than the capacity of the segment, the oldest transfers are skipped
+    (see the overflows attribute).
+
+    Parameters
+    ----------
+    name : str, optional
+        The name of the shared memory segment.
+    timeout : int, optional
+        The timeout in ms of the next and next_batch methods.
+
+    Attributes
+    ----------
+    parameters : list of str
+        The published parameters.
+
+    """
+    def __init__(self, name=DEFAULT_NAME, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        # the segment is owned by the publisher, which removes it
+        self._shm = _attach(name)
+        header = np.ndarray((), HEADER_DTYPE, self._shm.buf)
+        if header['magic'] != MAGIC or header['version'] != VERSION:
+            self._shm.close()
+            raise ValueError(
+                "The shared memory segment '{0}' is not a pystudio segment."
+                .format(name))
+        start = HEADER_DTYPE.itemsize
+        encoded = bytes(self._shm.buf[start:start +
+                                      int(header['description_size'])])
+        self.layout = _Layout(json.loads(encoded.decode('utf-8')))
+        self.parameters = self.layout.names
+        self._header, self._sequences, self._timestamps, self._bounds, \
+            self._values = self.layout.views(self._shm.buf)
+        for value in self._values:
+            value.flags.writeable = False
+        self._next = int(self._header['written'])
+        self._overflows = 0
+        self._seq = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def available(self):
+        """ Number of published transfers that have not been read yet. """
+        return min(int(self._header['written']) - self._next,
+                   self.layout.capacity)
+
+    @property
+    def overflows(self):
+        """
+        Number of transfers skipped because they were overwritten before
+        being read.
+
+        """
+        return self._overflows
+
+    def _wait_available(self, n):
+        deadline = time.time() + self.timeout / 1000
+        while int(self._header['written']) - self._next < n:
+            if self._header['closed']:
+                raise EOFError('The publisher is closed.')
+            if time.time() > deadline:
+                raise TimeoutError('No transfer was published.')
+            time.sleep(POLL_INTERVAL)
+
+    def _read(self, copy):
+        """
+        Read the next transfer. Return the values, the arrival time and the
+        sequence number, or None if the transfer has been overwritten.
+
+        """
+        written = int(self._header['written'])
+        if written - self._next > self.layout.capacity:
+            self._overflows += written - self._next - self.layout.capacity
+            self._next = written - self.layout.capacity
+        islot = self._next % self.layout.capacity
+        seq = 2 * self._next + 2
+        self._next += 1
+        if self._sequences[islot] != seq:
+            self._overflows += 1
+            return None
+        values = []
+        for i, value in enumerate(self._values):
+            bound = self._bounds[islot, i]
+            value = value[islot]
+            if bound >= 0:
+                value = value[..., :bound]
+            values.append(value.copy() if copy else value)
+        timestamp = float(self._timestamps[islot])
+        if self._sequences[islot] != seq:
+            self._overflows += 1
+            return None
+        return values, timestamp, seq
+
+    def next(self, copy=True):
+        """
+        Wait for the next transfer and return the published parameters.
+
+        Parameters
+        ----------
+        copy : boolean, optional
+            If false, read-only views of the segment are returned. They are
+            overwritten by the publisher after capacity transfers, which can
+            be checked with the is_valid method.
+
+        """
+        while True:
+            self._wait_available(1)
+            transfer = self._read(copy)
+            if transfer is not None:
+                break
+        values, _, self._seq = transfer
+        if len(values) == 1:
+            return values[0]
+        return tuple(values)
+
+    def is_valid(self):
+        """
+        Return True if the views returned by the last call to the next method
+        have not been overwritten.
+
+        """
+        islot = (self._seq // 2 - 1) % self.layout.capacity
+        return self._sequences[islot] == self._seq
+
+    def next_batch(self, n, timestamps=False):
+        """
+        Wait until n transfers are published and return them, stacked along
+        the first dimension. The transfers overwritten while being read are
+        skipped.
+
+        Parameters
+        ----------
+        n : int
+            The number of transfers.
+        timestamps : boolean, optional
+            If true, the arrival times of the transfers (in seconds since the
+            Epoch) are also returned.
+
+        """
+        transfers = []
+        while len(transfers) < n:
+            self._wait_available(1)
+            transfer = self._read(True)
+            if transfer is not None:
+                transfers.append(transfer)
+        out = []
+        for i in range(len(self.parameters)):
+            values = [_[0][i] for _ in transfers]
+            if values[0].ndim > 0:
+                bound = min(_.shape[-1] for _ in values)
+                values = [_[..., :bound] for _ in values]
+            out.append(np.array(values))
+        out = out[0] if len(out) == 1 else tuple(out)
+        if timestamps:
+            return out, np.array([_[1] for _ in transfers])
+        return out
+
+    def close(self):
+        """ Detach from the shared memory segment. """
+        if self._shm is None:
+            return
+        self._header = self._sequences = self._timestamps = None
+        self._bounds = self._values = None
+        self._shm.close()
+        self._shm = None
@@ -0,0 +1,234 @@
+"""
+Evaluation of the alert and warning thresholds of the housekeeping.
+
+The dispatcher TF file specifies for each parameter the low alert, low
+warning, high warning and high alert thresholds, which can be enabled
+independently (see parameters.read_tf). The ThresholdEngine loads them once
+into arrays indexed by parameter id, and evaluates the state of whole
+snapshots or streams of the watched parameters in a single vectorised pass.
+Only the state transitions are returned, so that a watchdog does not have to
+compare each parameter with its thresholds nor to track their states.
+
+The states are signed levels: ALERT_LOW (-2), WARN_LOW (-1), NORMAL (0),
+WARN_HIGH (1) and ALERT_HIGH (2). A value below the low alert threshold (or
+above the high alert threshold) is in the alert state, otherwise a value
+below the low warning threshold (or above the high warning threshold) is in
+the warning state. The thresholds apply to each element of the array
+parameters, and the NaN values are in the normal state.
+
+Examples
+--------
+>>> from pystudio.thresholds import ThresholdEngine
+>>> engine = ThresholdEngine(['EXT_Pressures', 'QUBIC_Nsample'])
+>>> req = client.request(engine.names, 1000)
+>>> while True:
+...     values, timestamp = req.next_batch(1, timestamps=True)
+...     for transition in engine.update_many(values, timestamp):
+...         print(transition)
+
+"""
+from __future__ import division, print_function
+from collections import namedtuple
+import numpy as np
+from .parameters import FILENAME, read_all_params, read_tf
+
+__all__ = ['ThresholdEngine', 'Transition', 'ALERT_LOW', 'WARN_LOW', 'NORMAL',
+           'WARN_HIGH', 'ALERT_HIGH']
+
+ALERT_LOW = -2
+WARN_LOW = -1
+NORMAL = 0
+WARN_HIGH = 1
+ALERT_HIGH = 2
+THRESHOLDS = ('lowalert', 'lowwarn', 'highwarn', 'highalert')
+
+Transition = namedtuple('Transition', 'name index timestamp value old new')
+
+
+class ThresholdEngine(object):
+    """
+    Evaluation of the thresholds of the watched parameters.
+
+    Parameters
+    ----------
+    parameters : sequence of str, optional
+        The watched parameters. By default, the parameters which have at
+        least one enabled threshold.
+    entries : sequence of TFEntry, optional
+        The thresholds, by default those of the dispatcher TF file.
+    filename : str, optional
+        The parameter description file, which specifies the parameter ids
+        and shapes.
+
+    Attributes
+    ----------
+    names : list of str
+        The watched parameters.
+    thresholds : ndarray
+        The (4, nparameters) array of the lowalert, lowwarn, highwarn and
+        highalert thresholds, indexed by parameter id. The disabled
+        thresholds are NaN.
+    state : ndarray
+        The current state of each element of the watched parameters.
+
+    """
+    def __init__(self, parameters=None, entries=None, filename=FILENAME):
+        rparams = read_all_params(filename)
+        ids = dict((p.name, i) for i, p in enumerate(rparams))
+        if entries is None:
+            entries = read_tf()
+        self.thresholds = np.full((len(THRESHOLDS), len(rparams)), np.nan)
+        for entry in entries:
+            try:
+                id = ids[entry.name]
+            except KeyError:
+                continue
+            for i, key in enumerate(THRESHOLDS):
+                value = getattr(entry, key)
+                if value is not None:
+                    self.thresholds[i, id] = value
+        if parameters is None:
+            watched = np.flatnonzero(~np.all(np.isnan(self.thresholds), 0))
+        else:
+            if isinstance(parameters, str):
+                parameters = [_.strip() for _ in parameters.split(',')]
+            try:
+                watched = np.array([ids[_] for _ in parameters], np.intp)
+            except KeyError as exc:
+                raise ValueError(
+                    "Invalid parameter name: '{}'.".format(exc.args[0]))
+        self.ids = watched
+        self.names = [rparams[_].name for _ in watched]
+        self.shapes = [tuple(rparams[_].shape) for _ in watched]
+        sizes = [int(np.prod(_)) for _ in self.shapes]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.intp)
+        # for each element of the watched parameters: its parameter and its
+        # index in the parameter
+        self._parameters = np.repeat(np.arange(len(watched)), sizes)
+        self._indices = np.arange(self.offsets[-1]) - \
+            self.offsets[self._parameters]
+        lowalert, lowwarn, highwarn, highalert = \
+            self.thresholds[:, watched][:, self._parameters]
+        # the state is the sum of the crossed thresholds, so that a disabled
+        # warning threshold is replaced by the alert threshold. The
+        # comparisons with NaN are false: the disabled thresholds are never
+        # crossed
+        self._lowalert = lowalert
+        self._lowwarn = np.where(np.isnan(lowwarn), lowalert, lowwarn)
+        self._highwarn = np.where(np.isnan(highwarn), highalert, highwarn)
+        self._highalert = highalert
+        self.state = np.zeros(self.offsets[-1], np.int8)
+
+    def __len__(self):
+        """ Return the number of watched elements. """
+        return len(self.state)
+
+    def reset(self):
+        """ Set the state of the watched parameters to normal. """
+        self.state[...] = NORMAL
+
+    def flatten(self, values):
+        """
+        Return the values of the watched parameters as an array of shape
+        (..., nelements).
+
+        Parameters
+        ----------
+        values : dict, sequence or array-like
+            The values indexed by parameter name, or in the order of the
+            names attribute, or already flattened. The values of a stream
+            have an additional first dimension.
+
+        """
+        if isinstance(values, dict):
+            values = [values[_] for _ in self.names]
+        elif isinstance(values, np.ndarray) and values.dtype != object:
+            if values.ndim > 0 and values.shape[-1] == len(self.state):
+                return np.asarray(values, float)
+            values = [values]
+        values = [np.asarray(_, float) for _ in values]
+        if len(values) != len(self.names):
+            raise ValueError(
+                'Invalid number of parameters: {0} instead of {1}.'.format(
+                    len(values), len(self.names)))
+        out = []
+        for value, shape in zip(values, self.shapes):
+            lead = value.shape[:value.ndim - len(shape)]
+            out.append(value.reshape(lead + (-1,)))
+        try:
+            return np.concatenate(out, -1)
+        except ValueError:
+            raise ValueError('The values do not match the parameter shapes.')
+
+    def evaluate(self, values):
+        """
+        Return the states of values of shape (..., nelements), without
+        updating the current state.
+
+        """
+        values = np.asarray(values, float)
+        if values.shape[-1:] != self.state.shape:
+            raise ValueError(
+                'The values are not of shape (..., {0}).'.format(
+                    len(self.state)))
+        out = np.greater(values, self._highwarn).view(np.int8)
+        out += np.greater(values, self._highalert).view(np.int8)
+        out -= np.less(values, self._lowwarn).view(np.int8)
+        out -= np.less(values, self._lowalert).view(np.int8)
+        return out
+
+    def update(self, values, timestamp=None):
+        """
+        Evaluate a snapshot of the watched parameters and return the state
+        transitions, see the update_many method.
+
+        """
+        values = self.flatten(values)
+        if values.ndim != 1:
+            raise ValueError('The values are not a snapshot.')
+        return self.update_many(values[None, :],
+                                None if timestamp is None else [timestamp])
+
+    def update_many(self, values, timestamps=None):
+        """
+        Evaluate a stream of snapshots of the watched parameters, update the
+        current state and return the state transitions.
+
+        Parameters
+        ----------
+        values : dict, sequence or array-like
+            The values of the snapshots, stacked along the first dimension,
+            see the flatten method.
+        timestamps : array-like, optional
+            The times of the snapshots.
+
+        Returns
+        -------
+        transitions : list of Transition
+            The transitions (name, index, timestamp, value, old, new) ordered
+            by time, where index is the flat index of the element in the
+            parameter, and old and new are the states before and after the
+            transition.
+
+        """
+        values = self.flatten(values)
+        if values.ndim == 1:
+            values = values[None, :]
+        states = self.evaluate(values)
+        previous = np.concatenate([self.state[None, :], states[:-1]])
+        itime, ielement = np.nonzero(states != previous)
+        if len(states) > 0:
+            self.state[...] = states[-1]
+        if len(itime) == 0:
+            return []
+        if timestamps is None:
+            timestamps_ = [None] * len(itime)
+        else:
+            timestamps_ = np.asarray(timestamps, float)[itime].tolist()
+        names = self.names
+        return [Transition(names[p], i, t, v, o, n) for p, i, t, v, o, n in
+                zip(self._parameters[ielement].tolist(),
+                    self._indices[ielement].tolist(), timestamps_,
+                    values[itime, ielement].tolist(),
+                    previous[itime, ielement].tolist(),
+                    states[itime, ielement].tolist())]
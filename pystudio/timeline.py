@@ -0,0 +1,130 @@
+"""
+Incremental acquisition of the timeline parameters.
+
+The QUBIC_PixelScientificDataTimeLine parameter holds the last samples of
+each pixel in a (16, 128, 1500) array, of which only the first
+QUBIC_PixelScientificDataTimeLineSize samples are valid. Rather than copying
+the whole timeline at each poll, the fetch_timeline method of the clients
+tracks the size counter and stitches the samples appended since the previous
+call into a TimeLine buffer, owned by the caller, which grows as needed.
+
+Examples
+--------
+>>> from pystudio.timeline import TimeLine
+>>> timeline = TimeLine()
+>>> while True:
+...     new = client.fetch_timeline(timeline, trigger=1000)
+...     plot(timeline.data)
+
+"""
+from __future__ import division, print_function
+import numpy as np
+
+__all__ = ['TimeLine']
+
+
+class TimeLine(object):
+    """
+    Growing buffer of the samples of a timeline parameter, stored along the
+    last dimension as in the parameter.
+
+    Parameters
+    ----------
+    shape : tuple of int, optional
+        The shape of a sample, i.e. the shape of the parameter without its
+        last dimension.
+    dtype : dtype, optional
+        The data type of the samples.
+    capacity : int, optional
+        The initial number of samples that can be stored without growing the
+        buffer.
+
+    Attributes
+    ----------
+    size : int
+        The number of stored samples.
+    counter : int
+        The last value of the size counter of the parameter.
+    nrestarts : int
+        The number of times the size counter decreased, i.e. the timeline of
+        the dispatcher was restarted.
+
+    """
+    def __init__(self, shape=(16, 128), dtype=np.float32, capacity=1500):
+        self._data = np.empty(tuple(shape) + (max(capacity, 1),), dtype)
+        self.size = 0
+        self.counter = 0
+        self.nrestarts = 0
+
+    @property
+    def data(self):
+        """ View of the stored samples. """
+        return self._data[..., :self.size]
+
+    @property
+    def capacity(self):
+        """ Number of samples that can be stored without growing. """
+        return self._data.shape[-1]
+
+    def clear(self):
+        """
+        Discard the stored samples. The size counter is kept, so that the
+        next update only stores the samples appended in the meantime.
+
+        """
+        self.size = 0
+
+    def reserve(self, capacity):
+        """ Grow the buffer so that it can store capacity samples. """
+        if capacity <= self.capacity:
+            return
+        data = np.empty(self._data.shape[:-1] + (capacity,), self._data.dtype)
+        data[..., :self.size] = self._data[..., :self.size]
+        self._data = data
+
+    def append(self, samples):
+        """
+        Append samples, stored along their last dimension, and return the
+        view of the appended samples.
+
+        """
+        samples = np.asarray(samples)
+        if samples.shape[:-1] != self._data.shape[:-1]:
+            raise ValueError(
+                'The samples have an invalid shape {0}, instead of {1}.'.format(
+                    samples.shape, self._data.shape[:-1] + ('n',)))
+        n = samples.shape[-1]
+        if self.size + n > self.capacity:
+            self.reserve(max(self.size + n, 2 * self.capacity))
+        out = self._data[..., self.size:self.size+n]
+        out[...] = samples
+        self.size += n
+        return out
+
+    def update(self, value, count):
+        """
+        Append the samples of the parameter value which have been added since
+        the last update, according to its size counter.
+
+        Parameters
+        ----------
+        value : ndarray
+            The value of the timeline parameter, which may be restricted to
+            its upper bound.
+        count : int
+            The value of the size counter of the parameter. If it is lower
+            than the previous one, the timeline is considered as restarted
+            and its first count samples are appended.
+
+        Returns
+        -------
+        The view of the appended samples.
+
+        """
+        count = int(count)
+        if count < self.counter:
+            self.nrestarts += 1
+            self.counter = 0
+        out = self.append(value[..., self.counter:count])
+        self.counter = count
+        return out
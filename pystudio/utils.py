@@ -1,6 +1,3 @@
-from .pystudio import (
-    _MAX_NB_REQUEST_PER_CLIENT as MAX_NB_REQUEST_PER_CLIENT,
-    _META_FLAG as META_FLAG, _TF_FLAG as TF_FLAG)
 import warnings
 
 
@@ -8,3 +5,11 @@ class PyStudioWarning(UserWarning):
     pass
 
 warnings.simplefilter('always', category=PyStudioWarning)
+
+try:
+    from .pystudio import (
+        _MAX_NB_REQUEST_PER_CLIENT as MAX_NB_REQUEST_PER_CLIENT,
+        _META_FLAG as META_FLAG, _TF_FLAG as TF_FLAG)
+except ImportError:
+    # the extension is not built, see pystudio/__init__.py
+    pass
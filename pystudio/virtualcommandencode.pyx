@@ -12,7 +12,7 @@ These are methods which have moved by Wilfried Marty from TDispatcherAccess.h to
 
 """
 from libcpp cimport bool
-from libhelpers cimport connect_request, slot_request
+from libhelpers cimport connect_request, RequestState, slot_request
 from libqt cimport (
     QApplication, QByteArray, QList, QString, fromRawData, qint16)
 from libdispatcheraccess cimport TDispatcherAccess, TParamsComputer
@@ -32,6 +32,7 @@ cdef class VirtualCommandEncode:
     """
     cdef TDispatcherAccess *_da
     cdef TParamsComputer *_pc
+    cdef RequestState *_state
 
     def __cinit__(self, str dispatcherAddress=None, int dispatcherPort=-1):
         if dispatcherAddress is None:
@@ -47,13 +48,15 @@ cdef class VirtualCommandEncode:
         self._da.start()
         self.parameters = get_parameters(self)
         self._pc = new TParamsComputer()
+        self._state = new RequestState()
         cdef slot_request slot = &requestArrived
-        connect_request(self._da, slot)
+        connect_request(self._da, slot, self._state)
         _last_client = self
 
     def __dealloc__(self):
         del self._da
         del self._pc
+        del self._state
 
     property connected:
         def __get__(self):
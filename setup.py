@@ -18,7 +18,7 @@ LICENSE          = 'GPL'
 DOWNLOAD_URL     = 'https://github.com/satorchi/pystudio'
 VERSION          = '2.0.0'
 hooks.FILE_PREPROCESS = 'preprocess.py'
-hooks.MIN_VERSION_CYTHON = '0.23'
+hooks.MIN_VERSION_CYTHON = '0.27'
 
 with open('README.md') as f:
     long_description = f.readlines()
@@ -1,5 +1,90 @@
+#include <QAbstractEventDispatcher>
+#include <QCoreApplication>
+#include <QElapsedTimer>
+#include <QEventLoop>
+#include <QThread>
+#include <QTimer>
 #include "helpers.h"
 
-void connect_request(TDispatcherAccess* object, slot_request slot) {
-  QObject::connect(object, &TDispatcherAccess::requestArrived, slot);
+RequestState::RequestState() {
+  for (int i = 0; i < NB_REQUEST_SLOTS; i++) {
+    arrived[i] = false;
+    rings[i] = NULL;
+  }
+}
+
+/*
+ * Connect the requestArrived signal of a client to the request slot, which
+ * is called with the arrival state of the client. The state must outlive
+ * the client.
+ *
+ * The connection has no context object, so that the slot is a direct call
+ * in the thread emitting the signal, i.e. the kernel thread of the client:
+ * it does not go through the event loop of the thread owning the
+ * QApplication, and it must not acquire the GIL.
+ */
+void connect_request(TDispatcherAccess* object, slot_request slot,
+                     RequestState* state) {
+  QObject::connect(object, &TDispatcherAccess::requestArrived,
+                   [slot, state](int num) { slot(state, num); });
+}
+
+/*
+ * Wake up the threads waiting for a request. Must be called with the mutex
+ * protecting the arrival flags held.
+ *
+ * The thread owning the QApplication may be blocked in its event dispatcher
+ * (see wait_request) rather than on the wait condition, so its event
+ * dispatcher is woken up as well, the slot being invoked from the kernel
+ * thread.
+ */
+void wake_request(QWaitCondition* condition) {
+  condition->wakeAll();
+  QCoreApplication *app = QCoreApplication::instance();
+  if (app == NULL) return;
+  QAbstractEventDispatcher *dispatcher =
+    QAbstractEventDispatcher::instance(app->thread());
+  if (dispatcher != NULL) dispatcher->wakeUp();
+}
+
+/*
+ * Block until the arrival flag is set or the timeout (in ms) expires, and
+ * reset the flag. Return true if the request has arrived.
+ *
+ * The flag is set by the request slot, called in the kernel thread of the
+ * client (see connect_request), so that the arrival does not depend on the
+ * events of any other thread. The thread owning the QApplication processes
+ * its events while waiting, for the Qt objects that it owns, and is woken
+ * up by wake_request. The other threads sleep on the wait condition.
+ */
+bool wait_request(QMutex* mutex, QWaitCondition* condition, bool* arrived,
+                  int timeout) {
+  QElapsedTimer elapsed;
+  elapsed.start();
+  QCoreApplication *app = QCoreApplication::instance();
+  bool isMainThread = app != NULL && QThread::currentThread() == app->thread();
+  QAbstractEventDispatcher *dispatcher = NULL;
+  QTimer timer;
+  if (isMainThread) {
+    dispatcher = QAbstractEventDispatcher::instance();
+    // the timer wakes up the event dispatcher when the timeout expires
+    timer.setSingleShot(true);
+    timer.start(timeout);
+  }
+  mutex->lock();
+  while (!*arrived) {
+    qint64 remaining = timeout - elapsed.elapsed();
+    if (remaining <= 0) break;
+    if (isMainThread) {
+      mutex->unlock();
+      dispatcher->processEvents(QEventLoop::WaitForMoreEvents);
+      mutex->lock();
+    } else {
+      condition->wait(mutex, (unsigned long)remaining);
+    }
+  }
+  bool out = *arrived;
+  *arrived = false;
+  mutex->unlock();
+  return out;
 }
@@ -1,5 +1,25 @@
+#include <QMutex>
+#include <QWaitCondition>
 #include "tdispatcheraccess.h"
 
-typedef void (* slot_request)(int);
+#define NB_REQUEST_SLOTS 256
 
-void connect_request(TDispatcherAccess*, slot_request);
+/*
+ * Arrival state of the requests of a client: the arrival flags and the ring
+ * buffers of its requests, indexed by request number, and the mutex and wait
+ * condition protecting them. Each client has its own state, so that the
+ * clients of a process do not share the request numbers nor the lock.
+ */
+struct RequestState {
+  QMutex mutex;
+  QWaitCondition condition;
+  bool arrived[NB_REQUEST_SLOTS];
+  void* rings[NB_REQUEST_SLOTS];
+  RequestState();
+};
+
+typedef void (* slot_request)(RequestState*, int);
+
+void connect_request(TDispatcherAccess*, slot_request, RequestState*);
+void wake_request(QWaitCondition*);
+bool wait_request(QMutex*, QWaitCondition*, bool*, int);
@@ -0,0 +1,118 @@
+from __future__ import division
+import os
+import numpy as np
+import pytest
+from numpy.testing import assert_equal
+from pystudio.hkbackup import HKBackup
+
+START = 1.55e9  # s
+
+# as written by TSingleHkBackup::saveDescription, AutoXDataTime being saved
+# as PrivateXDataTime
+DESCRIPTION = """\
+[EXT_Temp]
+externXName=
+unit=K
+realName=Temperature
+XDataOptions=5
+dataType=9
+objectDataSize=1
+
+[EXT_Volts]
+externXName=
+unit=mV
+realName=Voltages
+XDataOptions=5
+dataType=1
+objectDataSize=3
+
+[EXT_Heater]
+externXName=EXT_Temp
+unit=mW
+realName=Heater
+XDataOptions=2
+dataType=8
+objectDataSize=1
+"""
+
+
+def write(directory, filename, array):
+    np.asarray(array).tofile(os.path.join(directory, filename))
+
+
+@pytest.fixture
+def session(tmp_path):
+    """
+    Session directory named as TSingleHkBackup::openNewFiles does, the files
+    of EXT_Temp being split.
+
+    """
+    directory = str(tmp_path)
+    with open(os.path.join(directory, 'data_description.ini'), 'w') as f:
+        f.write(DESCRIPTION)
+    times = 1000 * (START + np.arange(10))
+    write(directory, 'EXT_Temp.dat', np.arange(6, dtype='<f8'))
+    write(directory, 'EXT_Temp(1).dat', np.arange(6, 10, dtype='<f8'))
+    write(directory, 'EXT_Temp_X.dat', times[:6])
+    write(directory, 'EXT_Temp_X(1).dat', times[6:])
+    write(directory, 'EXT_Volts.dat', np.arange(12, dtype='<i2'))
+    write(directory, 'EXT_Volts_X.dat', times[:4])
+    write(directory, 'EXT_Heater.dat', np.arange(10, dtype='<f4') / 2)
+    return directory
+
+
+def test_names(session):
+    backup = HKBackup(session)
+    assert backup.names == ['EXT_Heater', 'EXT_Temp', 'EXT_Volts']
+
+
+def test_split_files(session):
+    times, values = HKBackup(session).read('EXT_Temp')
+    assert_equal(times, START + np.arange(10))
+    assert_equal(values, np.arange(10))
+
+
+def test_description(session):
+    backup = HKBackup(session)
+    volts = backup['EXT_Volts']
+    assert volts.dtype == np.int16
+    assert volts.size == 3
+    times, values = volts.read(START + 1, START + 3)
+    assert_equal(times, START + np.arange(1, 3))
+    assert_equal(values, np.arange(3, 9).reshape(2, 3))
+
+
+def test_extern_x(session):
+    backup = HKBackup(session)
+    heater = backup['EXT_Heater']
+    assert heater.dtype == np.float32
+    times, values = heater.read()
+    assert_equal(times, START + np.arange(10))
+    assert_equal(values, np.arange(10) / 2)
+
+
+def test_join(session):
+    times, values = HKBackup(session).join(
+        ['EXT_Temp', 'EXT_Volts'], times=START + np.array([-1, 2.5, 8]))
+    assert_equal(values[0], np.nan)
+    assert_equal(values[1], [2, 6, 7, 8])
+    assert_equal(values[2], [8, 9, 10, 11])
+
+
+def test_sensor_ending_with_x(tmp_path):
+    directory = str(tmp_path)
+    with open(os.path.join(directory, 'data_description.ini'), 'w') as f:
+        f.write('[EXT_Pos_X]\nXDataOptions=5\ndataType=9\n'
+                'objectDataSize=1\n')
+    write(directory, 'EXT_Pos_X.dat', np.arange(3.))
+    write(directory, 'EXT_Pos_X_X.dat', 1000 * (START + np.arange(3)))
+    backup = HKBackup(directory)
+    assert backup.names == ['EXT_Pos_X']
+    assert_equal(backup.read('EXT_Pos_X')[1], np.arange(3))
+
+
+def test_replay_recordings(session):
+    from pystudio.replay import _open_recordings
+    recordings = _open_recordings(session)
+    assert [_.names for _ in recordings] == [['EXT_Heater'], ['EXT_Temp'],
+                                             ['EXT_Volts']]
@@ -0,0 +1,21 @@
+from __future__ import division
+from pystudio.fake import FakeDispatcherAccess
+
+
+def test_pipeline():
+    with FakeDispatcherAccess() as client:
+        client.waitingForAckMode = True
+        with client.pipeline(4) as pipeline:
+            connections = pipeline.clients[1:]
+            assert len(connections) == 3
+            assert all(_ is not client for _ in connections)
+            for asic in range(8):
+                pipeline.sendSetAsicParam(asic, 0, 1)
+        results = pipeline.results()
+        assert all(_.ok for _ in results)
+        assert len(results) == 8
+        assert pipeline.clients == [client]
+        assert pipeline.max_in_flight == 4
+        assert all(_.dispatcher is None for _ in connections)
+        assert client.waitingForAckMode
+        assert len(client.commands) == 8
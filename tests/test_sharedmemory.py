@@ -0,0 +1,48 @@
+from __future__ import division
+import os
+import numpy as np
+import pytest
+from numpy.testing import assert_equal
+from pystudio.fake import FakeDispatcherAccess
+from pystudio.sharedmemory import _Layout, Publisher, Subscriber
+
+NAME = 'pystudio-test-{0}'.format(os.getpid())
+
+
+@pytest.fixture
+def client():
+    client = FakeDispatcherAccess(hk_rate=100)
+    yield client
+    client.close()
+
+
+def test_layout():
+    layout = _Layout({'parameters': [
+        {'name': 'a', 'dtype': '<f8', 'shape': []},
+        {'name': 'b', 'dtype': '<i2', 'shape': [2, 3]}], 'capacity': 2})
+    buf = bytearray(layout.size)
+    values = layout.views(buf)[-1]
+    values[1][1] = np.arange(6).reshape(2, 3)
+    offset = layout.start + layout.slot_size + layout.offsets[1]
+    assert_equal(np.frombuffer(buf, '<i2', 6, offset), np.arange(6))
+
+
+def test_round_trip(client):
+    published = []
+    with Publisher(client, ['EXT_Temperatures', 'QUBIC_Nsample'], name=NAME,
+                   capacity=4) as publisher:
+        next_batch = publisher.request.next_batch
+
+        def record(n, timestamps=False):
+            out = next_batch(n, timestamps)
+            published.append(out[0])
+            return out
+        publisher.request.next_batch = record
+        with Subscriber(NAME) as subscriber:
+            publisher.publish()
+            temperatures, nsample = subscriber.next()
+    expected = published[0][0][0]
+    assert expected.size > 1
+    assert len(np.unique(expected)) > 1
+    assert_equal(temperatures, expected)
+    assert_equal(nsample, published[0][1][0])